@@ -41,11 +41,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'monitor.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'monitor.middleware.UserTimezoneMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -77,9 +79,131 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # WAL lets readers run alongside the writer; IMMEDIATE transactions
+            # take the write lock up front instead of failing on upgrade.
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA temp_store=MEMORY;'
+                'PRAGMA cache_size=-20000;'
+            ),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
+# Write-behind ingestion: save_fatigue enqueues scored rows and a background
+# thread group-commits them every FLUSH_MS or BATCH_ROWS rows. A failed
+# commit is retried RETRY_ATTEMPTS times, backing off from RETRY_BACKOFF_MS.
+MONITOR_WRITE_BEHIND = False
+MONITOR_WRITE_BEHIND_FLUSH_MS = 200
+MONITOR_WRITE_BEHIND_BATCH_ROWS = 500
+MONITOR_WRITE_BEHIND_QUEUE_SIZE = 10000
+MONITOR_WRITE_BEHIND_PUT_TIMEOUT_MS = 50
+MONITOR_WRITE_BEHIND_RETRY_ATTEMPTS = 5
+MONITOR_WRITE_BEHIND_RETRY_BACKOFF_MS = 100
+
+# Per-user token buckets (seconds per token, burst) for the polled endpoints.
+# Responses carry X-Next-Send-Ms, the client send interval: SEND_INTERVAL_MS,
+# stretched up to MAX_SEND_INTERVAL_MS as a user's bucket drains or the
+# server backs up (BUSY_INFLIGHT requests in flight counts as saturated)
+MONITOR_RATE_LIMITS = {
+    'save_fatigue':    (5, 6),
+    'current_fatigue': (2, 10),
+    'analytics_data':  (2, 10),
+}
+MONITOR_SEND_INTERVAL_MS = 10000
+MONITOR_MAX_SEND_INTERVAL_MS = 60000
+MONITOR_RATE_BUSY_INFLIGHT = 64
+# Cache alias holding the buckets. With the default local-memory cache each
+# worker process has its own, so the limit is per process (N workers admit
+# up to N times the rate); use a Redis or memcached alias for a global one.
+# Not a database or file cache: their incr() is not atomic
+MONITOR_RATE_LIMIT_CACHE = 'default'
+
+# Packed raw storage: append each sample to a per-user-minute float32 block
+# (one row per minute) instead of inserting a FatigueLog row per sample
+MONITOR_SAMPLE_BLOCKS = False
+
+# Threads scoring telemetry batches for save_fatigue (shared by all requests
+# in a worker process)
+MONITOR_INFERENCE_WORKERS = 4
+
+# Retention: raw FatigueLog samples older than RAW_DAYS are compacted into
+# per-bucket aggregates (manage.py compact_fatigue, or retention.run_scheduled)
+MONITOR_RETENTION_RAW_DAYS = 30
+MONITOR_RETENTION_BUCKET_SECONDS = 300   # 60, 300 or 900
+MONITOR_RETENTION_DELETE_CHUNK = 2000
+
+# Versioned fatigue model artifacts (manage.py train_fatigue_model). The
+# newest one (or MONITOR_MODEL_VERSION, if set) is served, falling back to
+# fatigue_model.pkl; serving processes poll the directory every
+# POLL_SECONDS and hot-swap new artifacts. WARMUP loads the model at
+# startup; wsgi.py and asgi.py turn it on
+MONITOR_MODEL_DIR = BASE_DIR / 'models'
+MONITOR_MODEL_VERSION = os.environ.get('MONITOR_MODEL_VERSION') or None
+MONITOR_MODEL_POLL_SECONDS = 10
+MONITOR_MODEL_WARMUP = os.environ.get('MONITOR_MODEL_WARMUP') == '1'
+
+# Sessions: telemetry samples are heartbeats (written at most every
+# HEARTBEAT_SECONDS); manage.py reap_sessions closes sessions idle longer
+# than IDLE_MINUTES at their last heartbeat
+MONITOR_SESSION_HEARTBEAT_SECONDS = 60
+MONITOR_SESSION_IDLE_MINUTES = 30
+MONITOR_SESSION_REAP_CHUNK = 500
+
+# manage.py compute_burnout records finished user shards here so an
+# interrupted nightly run resumes where it stopped
+MONITOR_BURNOUT_CHECKPOINT_DIR = BASE_DIR / 'checkpoints'
+
+# Population quantile sketches: ingestion merges its pending digests into
+# the shared daily rows every FLUSH_SAMPLES samples or FLUSH_SECONDS
+MONITOR_SKETCH_COMPRESSION = 100
+MONITOR_SKETCH_FLUSH_SAMPLES = 5000
+MONITOR_SKETCH_FLUSH_SECONDS = 60
+
+# Per-user monthly columnar segments for 90/365-day analytics
+# (manage.py export_archive, typically run nightly)
+MONITOR_ARCHIVE_DIR = BASE_DIR / 'archive'
+
+# /metrics/ is readable by staff sessions; set a token to let a Prometheus
+# scraper in with `Authorization: Bearer <token>`
+MONITOR_METRICS_TOKEN = os.environ.get('MONITOR_METRICS_TOKEN') or None
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Per-process local memory by default. Use a shared backend (Redis/Memcached)
+# when running several worker processes so invalidations reach all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'cognitive-load',
+    }
+}
+
+# Cache alias holding the ETag/Last-Modified validators of polled endpoints.
+# With the local-memory default each worker process has its own, so after
+# an ingest in another worker a poll may be answered 304 for up to
+# MONITOR_CACHE_TIMEOUT; with several workers point it at a Redis or
+# memcached alias. Not a database cache: it would add queries to every
+# poll and every ingest
+MONITOR_VALIDATOR_CACHE = 'default'
+
+MONITOR_CACHE_TIMEOUT = 300  # seconds; upper bound on cross-process staleness
+
+# Minimum gap between two alerts of the same type for one user (default 30)
+MONITOR_ALERT_COOLDOWN_MINUTES = {
+    'fatigue_high': 30,
+    'fatigue_med':  30,
+    'posture':      30,
+    'break':        30,
+    'burnout_high': 30,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
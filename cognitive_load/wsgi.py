@@ -12,5 +12,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cognitive_load.settings')
+# Load the fatigue model at startup rather than on the first request
+os.environ.setdefault('MONITOR_MODEL_WARMUP', '1')
 
 application = get_wsgi_application()
@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class MonitorConfig(AppConfig):
     name = 'monitor'
+
+    def ready(self):
+        # Serving processes load the model before their first request; every
+        # other process (commands, tests) loads it only if it scores something
+        if getattr(settings, 'MONITOR_MODEL_WARMUP', False):
+            from .registry import registry
+            registry.warmup()
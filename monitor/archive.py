@@ -0,0 +1,274 @@
+"""Columnar, memory-mapped archive of fatigue telemetry for long-range analytics.
+
+Layout under MONITOR_ARCHIVE_DIR:
+
+    <user_id>/manifest.json
+    <user_id>/<YYYY-MM>.<generation>/<column>.npy
+
+A segment holds one UTC calendar month of a user's samples from every tier,
+sorted by time, as one contiguous array per column: ``ts`` (epoch seconds),
+``count`` and ``<feature>_sum`` for each of retention.FEATURES. A raw sample
+is a row with count 1 and a compacted bucket is a row with its count and
+sums, so averages over either are sum(sums) / sum(counts).
+
+Segments are immutable. Re-exporting a month writes a new generation
+directory and then atomically replaces the manifest, which is the only
+thing readers trust, so readers never see a half-written segment.
+
+Readers np.load() columns with mmap_mode='r'. A time range is cut out of a
+segment with a binary search on ``ts`` and summed with np.bincount over
+views of the mapped columns, so only the pages in range are touched and no
+column is copied.
+
+The archive lags behind live data (only closed months are exported by
+default); fatigue_profile() covers the rest of the range from HourlyRollup.
+"""
+import heapq
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from operator import itemgetter
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import blocks
+from .files import atomic_write
+from .models import FatigueAggregate, FatigueLog, HourlyRollup, SampleBlock
+from .retention import FEATURES
+from .timeranges import day_bounds
+
+ARCHIVE_DIR = getattr(settings, 'MONITOR_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archive'))
+
+SUMS = tuple(f'{name}_sum' for name in FEATURES)
+COLUMNS = ('ts', 'count') + SUMS
+DTYPE = np.dtype([('ts', '<i8'), ('count', '<i4')] + [(name, '<f8') for name in SUMS])
+
+
+def month_start(ts):
+    return datetime(ts.year, ts.month, 1, tzinfo=dt_timezone.utc)
+
+
+def next_month(start):
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def _user_dir(user_id):
+    return os.path.join(ARCHIVE_DIR, str(user_id))
+
+
+# ─── MANIFEST ─────────────────────────────────────────────────────────────────
+
+def read_manifest(user_id):
+    """{'through': epoch seconds covered up to, 'segments': {'YYYY-MM': {...}}}."""
+    try:
+        with open(os.path.join(_user_dir(user_id), 'manifest.json')) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return {'through': None, 'segments': {}}
+
+
+def _write_manifest(user_id, manifest):
+    data = json.dumps(manifest, indent=1, sort_keys=True).encode()
+    atomic_write(os.path.join(_user_dir(user_id), 'manifest.json'), lambda fh: fh.write(data))
+
+
+# ─── EXPORT ───────────────────────────────────────────────────────────────────
+
+@contextmanager
+def _read_snapshot():
+    """One consistent snapshot for several queries, without blocking writers.
+
+    transaction.atomic() on SQLite begins IMMEDIATE (see DATABASES), which
+    would hold the write lock, and so stall ingestion, for a whole month's
+    read. A DEFERRED transaction that only reads stays a WAL reader.
+    """
+    if connection.vendor != 'sqlite' or not connection.get_autocommit():
+        with transaction.atomic():
+            yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('BEGIN DEFERRED')
+        try:
+            yield
+        finally:
+            if connection.connection.in_transaction:
+                cursor.execute('COMMIT')
+
+
+def _month_rows(user_id, start, end):
+    """Structured array of every tier's rows in [start, end), sorted by ts."""
+    with _read_snapshot():   # one snapshot for the counts and the cursors
+        raw = FatigueLog.objects.filter(user_id=user_id, timestamp__gte=start, timestamp__lt=end)
+        agg = FatigueAggregate.objects.filter(user_id=user_id, bucket_start__gte=start, bucket_start__lt=end)
+        packed = (SampleBlock.objects.filter(user_id=user_id, minute__gte=start, minute__lt=end)
+                  .aggregate(n=Sum('count'))['n'] or 0)
+        n = raw.count() + agg.count() + packed
+        if not n:
+            return None
+        raw_rows = ((int(r[0].timestamp()), 1, *r[1:]) for r in raw.order_by('timestamp')
+                    .values_list('timestamp', *FEATURES).iterator(chunk_size=5000))
+        packed_rows = ((int(t), 1, *v) for ts, values in blocks.iter_chunks(user_id, start, end)
+                       for t, v in zip(ts.tolist(), values.tolist()))
+        agg_rows = ((int(r[0].timestamp()), *r[1:]) for r in agg.order_by('bucket_start')
+                    .values_list('bucket_start', 'count', *SUMS).iterator(chunk_size=5000))
+        return np.fromiter(heapq.merge(raw_rows, packed_rows, agg_rows, key=itemgetter(0)), dtype=DTYPE, count=n)
+
+
+def export_month(user_id, start, now=None):
+    """(Re)write the segment for the UTC month starting at `start`. Returns rows written."""
+    now = now or timezone.now()
+    key = start.strftime('%Y-%m')
+    rows = _month_rows(user_id, start, next_month(start))
+    manifest = read_manifest(user_id)
+    old = manifest['segments'].pop(key, None)
+
+    if rows is not None:
+        name = f"{key}.{now.strftime('%Y%m%dT%H%M%S%f')}"
+        seg_dir = os.path.join(_user_dir(user_id), name)
+        os.makedirs(seg_dir)
+        for column in COLUMNS:
+            data = np.ascontiguousarray(rows[column])
+            atomic_write(os.path.join(seg_dir, f'{column}.npy'), lambda fh: np.save(fh, data))
+        manifest['segments'][key] = {
+            'dir': name, 'rows': len(rows), 'samples': int(rows['count'].sum()),
+            'first': int(rows['ts'][0]), 'last': int(rows['ts'][-1]), 'exported_at': now.isoformat(),
+        }
+
+    if rows is not None or old is not None:
+        _write_manifest(user_id, manifest)
+    if old is not None:
+        # Readers that still map the old generation keep their open files
+        shutil.rmtree(os.path.join(_user_dir(user_id), old['dir']), ignore_errors=True)
+    return 0 if rows is None else len(rows)
+
+
+def export(users=None, through=None, force=False, now=None):
+    """Export every month before `through` (default: start of the current UTC month).
+
+    Months already archived after they closed are skipped unless `force`;
+    a month archived while still open is rewritten. Returns
+    (segments written, rows written).
+    """
+    now = now or timezone.now()
+    through = min(through or month_start(now), next_month(month_start(now)))
+    user_ids = (User.objects.values_list('id', flat=True) if users is None
+                else [getattr(u, 'pk', u) for u in users])
+
+    segments = rows = 0
+    for user_id in user_ids:
+        firsts = [
+            FatigueLog.objects.filter(user_id=user_id).order_by('timestamp')
+            .values_list('timestamp', flat=True).first(),
+            SampleBlock.objects.filter(user_id=user_id).order_by('minute')
+            .values_list('minute', flat=True).first(),
+            FatigueAggregate.objects.filter(user_id=user_id).order_by('bucket_start')
+            .values_list('bucket_start', flat=True).first(),
+        ]
+        firsts = [ts for ts in firsts if ts is not None]
+        if not firsts:
+            continue
+        done = read_manifest(user_id)['segments']
+        start = month_start(min(firsts))
+        while start < through:
+            end = next_month(start)
+            entry = done.get(start.strftime('%Y-%m'))
+            if force or entry is None or datetime.fromisoformat(entry['exported_at']) < end:
+                n = export_month(user_id, start, now)
+                segments += bool(n)
+                rows += n
+            start = end
+
+        # Coverage stops at `now` when the open month was included
+        manifest = read_manifest(user_id)
+        manifest['through'] = int(min(through, now).timestamp())
+        _write_manifest(user_id, manifest)
+    return segments, rows
+
+
+# ─── READING ──────────────────────────────────────────────────────────────────
+
+def _segments(user_id, lo, hi):
+    """Memory-mapped (ts, count, fatigue_probability_sum) for segments overlapping [lo, hi)."""
+    manifest = read_manifest(user_id)
+    for entry in manifest['segments'].values():
+        if entry['last'] < lo or entry['first'] >= hi:
+            continue
+        seg_dir = os.path.join(_user_dir(user_id), entry['dir'])
+        yield tuple(np.load(os.path.join(seg_dir, f'{column}.npy'), mmap_mode='r')
+                    for column in ('ts', 'count', 'fatigue_probability_sum'))
+
+
+def bucket_sums(user_id, edges):
+    """(sums, counts) of fatigue_probability per [edges[i], edges[i+1]) from the archive."""
+    k = len(edges) - 1
+    sums, counts = np.zeros(k), np.zeros(k)
+    if k <= 0:
+        return sums, counts
+    for ts, count, total in _segments(user_id, edges[0], edges[-1]):
+        lo, hi = np.searchsorted(ts, [edges[0], edges[-1]])
+        if lo == hi:
+            continue
+        idx = np.searchsorted(edges, ts[lo:hi], side='right') - 1
+        sums += np.bincount(idx, weights=total[lo:hi], minlength=k)
+        counts += np.bincount(idx, weights=count[lo:hi], minlength=k)
+    return sums, counts
+
+
+def _hour_grid(first_day, last_day, tz):
+    """UTC epoch edges of every local hour in the range, with day index and local hour of each."""
+    edges, day_index, labels = [], [], []
+    day, i = first_day, 0
+    while day <= last_day:
+        start, end = day_bounds(day, tz)
+        hours = np.arange(int(start.timestamp()), int(end.timestamp()), 3600)
+        edges.append(hours)
+        day_index.append(np.full(len(hours), i))
+        if len(hours) == 24:
+            labels.append(np.arange(24))
+        else:   # DST change: label each hour by its wall-clock time
+            labels.append(np.array([datetime.fromtimestamp(int(h), tz).hour for h in hours]))
+        day, i = day + timedelta(days=1), i + 1
+    edges.append([int(day_bounds(last_day, tz)[1].timestamp())])
+    return np.concatenate(edges), np.concatenate(day_index), np.concatenate(labels)
+
+
+def fatigue_profile(user, first_day, last_day, tz=None):
+    """Average fatigue per local day and per hour of day over first_day..last_day.
+
+    Returns (daily, hour_of_day): lists of averages (None where there is no
+    data). Archived months are read from the mapped segments; anything after
+    the archive's coverage comes from HourlyRollup.
+    """
+    tz = tz or timezone.get_current_timezone()
+    edges, day_index, labels = _hour_grid(first_day, last_day, tz)
+
+    through = read_manifest(user.pk)['through'] or edges[0]
+    # Hand over to the rollups on an hour boundary so no hour is split
+    split = int(np.searchsorted(edges, min(max(through, edges[0]), edges[-1]), side='right')) - 1
+    sums, counts = np.zeros(len(edges) - 1), np.zeros(len(edges) - 1)
+    sums[:split], counts[:split] = bucket_sums(user.pk, edges[:split + 1])
+
+    tail = HourlyRollup.objects.filter(
+        user=user, hour__gte=datetime.fromtimestamp(int(edges[split]), dt_timezone.utc),
+        hour__lt=datetime.fromtimestamp(int(edges[-1]), dt_timezone.utc))
+    for hour, total, count in tail.values_list('hour', 'fatigue_sum', 'fatigue_count'):
+        i = int(np.searchsorted(edges, hour.timestamp(), side='right')) - 1
+        sums[i] += total
+        counts[i] += count
+
+    n_days = int(day_index[-1]) + 1
+    day_sums = np.bincount(day_index, weights=sums, minlength=n_days)
+    day_counts = np.bincount(day_index, weights=counts, minlength=n_days)
+    hod_sums = np.bincount(labels, weights=sums, minlength=24)
+    hod_counts = np.bincount(labels, weights=counts, minlength=24)
+
+    def averages(s, c):
+        return [float(a) / b if b else None for a, b in zip(s, c)]
+    return averages(day_sums, day_counts), averages(hod_sums, hod_counts)
@@ -0,0 +1,213 @@
+"""Packed per-minute sample blocks, an alternative raw storage format.
+
+A FatigueLog row per 10-second sample spends most of its bytes, and all of
+its index entries, on the id, user and timestamp rather than the readings.
+With MONITOR_SAMPLE_BLOCKS on, ingestion instead appends each sample to the
+user's SampleBlock for the UTC minute it falls in: one row whose ``data`` is
+a little-endian float32 array of shape (count, 5), columns COLUMNS (seconds
+into the minute, then each of FEATURES), kept in time order. Samples
+scored by different models go to separate blocks, so a minute that spans
+a hot swap has one block per model_version. At one sample
+every 10 seconds that is a sixth of the rows and index entries, and a range
+scan reads one contiguous blob per minute that np.frombuffer turns into
+columns without building a Python object per sample.
+
+float32 keeps about seven significant digits: plenty for sensor readings
+and probabilities, and offsets within a minute stay exact to microseconds.
+``fatigue_sum`` is accumulated from the unrounded probabilities so rollups
+rebuilt from blocks match the ones maintained on ingest.
+
+Blocks are a raw tier alongside FatigueLog, not a replacement for it:
+readers go through this module or retention.fatigue_stream(), which cover
+both, so the setting can be switched either way without losing history.
+Compaction folds old blocks into FatigueAggregate like raw rows.
+"""
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import FatigueLog, SampleBlock
+
+ENABLED = getattr(settings, 'MONITOR_SAMPLE_BLOCKS', False)
+
+FEATURES = ('blink_rate', 'eye_closure_duration', 'head_tilt_angle', 'fatigue_probability')
+COLUMNS = ('offset',) + FEATURES
+FATIGUE = FEATURES.index('fatigue_probability')
+DTYPE = np.dtype('<f4')
+ROW_BYTES = DTYPE.itemsize * len(COLUMNS)
+CHUNK_BLOCKS = 500
+
+
+def pack(rows):
+    return np.ascontiguousarray(rows, dtype=DTYPE).tobytes()
+
+
+def unpack(data):
+    """(count, 5) float32 view of a block's data."""
+    return np.frombuffer(data, dtype=DTYPE).reshape(-1, len(COLUMNS))
+
+
+def _utc(epoch):
+    return datetime.fromtimestamp(epoch, tz=dt_timezone.utc)
+
+
+def _by_minute(epochs, values):
+    """{minute epoch: (rows, indices)} for samples at `epochs` with (n, 4) `values`."""
+    epochs = np.asarray(epochs, dtype=np.float64)
+    minutes = (epochs // 60 * 60).astype(np.int64)
+    rows = np.column_stack([epochs - minutes, values]).astype(DTYPE)
+    groups = {}
+    for minute in np.unique(minutes).tolist():
+        idx = np.flatnonzero(minutes == minute)
+        groups[minute] = (rows[idx], idx)
+    return groups
+
+
+def build(user, epochs, values, model_version=''):
+    """Unsaved SampleBlocks for samples that start new minutes (bulk loads, tests)."""
+    values = np.asarray(values, dtype=np.float64)
+    blocks = []
+    for minute, (rows, idx) in _by_minute(epochs, values).items():
+        rows = rows[np.argsort(rows[:, 0], kind='stable')]
+        blocks.append(SampleBlock(user=user, minute=_utc(minute), count=len(rows), model_version=model_version,
+                                  fatigue_sum=math.fsum(values[idx, FATIGUE].tolist()), data=pack(rows)))
+    return blocks
+
+
+# ─── INGESTION ────────────────────────────────────────────────────────────────
+
+def append(user, logs):
+    """Append unsaved FatigueLog instances to the user's minute blocks. Returns blocks written.
+
+    Normally only the open (current) minute's block already exists; a late
+    sample is merged into its older block in time order.
+    """
+    epochs = [log.timestamp.timestamp() for log in logs]
+    values = np.array([[getattr(log, name) for name in FEATURES] for log in logs], dtype=np.float64)
+    groups = _by_minute(epochs, values)
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                return _append(user, groups, values, logs[-1].model_version)
+        except IntegrityError:
+            # A concurrent request created one of the blocks; the retry appends to it
+            if attempt:
+                raise
+
+
+def _append(user, groups, values, model_version):
+    minutes = {minute: _utc(minute) for minute in groups}
+    existing = {b.minute: b for b in SampleBlock.objects.select_for_update()
+                .filter(user=user, minute__in=minutes.values(), model_version=model_version)}
+    new, changed = [], []
+    for minute, (rows, idx) in groups.items():
+        block = existing.get(minutes[minute])
+        if block is None:
+            block = SampleBlock(user=user, minute=minutes[minute], count=0, fatigue_sum=0.0,
+                                model_version=model_version)
+            new.append(block)
+        else:
+            rows = np.concatenate([unpack(block.data), rows])
+            changed.append(block)
+        rows = rows[np.argsort(rows[:, 0], kind='stable')]
+        block.data, block.count = pack(rows), len(rows)
+        block.fatigue_sum += math.fsum(values[idx, FATIGUE].tolist())
+    SampleBlock.objects.bulk_create(new)
+    SampleBlock.objects.bulk_update(changed, ['data', 'count', 'fatigue_sum'])
+    return len(groups)
+
+
+# ─── DECODING ─────────────────────────────────────────────────────────────────
+
+def decode(blocks):
+    """(ts, values) for (minute, data) pairs in minute order, oldest sample first.
+
+    ts is float64 epoch seconds; values is an (n, 4) float32 array of FEATURES.
+    Blocks of the same minute (one per model version) are merged in time order.
+    """
+    minutes, counts, blobs = [], [], []
+    for minute, data in blocks:
+        minutes.append(minute.timestamp())
+        counts.append(len(data) // ROW_BYTES)
+        blobs.append(data)
+    if not blobs:
+        return np.empty(0), np.empty((0, len(FEATURES)), dtype=DTYPE)
+    rows = unpack(b''.join(blobs))
+    ts = np.repeat(np.array(minutes), counts) + rows[:, 0]
+    if len(set(minutes)) < len(minutes):
+        order = np.argsort(ts, kind='stable')
+        return ts[order], rows[order, 1:]
+    return ts, rows[:, 1:]
+
+
+def _queryset(user, since, until):
+    qs = SampleBlock.objects.filter(user_id=getattr(user, 'pk', user))
+    if since is not None:
+        qs = qs.filter(minute__gt=since - timedelta(minutes=1))
+    if until is not None:
+        qs = qs.filter(minute__lt=until)
+    return qs
+
+
+def _clip(ts, values, since, until):
+    keep = np.ones(len(ts), dtype=bool)
+    if since is not None:
+        keep &= ts >= since.timestamp()
+    if until is not None:
+        keep &= ts < until.timestamp()
+    return (ts, values) if keep.all() else (ts[keep], values[keep])
+
+
+def read(user, since=None, until=None):
+    """(ts, values) of the user's packed samples in [since, until), oldest first."""
+    pairs = _queryset(user, since, until).order_by('minute', 'id').values_list('minute', 'data')
+    return _clip(*decode(pairs), since, until)
+
+
+def iter_chunks(user, since=None, until=None, newest_first=False, chunk_blocks=CHUNK_BLOCKS):
+    """Yield (ts, values) chunks of up to `chunk_blocks` minutes, read with QuerySet.iterator()."""
+    order = ('-minute', '-id') if newest_first else ('minute', 'id')
+    pairs = (_queryset(user, since, until).order_by(*order)
+             .values_list('minute', 'data').iterator(chunk_size=chunk_blocks))
+    while chunk := list(islice(pairs, chunk_blocks)):
+        if newest_first:
+            ts, values = decode(reversed(chunk))
+            ts, values = ts[::-1], values[::-1]
+        else:
+            ts, values = decode(chunk)
+        ts, values = _clip(ts, values, since, until)
+        if len(ts):
+            yield ts, values
+
+
+# ─── LATEST SAMPLE ────────────────────────────────────────────────────────────
+
+def _latest_queries(user):
+    return (FatigueLog.objects.filter(user=user).order_by('-timestamp')
+            .values_list('timestamp', 'fatigue_probability'),
+            # Two blocks: the newest minute may have one per model version
+            SampleBlock.objects.filter(user=user).order_by('-minute', '-id').values_list('minute', 'data')[:2])
+
+
+def _newest(row, packed):
+    for minute, data in packed:
+        last = unpack(data)[-1]
+        sample = (minute + timedelta(seconds=float(last[0])), float(last[1 + FATIGUE]))
+        if row is None or sample[0] >= row[0]:
+            row = sample
+    return row
+
+
+def latest(user):
+    """(timestamp, fatigue_probability) of the user's newest sample in either format, or None."""
+    rows, packed = _latest_queries(user)
+    return _newest(rows.first(), list(packed))
+
+
+async def alatest(user):
+    rows, packed = _latest_queries(user)
+    return _newest(await rows.afirst(), [block async for block in packed])
@@ -0,0 +1,106 @@
+"""Burnout scoring, for one user live and for many users in bulk.
+
+A day's burnout score is 0.6 x the day's average fatigue plus 0.4 x the
+fraction of the user's configured work day spent in sessions. The
+dashboard scores today for the signed-in user (views.calculate_burnout);
+`manage.py compute_burnout` scores every user for a range of days so
+users who never open the dashboard still get BurnoutRisk rows.
+
+The bulk path works on shards of users: each shard reads its settings,
+daily rollups and open sessions with one grouped query each, and writes
+one BurnoutRisk per (user, day) with a single upsert on that key, so
+re-running a shard is idempotent.
+"""
+import os
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import BurnoutRisk, DailyRollup, SessionLog, UserSettings
+from .timeranges import day_bounds, get_zone
+
+CHECKPOINT_DIR = getattr(settings, 'MONITOR_BURNOUT_CHECKPOINT_DIR',
+                         os.path.join(settings.BASE_DIR, 'checkpoints'))
+
+FATIGUE_WEIGHT = 0.6
+WORK_WEIGHT = 0.4
+MEDIUM_AT = 0.4
+HIGH_AT = 0.7
+DEFAULT_WORK_HOURS = UserSettings._meta.get_field('work_hours_per_day').default
+
+
+def score(avg_fatigue, work_minutes, work_hours_per_day):
+    """(burnout score, risk level) for a day's average fatigue and minutes worked."""
+    value = avg_fatigue * FATIGUE_WEIGHT + (work_minutes / 60 / work_hours_per_day) * WORK_WEIGHT
+    risk = "Low" if value < MEDIUM_AT else "Medium" if value < HIGH_AT else "High"
+    return value, risk
+
+
+def open_session_minutes(start, last_seen, day_start):
+    """Minutes of an open session on the day starting at `day_start`, up to its last heartbeat."""
+    return max((last_seen - max(start, day_start)).total_seconds() / 60, 0)
+
+
+def upsert(rows, batch_size=500):
+    BurnoutRisk.objects.bulk_create(
+        rows, batch_size=batch_size, update_conflicts=True, unique_fields=['user', 'day'],
+        update_fields=['weekly_avg_fatigue', 'burnout_score', 'risk_level', 'calculated_at'])
+
+
+# ─── BULK ─────────────────────────────────────────────────────────────────────
+
+def compute_shard(user_ids, first_day, last_day, now=None):
+    """Score and upsert first_day..last_day for `user_ids`. Returns rows written.
+
+    Days are each user's local dates. Only days with activity (a rollup
+    row, or today's open session) are scored. A past day is stamped with
+    its last second so reports key it to that day; today is stamped `now`.
+    """
+    now = now or timezone.now()
+    default_tz = timezone.get_default_timezone()
+    prefs = {uid: (hours, get_zone(name) or default_tz) for uid, hours, name in
+             UserSettings.objects.filter(user_id__in=user_ids)
+             .values_list('user_id', 'work_hours_per_day', 'timezone')}
+
+    days = defaultdict(dict)
+    for uid, day, total, count, minutes in (
+            DailyRollup.objects.filter(user_id__in=user_ids, day__gte=first_day, day__lte=last_day)
+            .values_list('user_id', 'day', 'fatigue_sum', 'fatigue_count', 'work_minutes')):
+        days[uid][day] = (total, count, minutes)
+
+    open_sessions = {}
+    for uid, start, last_activity in (SessionLog.objects.filter(user_id__in=user_ids, session_end__isnull=True)
+                                      .values_list('user_id', 'session_start', 'last_activity')):
+        open_sessions[uid] = (start, last_activity or start)
+
+    rows = []
+    for uid in user_ids:
+        hours, tz = prefs.get(uid, (DEFAULT_WORK_HOURS, default_tz))
+        today = timezone.localdate(now, tz)
+        by_day = days.get(uid, {})
+        if uid in open_sessions and first_day <= today <= last_day:
+            by_day.setdefault(today, (0.0, 0, 0.0))
+        for day, (total, count, minutes) in by_day.items():
+            day_start, day_end = day_bounds(day, tz)
+            if day == today and uid in open_sessions:
+                minutes += open_session_minutes(*open_sessions[uid], day_start)
+            avg = total / count if count else 0
+            value, risk = score(avg, minutes, hours)
+            rows.append(BurnoutRisk(
+                user_id=uid, day=day, weekly_avg_fatigue=avg, burnout_score=value, risk_level=risk,
+                calculated_at=now if day >= today else day_end - timedelta(seconds=1)))
+
+    with transaction.atomic():
+        upsert(rows)
+    return len(rows)
+
+
+def run_shard(user_ids, first_day, last_day, now):
+    """compute_shard() for a pool worker; returns (first id, last id, rows written)."""
+    try:
+        return user_ids[0], user_ids[-1], compute_shard(user_ids, first_day, last_day, now)
+    finally:
+        connections.close_all()
@@ -0,0 +1,175 @@
+"""Cached per-user lookups for the ingestion path.
+
+Every telemetry sample needs the user's settings and their active session,
+and may raise alerts subject to a per-type cooldown. These are kept in
+Django's cache framework; settings and sessions are invalidated explicitly
+where they change (settings saves, session open and close). With the
+default local-memory backend each worker process has its own copy, so
+staleness across processes is bounded by the timeout; point CACHES at a
+shared backend to make invalidation and cooldowns global.
+
+Response validators are kept in the MONITOR_VALIDATOR_CACHE alias, which
+should be a shared backend when several workers serve polls: a worker
+that missed a bump answers 304 for stale data until its copy expires.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.utils import timezone
+from django.utils.connection import ConnectionProxy
+
+from .models import AlertLog, SessionLog, UserSettings
+
+TIMEOUT = getattr(settings, 'MONITOR_CACHE_TIMEOUT', 300)
+
+validator_cache = ConnectionProxy(caches, getattr(settings, 'MONITOR_VALIDATOR_CACHE', 'default'))
+
+_NO_SESSION = 'none'
+
+
+def _settings_key(user_id):
+    return f'monitor:settings:{user_id}'
+
+
+def _session_key(user_id):
+    return f'monitor:active_session:{user_id}'
+
+
+def _burnout_key(user_id, day):
+    return f'monitor:burnout:{user_id}:{day.isoformat()}'
+
+
+def _cooldown_key(user_id, alert_type):
+    return f'monitor:alert_cooldown:{user_id}:{alert_type}'
+
+
+def _data_version_key(user_id):
+    return f'monitor:data_version:{user_id}'
+
+
+_GENERATION_KEY = 'monitor:data_generation'
+
+
+# ─── USER SETTINGS ────────────────────────────────────────────────────────────
+
+def get_user_settings(user):
+    key = _settings_key(user.pk)
+    s = cache.get(key)
+    if s is None:
+        s, _ = UserSettings.objects.get_or_create(user=user)
+        cache.set(key, s, TIMEOUT)
+    return s
+
+
+def invalidate_user_settings(user):
+    cache.delete(_settings_key(user.pk))
+
+
+# ─── ACTIVE SESSION ───────────────────────────────────────────────────────────
+
+def get_active_session(user):
+    """(session id, session_start) of the user's open session, or None."""
+    key = _session_key(user.pk)
+    cached = cache.get(key)
+    if cached is None:
+        active = (SessionLog.objects.filter(user=user, session_end__isnull=True)
+                  .values_list('id', 'session_start').first())
+        cache.set(key, active or _NO_SESSION, TIMEOUT)
+        return active
+    return None if cached == _NO_SESSION else cached
+
+
+def set_active_session(user, session):
+    """Record a newly opened session (or None once it has been closed)."""
+    value = (session.id, session.session_start) if session else _NO_SESSION
+    cache.set(_session_key(user.pk), value, TIMEOUT)
+
+
+def invalidate_active_session(user):
+    cache.delete(_session_key(user.pk))
+
+
+# ─── LAST PERSISTED BURNOUT ───────────────────────────────────────────────────
+
+def get_burnout_state(user, day):
+    """(BurnoutRisk id, risk_level, burnout_score) last written for `day`, if cached."""
+    return cache.get(_burnout_key(user.pk, day))
+
+
+def set_burnout_state(user, day, state):
+    cache.set(_burnout_key(user.pk, day), state, TIMEOUT)
+
+
+# ─── ALERT COOLDOWNS ──────────────────────────────────────────────────────────
+# A (user, alert_type) key exists exactly while that alert type is cooling
+# down: it holds the last-fired time and expires when the window ends.
+
+DEFAULT_COOLDOWN_MINUTES = 30
+
+
+def cooldown_for(alert_type):
+    minutes = getattr(settings, 'MONITOR_ALERT_COOLDOWN_MINUTES', {}).get(
+        alert_type, DEFAULT_COOLDOWN_MINUTES)
+    return timedelta(minutes=minutes)
+
+
+def claim_alert_slot(user, alert_type, now):
+    """True if an alert of this type may fire now; the caller must then create it.
+
+    Candidates inside the cooldown window are rejected from the cache alone.
+    On a cache miss the window is warmed from the latest AlertLog row, and
+    the slot is claimed with cache.add() so that concurrent workers sharing
+    the cache cannot both fire.
+    """
+    key = _cooldown_key(user.pk, alert_type)
+    if cache.get(key) is not None:
+        return False
+
+    window = cooldown_for(alert_type)
+    last = (AlertLog.objects.filter(user=user, alert_type=alert_type, timestamp__gte=now - window)
+            .order_by('-timestamp').values_list('timestamp', flat=True).first())
+    if last is not None:
+        remaining = max(int((last + window - now).total_seconds()), 1)
+        cache.add(key, last, remaining)
+        return False
+    return cache.add(key, now, int(window.total_seconds()))
+
+
+# ─── RESPONSE VALIDATORS ──────────────────────────────────────────────────────
+# Each user has a data version that changes whenever their samples or
+# rollups do, so polled endpoints can answer conditional GETs from the
+# cache alone. A version is (token, changed_at); a cold or expired
+# key gets a fresh token rather than being rebuilt, which costs each client
+# one full response but never reuses a token for different data. Full
+# rebuilds bump a global generation instead of every user.
+
+def _new_version():
+    return f'{time.time_ns():x}', timezone.now()
+
+
+def _current(key, timeout):
+    state = validator_cache.get(key)
+    if state is None:
+        validator_cache.add(key, _new_version(), timeout)
+        state = validator_cache.get(key) or _new_version()
+    return state
+
+
+def get_data_version(user):
+    """(ETag token, Last-Modified datetime) for the user's telemetry and rollups."""
+    key = _data_version_key(user.pk)
+    found = validator_cache.get_many([key, _GENERATION_KEY])   # one round trip on the hot path
+    token, changed_at = found.get(key) or _current(key, TIMEOUT)
+    generation, rebuilt_at = found.get(_GENERATION_KEY) or _current(_GENERATION_KEY, None)
+    return f'{generation}.{token}', max(changed_at, rebuilt_at)
+
+
+def bump_data_version(user):
+    validator_cache.set(_data_version_key(getattr(user, 'pk', user)), _new_version(), TIMEOUT)
+
+
+def bump_all_data_versions():
+    validator_cache.set(_GENERATION_KEY, _new_version(), None)
+
@@ -0,0 +1,68 @@
+"""In-process publish/subscribe hub for live dashboard updates.
+
+Each open Server-Sent Events connection subscribes a bounded asyncio.Queue
+for its user. Views publish from any thread (sync views run in a worker
+thread under ASGI); delivery is handed to the subscriber's event loop with
+call_soon_threadsafe. The hub lives in one process, so a publish only
+reaches connections served by the same worker process.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+QUEUE_SIZE = 100
+
+
+class Subscription:
+    def __init__(self, user_id, loop):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def _deliver(self, event):
+        if self.queue.full():
+            # Slow consumer: drop the oldest event rather than block publishers
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+
+class EventHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs = defaultdict(set)
+
+    def subscribe(self, user_id):
+        sub = Subscription(user_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subs[user_id].add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subs.get(sub.user_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[sub.user_id]
+
+    def has_subscribers(self, user_id):
+        return user_id in self._subs
+
+    def publish(self, user_id, event, **data):
+        with self._lock:
+            subs = list(self._subs.get(user_id, ()))
+        message = (event, data)
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub._deliver, message)
+            except RuntimeError:
+                # Loop already closed; the connection is going away
+                self.unsubscribe(sub)
+
+
+hub = EventHub()
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,21 @@
+"""Crash-safe file writes shared by the model and archive writers."""
+import os
+import tempfile
+
+
+def atomic_write(path, write):
+    """Call write(fh) on a temp file beside `path`, fsync it and rename it into place.
+
+    Readers see either the old file or the complete new one, never a
+    partial write. Temp files start with '.tmp-' so directory scans can skip them.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-', suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            write(fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
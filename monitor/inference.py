@@ -0,0 +1,80 @@
+"""Fast fatigue inference.
+
+The fatigue model is a 4-feature binary LogisticRegression, so scoring is a
+dot product and a sigmoid. Going through ``predict_proba`` for that pays for
+sklearn's input validation on every request; this module extracts the
+weights once and evaluates the model directly with NumPy, reusing
+per-thread buffers. Any other estimator falls back to ``predict_proba``.
+"""
+import math
+import threading
+
+import numpy as np
+
+N_FEATURES = 4   # blink_rate, eye_closure_duration, head_tilt_angle, session_minutes
+
+
+class FatigueScorer:
+    """Returns P(fatigued) for one sample or a batch of samples."""
+
+    def __init__(self, model, initial_capacity=64):
+        self.model = model
+        self._local = threading.local()
+        self._initial_capacity = initial_capacity
+
+        coef = getattr(model, "coef_", None)
+        classes = getattr(model, "classes_", None)
+        self.is_linear = (
+            type(model).__name__ == "LogisticRegression"
+            and coef is not None and np.shape(coef) == (1, N_FEATURES)
+            and classes is not None and len(classes) == 2
+        )
+        if self.is_linear:
+            self._weights = np.ascontiguousarray(coef[0], dtype=np.float64)
+            self._bias = float(np.ravel(model.intercept_)[0])
+
+    # ── buffers (one set per thread so concurrent requests never share them) ──
+
+    def _buffers(self, n):
+        local = self._local
+        capacity = getattr(local, "capacity", 0)
+        if capacity < n:
+            capacity = max(n, self._initial_capacity, capacity * 2)
+            local.X = np.empty((capacity, N_FEATURES), dtype=np.float64)
+            local.z = np.empty(capacity, dtype=np.float64)
+            local.capacity = capacity
+        return local.X[:n], local.z[:n]
+
+    # ── public API ────────────────────────────────────────────────────────────
+
+    def predict_one(self, blink, closure, tilt, session_minutes):
+        if not self.is_linear:
+            return float(self.model.predict_proba([[blink, closure, tilt, session_minutes]])[0][1])
+        w = self._weights
+        z = (self._bias + w[0] * blink + w[1] * closure
+             + w[2] * tilt + w[3] * session_minutes)
+        # Numerically stable logistic
+        if z >= 0:
+            return 1.0 / (1.0 + math.exp(-z))
+        e = math.exp(z)
+        return e / (1.0 + e)
+
+    def predict_batch(self, rows):
+        """Score a sequence of 4-feature rows; returns a list of floats."""
+        n = len(rows)
+        if n == 0:
+            return []
+        if not self.is_linear:
+            return self.model.predict_proba(np.asarray(rows, dtype=np.float64))[:, 1].tolist()
+
+        X, z = self._buffers(n)
+        X[...] = rows
+        np.dot(X, self._weights, out=z)
+        z += self._bias
+        # sigmoid(z) = 1 / (1 + exp(-z)), evaluated in place
+        np.negative(z, out=z)
+        with np.errstate(over="ignore"):
+            np.exp(z, out=z)
+        z += 1.0
+        np.reciprocal(z, out=z)
+        return z.tolist()
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import platform
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+SAMPLE = {'blink_rate': 12, 'eye_closure_duration': 0.4, 'head_tilt_angle': 9}
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+class Command(BaseCommand):
+    help = ("Drive one endpoint with many concurrent clients through Django's WSGI and ASGI "
+            "request handlers in-process and compare throughput and latency. WSGI requests "
+            "are served by a fixed pool of threads, like a threaded WSGI server; ASGI requests "
+            "all run on one event loop, each in its own thread-sensitive context as under an "
+            "ASGI server.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', default='loadtest00000',
+                            help="User to run as (see generate_load_data).")
+        parser.add_argument('--view', default='save_fatigue',
+                            choices=['save_fatigue', 'current_fatigue', 'analytics_data'])
+        parser.add_argument('--batch', type=int, default=10,
+                            help="Samples per save_fatigue request (default: %(default)s).")
+        parser.add_argument('--concurrency', type=int, default=64,
+                            help="Clients with a request in flight at once (default: %(default)s).")
+        parser.add_argument('--threads', type=int, default=8,
+                            help="WSGI worker threads (default: %(default)s).")
+        parser.add_argument('--requests', type=int, default=1000,
+                            help="Requests per mode (default: %(default)s).")
+        parser.add_argument('--mode', action='append', choices=['wsgi', 'asgi'],
+                            help="Only run this mode (may be repeated).")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--rate-limits', action='store_true',
+                            help="Keep MONITOR_RATE_LIMITS (lifted by default: one user drives every request).")
+
+    def handle(self, *args, username, view, batch, concurrency, threads, requests, mode, output, rate_limits,
+               **options):
+        try:
+            user = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f"User '{username}' not found; run generate_load_data first.")
+
+        login = Client()
+        login.force_login(user)
+        self.session_cookie = login.cookies[settings.SESSION_COOKIE_NAME].value
+        self.view, self.batch = view, batch
+        self.path = reverse(view)
+
+        results = {}
+        limits = {} if rate_limits else {'MONITOR_RATE_LIMITS': {}}
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], **limits):
+            for name in mode or ['wsgi', 'asgi']:
+                if name == 'wsgi':
+                    timings, statuses, elapsed = self._run_wsgi(requests, threads)
+                else:
+                    timings, statuses, elapsed = asyncio.run(self._run_asgi(requests, concurrency))
+                results[name] = r = self._summarize(timings, statuses, elapsed)
+                self.stdout.write(f"{name}  {r['throughput_rps']:9.1f} req/s  p50 {r['p50_ms']:8.2f} ms  "
+                                  f"p95 {r['p95_ms']:8.2f} ms  p99 {r['p99_ms']:8.2f} ms  {r['statuses']}")
+
+        if len(results) == 2 and results['wsgi']['throughput_rps']:
+            ratio = results['asgi']['throughput_rps'] / results['wsgi']['throughput_rps']
+            self.stdout.write(f"asgi/wsgi throughput: {ratio:.2f}x")
+
+        if output:
+            with open(output, 'w') as fh:
+                json.dump({
+                    'created': timezone.now().isoformat(),
+                    'python': platform.python_version(),
+                    'user': username, 'view': view, 'batch': batch,
+                    'concurrency': concurrency, 'threads': threads, 'requests': requests,
+                    'modes': results,
+                }, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {output}"))
+
+    # ── request bodies ────────────────────────────────────────────────────────
+
+    def _request(self):
+        """(method, data, extra kwargs) for one request."""
+        if self.view == 'save_fatigue':
+            now_ms = time.time() * 1000
+            body = [dict(SAMPLE, ts=now_ms - i * 1000) for i in range(self.batch)]
+            return 'post', json.dumps(body), {'content_type': 'application/json'}
+        if self.view == 'analytics_data':
+            return 'get', {'period': 30}, {}
+        return 'get', None, {}
+
+    # ── modes ─────────────────────────────────────────────────────────────────
+
+    def _run_wsgi(self, requests, threads):
+        local = threading.local()
+
+        def one(_):
+            client = getattr(local, 'client', None)
+            if client is None:
+                client = local.client = Client()
+                client.cookies[settings.SESSION_COOKIE_NAME] = self.session_cookie
+            method, data, extra = self._request()
+            started = time.perf_counter()
+            response = getattr(client, method)(self.path, data, **extra)
+            return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            done = list(pool.map(one, range(requests)))
+        elapsed = time.perf_counter() - started
+        return [t for t, _ in done], [s for _, s in done], elapsed
+
+    async def _run_asgi(self, requests, concurrency):
+        client = AsyncClient()
+        client.cookies[settings.SESSION_COOKIE_NAME] = self.session_cookie
+        gate = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with gate:
+                method, data, extra = self._request()
+                started = time.perf_counter()
+                async with ThreadSensitiveContext():
+                    response = await getattr(client, method)(self.path, data, **extra)
+                return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        done = await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+        return [t for t, _ in done], [s for _, s in done], elapsed
+
+    @staticmethod
+    def _summarize(timings, statuses, elapsed):
+        ms = sorted(t * 1000 for t in timings)
+        return {
+            'requests': len(ms),
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(len(ms) / elapsed, 1) if elapsed else 0.0,
+            'mean_ms': round(statistics.fmean(ms), 3),
+            'p50_ms': round(_percentile(ms, 0.50), 3),
+            'p95_ms': round(_percentile(ms, 0.95), 3),
+            'p99_ms': round(_percentile(ms, 0.99), 3),
+            'statuses': dict(Counter(statuses)),
+        }
@@ -0,0 +1,161 @@
+import json
+import platform
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from monitor import urls as monitor_urls
+from monitor.models import AlertLog
+
+# How to call each route; anything not listed is a plain GET.
+REQUESTS = {
+    'save_fatigue': ('post', {'blink_rate': 12, 'eye_closure_duration': 0.4, 'head_tilt_angle': 9}),
+    'save_fatigue[batch]': ('post', [{'blink_rate': 12, 'eye_closure_duration': 0.4,
+                                      'head_tilt_angle': 9, 'ts': None}] * 30),
+    'acknowledge_all': ('post', None),
+    'create_break_alert': ('post', None),
+}
+SKIP = {'event_stream',     # long-lived stream, not a request/response endpoint
+        'metrics'}          # staff-only
+
+
+class _VMSteps:
+    """Counts SQLite virtual-machine steps as a proxy for rows scanned."""
+    GRANULARITY = 100
+
+    def __init__(self):
+        self.steps = 0
+
+    def _tick(self):
+        self.steps += self.GRANULARITY
+        return 0
+
+    def __enter__(self):
+        if connection.vendor == 'sqlite':
+            connection.ensure_connection()
+            connection.connection.set_progress_handler(self._tick, self.GRANULARITY)
+        return self
+
+    def __exit__(self, *exc):
+        if connection.vendor == 'sqlite':
+            connection.connection.set_progress_handler(None, 0)
+
+
+class Command(BaseCommand):
+    help = ("Time every view in monitor/urls.py as a load-test user and record wall time, "
+            "query count and SQLite VM steps to JSON; optionally fail on regressions "
+            "against a baseline file.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', default='loadtest00000',
+                            help="User to run as (see generate_load_data).")
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', default='bench_results.json')
+        parser.add_argument('--baseline', help="Earlier results file to compare against.")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Allowed fractional slowdown of median wall time (default: %(default)s).")
+        parser.add_argument('--only', action='append', metavar='URL_NAME',
+                            help="Only benchmark this route (may be repeated).")
+        parser.add_argument('--rate-limits', action='store_true',
+                            help="Keep MONITOR_RATE_LIMITS (lifted by default: one user drives every request).")
+
+    def handle(self, *args, username, repeat, output, baseline, tolerance, only, rate_limits, **options):
+        try:
+            user = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f"User '{username}' not found; run generate_load_data first.")
+
+        client = Client()
+        client.force_login(user)
+        cache.clear()
+
+        results = {}
+        limits = {} if rate_limits else {'MONITOR_RATE_LIMITS': {}}
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], **limits):
+            for name, path, method, body in self._targets(user):
+                if only and name not in only and name.split('[')[0] not in only:
+                    continue
+                results[name] = r = self._measure(client, path, method, body, repeat)
+                self.stdout.write(f"{name:28s} {r['status']} {r['median_ms']:9.2f} ms  {r['queries']:4d} queries  "
+                                  f"{r['vm_steps']:>10d} vm steps  {r['bytes']:>8d} B")
+
+        report = {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'user': username,
+            'repeat': repeat,
+            'views': results,
+        }
+        with open(output, 'w') as fh:
+            json.dump(report, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {output}"))
+
+        if baseline:
+            self._compare(baseline, results, tolerance)
+
+    def _targets(self, user):
+        alert_id = AlertLog.objects.filter(user=user).values_list('id', flat=True).first() or 0
+        for pattern in monitor_urls.urlpatterns:
+            name = pattern.name
+            if name in SKIP:
+                continue
+            path = reverse(name, kwargs={'alert_id': alert_id} if 'alert_id' in str(pattern.pattern) else None)
+            for key in (name, f'{name}[batch]'):
+                if key in REQUESTS:
+                    method, body = REQUESTS[key]
+                    yield key, path, method, body
+                elif key == name:
+                    yield key, path, 'get', None
+
+    def _measure(self, client, path, method, body, repeat):
+        timings = []
+        for _ in range(repeat):
+            if isinstance(body, list):
+                now_ms = time.time() * 1000
+                body = [dict(sample, ts=now_ms - i * 10000) for i, sample in enumerate(body)]
+            with CaptureQueriesContext(connection) as ctx, _VMSteps() as vm:
+                started = time.perf_counter()
+                if method == 'post':
+                    response = client.post(path, json.dumps(body) if body is not None else None,
+                                           content_type='application/json')
+                else:
+                    response = client.get(path)
+                content = (b''.join(response.streaming_content) if response.streaming
+                           else response.content)
+                timings.append((time.perf_counter() - started) * 1000)
+        return {
+            'path': path,
+            'status': response.status_code,
+            'median_ms': round(statistics.median(timings), 3),
+            'min_ms': round(min(timings), 3),
+            'max_ms': round(max(timings), 3),
+            'queries': len(ctx.captured_queries),
+            'db_ms': round(sum(float(q['time']) for q in ctx.captured_queries) * 1000, 3),
+            'vm_steps': vm.steps,
+            'bytes': len(content),
+        }
+
+    def _compare(self, baseline_path, results, tolerance):
+        with open(baseline_path) as fh:
+            base = json.load(fh)['views']
+        failures = []
+        for name, r in results.items():
+            b = base.get(name)
+            if b is None:
+                continue
+            if r['median_ms'] > b['median_ms'] * (1 + tolerance):
+                failures.append(f"{name}: {b['median_ms']:.2f} -> {r['median_ms']:.2f} ms")
+            if r['queries'] > b['queries']:
+                failures.append(f"{name}: {b['queries']} -> {r['queries']} queries")
+        if failures:
+            raise CommandError("Regressions against baseline:\n  " + "\n  ".join(failures))
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {baseline_path}."))
@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from monitor import sketches
+
+
+class Command(BaseCommand):
+    help = ("Build the population work-hours sketch for closed UTC days from the daily rollups; "
+            "with --samples also rebuild the fatigue and blink-rate sketches from the logs "
+            "(for backfilling days ingested before sketches existed).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First UTC day (YYYY-MM-DD; default: yesterday).")
+        parser.add_argument('--end', help="Last UTC day, inclusive (default: --start).")
+        parser.add_argument('--samples', action='store_true',
+                            help="Also rebuild the sample sketches; only for days no longer ingesting.")
+
+    def handle(self, *args, start, end, samples, **options):
+        yesterday = datetime.now(dt_timezone.utc).date() - timedelta(days=1)
+        first = parse_date(start) if start else yesterday
+        last = parse_date(end) if end else first
+        if first is None or last is None or first > last:
+            raise CommandError("--start/--end must be YYYY-MM-DD with start <= end.")
+
+        day = first
+        while day <= last:
+            sketches.rebuild(day, samples=samples)
+            day += timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS(f"Built sketches for {first}..{last}."))
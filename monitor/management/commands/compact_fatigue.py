@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from monitor import retention
+
+
+class Command(BaseCommand):
+    help = ("Fold raw FatigueLog samples older than the retention age into per-bucket "
+            "FatigueAggregate rows and delete the raw rows.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=float, default=retention.RAW_DAYS,
+                            help="Compact samples older than this many days (default: %(default)s).")
+        parser.add_argument('--bucket-seconds', type=int, default=retention.BUCKET_SECONDS,
+                            choices=retention.BUCKET_CHOICES,
+                            help="Aggregate bucket width (default: %(default)s).")
+        parser.add_argument('--chunk-size', type=int, default=retention.DELETE_CHUNK,
+                            help="Raw rows deleted per DELETE statement (default: %(default)s).")
+        parser.add_argument('--user', action='append', dest='usernames', metavar='USERNAME',
+                            help="Only compact this user (may be repeated).")
+
+    def handle(self, *args, older_than_days, bucket_seconds, chunk_size, usernames=None, **options):
+        if older_than_days < 0 or chunk_size < 1:
+            raise CommandError("--older-than-days must be >= 0 and --chunk-size >= 1.")
+        users = None
+        if usernames:
+            users = list(User.objects.filter(username__in=usernames))
+        n = retention.compact(timedelta(days=older_than_days), bucket_seconds, chunk_size, users)
+        self.stdout.write(self.style.SUCCESS(f"Compacted {n} raw samples."))
@@ -0,0 +1,128 @@
+import json
+import multiprocessing
+import os
+import time
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from monitor import burnout
+from monitor.files import atomic_write
+
+MAX_DAYS = 366
+
+
+class Command(BaseCommand):
+    help = ("Compute BurnoutRisk for every user over a day or date range, sharding users across "
+            "a process pool. Finished shards are checkpointed, so re-running the same range "
+            "after an interruption only computes what is left.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Day to compute (YYYY-MM-DD; default: yesterday).")
+        parser.add_argument('--start', help="First day of a range (YYYY-MM-DD).")
+        parser.add_argument('--end', help="Last day of a range, inclusive (default: --start).")
+        parser.add_argument('--user', action='append', dest='usernames', metavar='USERNAME',
+                            help="Only compute this user (may be repeated).")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Worker processes; 1 runs in this process (default: %(default)s).")
+        parser.add_argument('--shard-size', type=int, default=2000,
+                            help="Users per shard (default: %(default)s).")
+        parser.add_argument('--checkpoint', help="Checkpoint file (default: one per range in "
+                                                 "MONITOR_BURNOUT_CHECKPOINT_DIR).")
+        parser.add_argument('--restart', action='store_true',
+                            help="Ignore an existing checkpoint and compute every shard.")
+
+    def handle(self, *args, date, start, end, usernames, workers, shard_size, checkpoint, restart, **options):
+        first, last = self._range(date, start, end)
+        if shard_size < 1:
+            raise CommandError("--shard-size must be >= 1.")
+
+        users = User.objects.order_by('id')
+        if usernames:
+            users = users.filter(username__in=usernames)
+        user_ids = list(users.values_list('id', flat=True))
+
+        path = checkpoint or os.path.join(burnout.CHECKPOINT_DIR, f'burnout-{first}-{last}.json')
+        state = {'first': first.isoformat(), 'last': last.isoformat(), 'done': []}
+        if not restart and os.path.exists(path):
+            with open(path) as fh:
+                saved = json.load(fh)
+            if (saved['first'], saved['last']) != (state['first'], state['last']):
+                raise CommandError(f"{path} is for {saved['first']}..{saved['last']}; use --restart.")
+            state = saved
+        pending = self._pending(user_ids, state['done'])
+        shards = [pending[i:i + shard_size] for i in range(0, len(pending), shard_size)]
+        if len(pending) < len(user_ids):
+            self.stdout.write(f"Resuming: {len(user_ids) - len(pending)} users already done.")
+
+        now = timezone.now()
+        started = time.perf_counter()
+        rows = 0
+        for lo, hi, n in self._run(shards, first, last, now, workers):
+            rows += n
+            state['done'].append([lo, hi])
+            self._save(path, state)
+            self.stdout.write(f"  users {lo}-{hi}: {n} rows")
+
+        if os.path.exists(path):
+            os.remove(path)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Computed {rows} burnout rows for {len(pending)} users, {first}..{last}, "
+            f"in {elapsed:.1f}s ({len(shards)} shards)."))
+
+    def _range(self, date, start, end):
+        if date and (start or end):
+            raise CommandError("Use either --date or --start/--end.")
+        if date or start:
+            first = parse_date(date or start)
+            last = parse_date(end) if end else first
+            if first is None or last is None:
+                raise CommandError("Dates must be YYYY-MM-DD.")
+        elif end:
+            raise CommandError("--end needs --start.")
+        else:
+            first = last = timezone.localdate() - timedelta(days=1)
+        if not first <= last or (last - first).days >= MAX_DAYS:
+            raise CommandError(f"The range must run forwards and cover at most {MAX_DAYS} days.")
+        return first, last
+
+    @staticmethod
+    def _pending(user_ids, done):
+        """User ids not covered by a finished [lo, hi] shard."""
+        done = sorted(done)
+        starts = [lo for lo, _ in done]
+        pending = []
+        for uid in user_ids:
+            i = bisect_right(starts, uid) - 1
+            if i < 0 or uid > done[i][1]:
+                pending.append(uid)
+        return pending
+
+    @staticmethod
+    def _save(path, state):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        data = json.dumps(state).encode()
+        atomic_write(path, lambda fh: fh.write(data))
+
+    @staticmethod
+    def _run(shards, first, last, now, workers):
+        """Yield (first id, last id, rows) as shards finish."""
+        if workers <= 1 or len(shards) <= 1:
+            for shard in shards:
+                yield shard[0], shard[-1], burnout.compute_shard(shard, first, last, now)
+            return
+        # Forked workers inherit the configured app registry; they must not
+        # inherit an open database connection
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards)),
+                                 mp_context=multiprocessing.get_context('fork')) as pool:
+            futures = [pool.submit(burnout.run_shard, shard, first, last, now) for shard in shards]
+            for future in as_completed(futures):
+                yield future.result()
@@ -0,0 +1,27 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from monitor import archive
+
+
+class Command(BaseCommand):
+    help = ("Export closed months of fatigue telemetry (raw and compacted) to per-user "
+            "columnar .npy segments used for long-range analytics.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='usernames', metavar='USERNAME',
+                            help="Only export this user (may be repeated).")
+        parser.add_argument('--force', action='store_true',
+                            help="Re-export months that are already archived.")
+        parser.add_argument('--include-current', action='store_true',
+                            help="Also export the current, still-open month up to now.")
+
+    def handle(self, *args, usernames=None, force, include_current, **options):
+        users = None
+        if usernames:
+            users = list(User.objects.filter(username__in=usernames))
+        now = timezone.now()
+        through = archive.next_month(archive.month_start(now)) if include_current else None
+        segments, rows = archive.export(users, through=through, force=force, now=now)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {segments} segments ({rows} rows)."))
@@ -0,0 +1,124 @@
+import re
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from monitor import blocks, burnout, rollups
+from monitor.registry import registry
+from monitor.models import AlertLog, BurnoutRisk, FatigueLog, SampleBlock, SessionLog, UserSettings
+
+SAMPLE_SECONDS = 10
+ALERT_GAP_MINUTES = 30
+INSERT_BATCH = 5000
+
+
+class Command(BaseCommand):
+    help = ("Generate synthetic load-test data for N users x M days: sessions, 10-second "
+            "FatigueLog samples, alerts and burnout rows, written with bulk inserts.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--days', type=int, default=30)
+        parser.add_argument('--prefix', default='loadtest',
+                            help="Username prefix; previously generated users (prefix plus a "
+                                 "five-digit index) are replaced.")
+        parser.add_argument('--password', default='loadtest-pw')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--packed', action='store_true',
+                            help="Store samples as packed minute blocks (MONITOR_SAMPLE_BLOCKS) "
+                                 "instead of FatigueLog rows.")
+
+    def handle(self, *args, users, days, prefix, password, seed, packed, **options):
+        if users < 1 or days < 1:
+            raise CommandError("--users and --days must be positive.")
+        model = registry.get()
+
+        rng = np.random.default_rng(seed)
+        self.packed = packed
+        # Only names this command generates, never e.g. a real "loadtester"
+        generated = User.objects.filter(username__regex=rf'^{re.escape(prefix)}\d{{5}}$')
+        generated.delete()
+        pw_hash = make_password(password)
+        User.objects.bulk_create([
+            User(username=f"{prefix}{i:05d}", password=pw_hash) for i in range(users)])
+        created = list(generated.order_by('id'))
+        UserSettings.objects.bulk_create([UserSettings(user=u) for u in created])
+
+        today = datetime.now(dt_timezone.utc).date()
+        totals = {'sessions': 0, 'samples': 0, 'alerts': 0}
+        for user in created:
+            with transaction.atomic():
+                for offset in range(days, 0, -1):
+                    self._generate_day(user, today - timedelta(days=offset), rng, model, totals)
+        rollups.rebuild(created)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {users} users x {days} days: {totals['sessions']} sessions, "
+            f"{totals['samples']} samples, {totals['alerts']} alerts."))
+
+    def _generate_day(self, user, day, rng, model, totals):
+        # One or two work blocks starting mid-morning
+        start = datetime.combine(day, time(8), tzinfo=dt_timezone.utc) + timedelta(minutes=int(rng.integers(0, 180)))
+        sessions, day_probs, day_minutes = [], [], 0.0
+        for _ in range(int(rng.integers(1, 3))):
+            minutes = int(rng.integers(45, 300))
+            end = start + timedelta(minutes=minutes)
+            sessions.append(SessionLog(user=user, session_start=start, session_end=end, last_activity=end,
+                                       total_duration_minutes=float(minutes)))
+            day_probs.append(self._generate_samples(user, start, minutes, rng, model, totals))
+            day_minutes += minutes
+            start = end + timedelta(minutes=int(rng.integers(20, 120)))
+        SessionLog.objects.bulk_create(sessions)
+        totals['sessions'] += len(sessions)
+
+        avg_fatigue = float(np.concatenate(day_probs).mean())
+        score, risk = burnout.score(avg_fatigue, day_minutes, burnout.DEFAULT_WORK_HOURS)
+        BurnoutRisk.objects.create(user=user, day=day, weekly_avg_fatigue=avg_fatigue, burnout_score=score,
+                                   risk_level=risk, calculated_at=sessions[-1].session_end)
+
+    def _generate_samples(self, user, start, minutes, rng, model, totals):
+        n = minutes * 60 // SAMPLE_SECONDS
+        offsets = np.arange(n) * SAMPLE_SECONDS
+        session_minutes = offsets / 60
+        drift = session_minutes / 480          # users tire as the session goes on
+        blink = np.clip(rng.normal(15 - 8 * drift, 4), 1, 35)
+        closure = np.clip(rng.gamma(1.5, 0.3 + drift), 0, 5)
+        tilt = np.abs(rng.normal(6 + 10 * drift, 6))
+        X = np.column_stack([blink, closure, tilt, session_minutes])
+        probs = np.asarray(model.scorer.predict_batch(X.tolist()))
+
+        stamps = [start + timedelta(seconds=int(s)) for s in offsets]
+        if self.packed:
+            SampleBlock.objects.bulk_create(
+                blocks.build(user, start.timestamp() + offsets, np.column_stack([blink, closure, tilt, probs]),
+                             model.version),
+                batch_size=INSERT_BATCH)
+        else:
+            FatigueLog.objects.bulk_create([
+                FatigueLog(user=user, blink_rate=b, eye_closure_duration=c, head_tilt_angle=t,
+                           fatigue_probability=p, timestamp=ts, model_version=model.version)
+                for b, c, t, p, ts in zip(blink.tolist(), closure.tolist(), tilt.tolist(), probs.tolist(), stamps)
+            ], batch_size=INSERT_BATCH)
+        totals['samples'] += n
+
+        # At most one alert per type per cooldown window, like the live path
+        alerts = []
+        window = (session_minutes // ALERT_GAP_MINUTES).astype(int)
+        for alert_type, mask, values, message in (
+            ('fatigue_high', probs >= 0.75, probs, "Fatigue probability at {:.0%} — consider taking a break."),
+            ('fatigue_med', (probs >= 0.6) & (probs < 0.75), probs, "Fatigue probability at {:.0%} — consider taking a break."),
+            ('posture', tilt > 15, tilt, "Poor posture detected — head tilt at {:.1f}°."),
+        ):
+            idx = np.flatnonzero(mask)
+            _, first = np.unique(window[idx], return_index=True)
+            for i in idx[first]:
+                alerts.append(AlertLog(user=user, alert_type=alert_type, message=message.format(values[i]),
+                                       value=float(values[i]), acknowledged=bool(rng.random() < 0.7),
+                                       timestamp=stamps[i]))
+        AlertLog.objects.bulk_create(alerts, batch_size=INSERT_BATCH)
+        totals['alerts'] += len(alerts)
+        return probs
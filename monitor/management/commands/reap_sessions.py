@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monitor import sessions
+
+
+class Command(BaseCommand):
+    help = ("Close sessions with no telemetry heartbeat for longer than the idle limit, "
+            "ending them at their last heartbeat.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--idle-minutes', type=float, default=sessions.IDLE_MINUTES,
+                            help="Close sessions idle longer than this (default: %(default)s).")
+        parser.add_argument('--chunk-size', type=int, default=sessions.REAP_CHUNK,
+                            help="Sessions closed per transaction (default: %(default)s).")
+
+    def handle(self, *args, idle_minutes, chunk_size, **options):
+        if idle_minutes <= 0 or chunk_size < 1:
+            raise CommandError("--idle-minutes must be > 0 and --chunk-size >= 1.")
+        n = sessions.reap(timedelta(minutes=idle_minutes), chunk_size)
+        self.stdout.write(self.style.SUCCESS(f"Closed {n} idle sessions."))
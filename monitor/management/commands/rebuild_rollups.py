@@ -0,0 +1,19 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from monitor import rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily/hourly fatigue rollups from raw FatigueLog and SessionLog rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='usernames', metavar='USERNAME',
+                            help="Only rebuild this user (may be repeated).")
+
+    def handle(self, *args, usernames=None, **options):
+        users = None
+        if usernames:
+            users = list(User.objects.filter(username__in=usernames))
+        days, hours = rollups.rebuild(users)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {days} daily and {hours} hourly rollup rows."))
@@ -0,0 +1,180 @@
+"""In-process request metrics in Prometheus text exposition format.
+
+Every thread records into its own shard, so the hot path takes no lock;
+a lock is only taken the first time a thread records anything and when
+/metrics/ merges the shards. A scrape can observe a shard mid-update, which
+at worst skews one sample between two scrapes. When a thread exits its
+shard is folded into a shared retired shard, so thread-per-request
+servers and recycled executor threads do not grow the shard list.
+"""
+import threading
+import weakref
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+_lock = threading.Lock()
+_local = threading.local()
+_retired = {}            # totals from threads that have exited
+_shards = [_retired]
+_metrics = []
+
+
+class _Owner:
+    """Kept only in the thread-local, so it is freed when its thread exits."""
+    __slots__ = ('__weakref__',)
+
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = {}
+        _local.owner = _Owner()
+        with _lock:
+            _shards.append(shard)
+        weakref.finalize(_local.owner, _retire, shard)
+    return shard
+
+
+def _retire(shard):
+    with _lock:
+        _shards[:] = [s for s in _shards if s is not shard]
+        for key, value in shard.items():
+            if isinstance(value, list):     # histogram: bucket counts, then sum
+                acc = _retired.setdefault(key, [0] * len(value))
+                for i, v in enumerate(value):
+                    acc[i] += v
+            else:
+                _retired[key] = _retired.get(key, 0) + value
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name, self.help, self.labelnames = name, help_text, tuple(labelnames)
+        _metrics.append(self)
+
+    def inc(self, amount=1, *labels):
+        shard = _shard()
+        key = (self.name, labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def collect(self, shards):
+        merged = {}
+        for shard in shards:
+            for (name, labels), value in list(shard.items()):
+                if name == self.name:
+                    merged[labels] = merged.get(labels, 0) + value
+        for labels, value in sorted(merged.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets, labelnames=()):
+        self.name, self.help, self.labelnames = name, help_text, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        _metrics.append(self)
+
+    def observe(self, value, *labels):
+        shard = _shard()
+        key = (self.name, labels)
+        entry = shard.get(key)
+        if entry is None:
+            # per-bucket counts (last slot is +Inf), then sum
+            entry = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def collect(self, shards):
+        n = len(self.buckets) + 1
+        merged = {}
+        for shard in shards:
+            for (name, labels), entry in list(shard.items()):
+                if name != self.name:
+                    continue
+                acc = merged.setdefault(labels, [0] * n + [0.0])
+                for i, v in enumerate(entry):
+                    acc[i] += v
+        for labels, acc in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), acc[:n]):
+                cumulative += count
+                lbl = _labels(self.labelnames + ('le',), labels + (bound,))
+                yield f"{self.name}_bucket{lbl} {cumulative}"
+            lbl = _labels(self.labelnames, labels)
+            yield f"{self.name}_sum{lbl} {acc[-1]}"
+            yield f"{self.name}_count{lbl} {cumulative}"
+
+
+class Sampled:
+    """Value read from a callback at scrape time, e.g. another component's counters."""
+
+    def __init__(self, name, help_text, read, kind='gauge'):
+        self.name, self.help, self.read, self.kind = name, help_text, read, kind
+        _metrics.append(self)
+
+    def collect(self, shards):
+        value = self.read()
+        if value is not None:
+            yield f"{self.name} {value}"
+
+
+request_latency = Histogram('neurowatch_request_duration_seconds',
+                            'Request latency by URL name.', LATENCY_BUCKETS, ['view'])
+request_queries = Histogram('neurowatch_request_db_queries',
+                            'Database queries per request by URL name.', QUERY_COUNT_BUCKETS, ['view'])
+db_time = Histogram('neurowatch_request_db_duration_seconds',
+                    'Time spent in database queries per request by URL name.', LATENCY_BUCKETS, ['view'])
+response_size = Histogram('neurowatch_response_size_bytes',
+                          'Response body size by URL name.', SIZE_BUCKETS, ['view'])
+inference_latency = Histogram('neurowatch_inference_duration_seconds',
+                              'Fatigue model scoring time per save_fatigue call.', LATENCY_BUCKETS)
+inference_samples = Counter('neurowatch_inference_samples_total', 'Samples scored by the fatigue model.')
+
+
+def _write_behind_stat(name):
+    def read():
+        from .writebehind import ENABLED, write_behind
+        return write_behind.stats()[name] if ENABLED else None
+    return read
+
+
+for _stat, _kind, _help in (
+    ('queue_depth',    'gauge',   'Fatigue rows waiting in the write-behind queue.'),
+    ('enqueued_rows',  'counter', 'Fatigue rows accepted by the write-behind queue.'),
+    ('rejected_rows',  'counter', 'Fatigue rows rejected because the write-behind queue was full.'),
+    ('flushed_rows',   'counter', 'Fatigue rows committed by the write-behind writer.'),
+    ('flushes',        'counter', 'Write-behind group commits.'),
+    ('failed_flushes', 'counter', 'Write-behind group commit attempts that failed.'),
+    ('dropped_rows',   'counter', 'Fatigue rows dropped after every write-behind commit attempt failed.'),
+    ('last_flush_ms',  'gauge',   'Duration of the last write-behind commit in milliseconds.'),
+    ('max_flush_ms',   'gauge',   'Longest write-behind commit in milliseconds.'),
+):
+    Sampled(f'neurowatch_write_behind_{_stat}' + ('_total' if _kind == 'counter' else ''),
+            _help, _write_behind_stat(_stat), _kind)
+
+
+def render():
+    with _lock:
+        shards = list(_shards)
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.collect(shards))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,130 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import connection
+from django.utils import timezone
+
+from . import metrics
+from .models import UserSettings
+from .timeranges import get_zone
+
+TZ_SESSION_KEY = 'user_tz'
+
+
+def remember_user_timezone(request, name):
+    request.session[TZ_SESSION_KEY] = name
+
+
+class UserTimezoneMiddleware:
+    """Activates the user's configured timezone for the request.
+
+    The zone name is kept in the session so the settings row is only read
+    once per login rather than on every request.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        name = None
+        if request.user.is_authenticated:
+            name = request.session.get(TZ_SESSION_KEY)
+            if name is None:
+                name = (UserSettings.objects.filter(user=request.user)
+                        .values_list('timezone', flat=True).first() or 'UTC')
+                remember_user_timezone(request, name)
+        self._activate(name)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        user = await request.auser()
+        # Resolved here so sync code further in (view decorators, validators)
+        # reading request.user never queries from the event loop
+        request.user = user
+        name = None
+        if user.is_authenticated:
+            name = await request.session.aget(TZ_SESSION_KEY)
+            if name is None:
+                name = await (UserSettings.objects.filter(user=user)
+                              .values_list('timezone', flat=True).afirst()) or 'UTC'
+                await request.session.aset(TZ_SESSION_KEY, name)
+        self._activate(name)
+        return await self.get_response(request)
+
+    @staticmethod
+    def _activate(name):
+        tz = get_zone(name) if name else None
+        if tz:
+            timezone.activate(tz)
+        else:
+            timezone.deactivate()
+
+
+class RequestMetricsMiddleware:
+    """Records latency, DB query count/time and response size per URL name.
+
+    Outermost in MIDDLEWARE so session and auth queries are counted too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        queries = [0, 0.0]
+        started = time.perf_counter()
+        with connection.execute_wrapper(self._timer(queries)):
+            response = self.get_response(request)
+        self._observe(request, response, time.perf_counter() - started, queries)
+        return response
+
+    async def __acall__(self, request):
+        # Under ASGI the ORM runs in the request's sync thread, which has its
+        # own connection, so the wrapper is installed from that thread
+        queries = [0, 0.0]
+        wrapper = []
+
+        def install():
+            wrapper.append(connection.execute_wrapper(self._timer(queries)))
+            wrapper[0].__enter__()
+
+        started = time.perf_counter()
+        await sync_to_async(install)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(wrapper[0].__exit__)(None, None, None)
+        self._observe(request, response, time.perf_counter() - started, queries)
+        return response
+
+    @staticmethod
+    def _timer(queries):
+        def timed(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries[0] += 1
+                queries[1] += time.perf_counter() - started
+        return timed
+
+    @staticmethod
+    def _observe(request, response, elapsed, queries):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unresolved'
+        metrics.request_latency.observe(elapsed, view)
+        metrics.request_queries.observe(queries[0], view)
+        metrics.db_time.observe(queries[1], view)
+        if not response.streaming:
+            metrics.response_size.observe(len(response.content), view)
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0002_alertlog_usersettings'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fatiguelog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0004_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersettings',
+            name='timezone',
+            field=models.CharField(default='UTC', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='alertlog',
+            index=models.Index(fields=['user', 'acknowledged', 'timestamp'], name='alert_user_ack_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alertlog',
+            index=models.Index(fields=['user', 'timestamp'], name='alert_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='burnoutrisk',
+            index=models.Index(fields=['user', 'calculated_at'], name='burnout_user_calc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fatiguelog',
+            index=models.Index(fields=['user', 'timestamp'], name='fatigue_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sessionlog',
+            index=models.Index(fields=['user', 'session_start'], name='session_user_start_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0005_telemetry_indexes_user_timezone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FatigueAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('bucket_seconds', models.IntegerField()),
+                ('count', models.IntegerField()),
+                ('blink_rate_sum', models.FloatField()),
+                ('blink_rate_min', models.FloatField()),
+                ('blink_rate_max', models.FloatField()),
+                ('eye_closure_duration_sum', models.FloatField()),
+                ('eye_closure_duration_min', models.FloatField()),
+                ('eye_closure_duration_max', models.FloatField()),
+                ('head_tilt_angle_sum', models.FloatField()),
+                ('head_tilt_angle_min', models.FloatField()),
+                ('head_tilt_angle_max', models.FloatField()),
+                ('fatigue_probability_sum', models.FloatField()),
+                ('fatigue_probability_min', models.FloatField()),
+                ('fatigue_probability_max', models.FloatField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'bucket_start', 'bucket_seconds'), name='uniq_fatigue_aggregate')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0006_fatigueaggregate'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='alertlog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='burnoutrisk',
+            name='calculated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='sessionlog',
+            name='session_start',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
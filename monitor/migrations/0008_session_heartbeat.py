@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0007_bulk_insertable_timestamps'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessionlog',
+            name='last_activity',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='sessionlog',
+            index=models.Index(condition=models.Q(('session_end__isnull', True)), fields=['last_activity'], name='session_open_activity_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:45
+
+import zoneinfo
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_day(apps, schema_editor):
+    """Set `day` on the latest assessment of each user's local day; older duplicates keep NULL."""
+    BurnoutRisk = apps.get_model('monitor', 'BurnoutRisk')
+    UserSettings = apps.get_model('monitor', 'UserSettings')
+    default = zoneinfo.ZoneInfo(settings.TIME_ZONE)
+    zones = {}
+    for user_id, name in UserSettings.objects.values_list('user_id', 'timezone'):
+        try:
+            zones[user_id] = zoneinfo.ZoneInfo(name)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            pass
+
+    latest = {}
+    rows = BurnoutRisk.objects.order_by('calculated_at', 'id').values_list('id', 'user_id', 'calculated_at')
+    for pk, user_id, calculated_at in rows.iterator(chunk_size=2000):
+        latest[(user_id, calculated_at.astimezone(zones.get(user_id, default)).date())] = pk
+    updates = [BurnoutRisk(id=pk, day=day) for (_, day), pk in latest.items()]
+    BurnoutRisk.objects.bulk_update(updates, ['day'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0008_session_heartbeat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='burnoutrisk',
+            name='day',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_day, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='burnoutrisk',
+            constraint=models.UniqueConstraint(fields=('user', 'day'), name='uniq_burnout_user_day'),
+        ),
+    ]
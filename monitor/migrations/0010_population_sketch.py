@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0009_burnout_day'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopulationSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('metric', models.CharField(choices=[('fatigue_probability', 'Fatigue probability'), ('blink_rate', 'Blink rate'), ('work_hours', 'Work hours per user-day')], max_length=32)),
+                ('count', models.BigIntegerField(default=0)),
+                ('data', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('metric', 'day'), name='uniq_population_sketch')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0011_sample_block'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fatiguelog',
+            name='model_version',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='sampleblock',
+            name='model_version',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
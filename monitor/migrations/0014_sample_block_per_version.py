@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0012_model_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='sampleblock',
+            name='uniq_sample_block',
+        ),
+        migrations.AddConstraint(
+            model_name='sampleblock',
+            constraint=models.UniqueConstraint(fields=('user', 'minute', 'model_version'), name='uniq_sample_block_version'),
+        ),
+    ]
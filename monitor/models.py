@@ -1,12 +1,22 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 
 class SessionLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    session_start = models.DateTimeField(auto_now_add=True)
+    session_start = models.DateTimeField(default=timezone.now)
     session_end = models.DateTimeField(null=True, blank=True)
     total_duration_minutes = models.FloatField(default=0)
+    last_activity = models.DateTimeField(null=True, blank=True)   # latest heartbeat (telemetry sample)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'session_start'], name='session_user_start_idx'),
+            # Only open sessions are ever reaped, so only they are indexed
+            models.Index(fields=['last_activity'], condition=models.Q(session_end__isnull=True),
+                         name='session_open_activity_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - Session {self.session_start}"
@@ -18,19 +28,47 @@ class FatigueLog(models.Model):
     eye_closure_duration = models.FloatField(default=0)
     head_tilt_angle = models.FloatField(default=0)
     fatigue_probability = models.FloatField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
+    model_version = models.CharField(max_length=32, blank=True, default='')   # model that scored it
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'timestamp'], name='fatigue_user_ts_idx')]
 
     def __str__(self):
         return f"{self.user.username} - Fatigue {self.fatigue_probability}"
 
 
+class SampleBlock(models.Model):
+    """One user-minute of raw samples packed into a float32 array (see blocks.py)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    minute = models.DateTimeField()                # UTC start of the minute
+    count = models.IntegerField()
+    fatigue_sum = models.FloatField()
+    data = models.BinaryField()                    # count x (offset, blink, closure, tilt, probability)
+    model_version = models.CharField(max_length=32, blank=True, default='')   # model that scored these samples
+
+    class Meta:
+        # A minute that spans a model hot swap has one block per model
+        constraints = [models.UniqueConstraint(fields=['user', 'minute', 'model_version'],
+                                               name='uniq_sample_block_version')]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.count} samples @ {self.minute}"
+
+
 class BurnoutRisk(models.Model):
     RISK_CHOICES = [('Low', 'Low'), ('Medium', 'Medium'), ('High', 'High')]
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     weekly_avg_fatigue = models.FloatField()
     burnout_score = models.FloatField()
     risk_level = models.CharField(max_length=10, choices=RISK_CHOICES)
-    calculated_at = models.DateTimeField(auto_now_add=True)
+    calculated_at = models.DateTimeField(default=timezone.now)
+    day = models.DateField(null=True, blank=True)   # local date assessed; null on superseded legacy rows
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'calculated_at'], name='burnout_user_calc_idx')]
+        # One assessment per user per day, so batch runs can upsert
+        constraints = [models.UniqueConstraint(fields=['user', 'day'], name='uniq_burnout_user_day')]
 
     def __str__(self):
         return f"{self.user.username} - {self.risk_level} Risk"
@@ -50,10 +88,14 @@ class AlertLog(models.Model):
     message = models.TextField()
     value = models.FloatField(default=0)          # e.g. fatigue prob or tilt angle
     acknowledged = models.BooleanField(default=False)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['user', 'acknowledged', 'timestamp'], name='alert_user_ack_ts_idx'),
+            models.Index(fields=['user', 'timestamp'], name='alert_user_ts_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.alert_type} @ {self.timestamp}"
@@ -73,6 +115,96 @@ class UserSettings(models.Model):
     # Profile
     display_name            = models.CharField(max_length=100, blank=True)
     work_hours_per_day      = models.FloatField(default=8.0)
+    timezone                = models.CharField(max_length=64, default='UTC')  # IANA name, e.g. Asia/Kolkata
 
     def __str__(self):
         return f"{self.user.username} Settings"
+
+
+class DailyRollup(models.Model):
+    """Per-user, per-day fatigue and work-time totals, maintained on ingest."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField()
+    fatigue_sum   = models.FloatField(default=0)
+    fatigue_count = models.IntegerField(default=0)
+    work_minutes  = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'day'], name='uniq_daily_rollup')]
+
+    @property
+    def avg_fatigue(self):
+        return self.fatigue_sum / self.fatigue_count if self.fatigue_count else None
+
+    def __str__(self):
+        return f"{self.user.username} - {self.day}"
+
+
+class HourlyRollup(models.Model):
+    """Per-user, per-hour fatigue totals; `hour` is the start of the hour."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    hour = models.DateTimeField()
+    fatigue_sum   = models.FloatField(default=0)
+    fatigue_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'hour'], name='uniq_hourly_rollup')]
+
+    @property
+    def avg_fatigue(self):
+        return self.fatigue_sum / self.fatigue_count if self.fatigue_count else None
+
+    def __str__(self):
+        return f"{self.user.username} - {self.hour}"
+
+
+class FatigueAggregate(models.Model):
+    """Compacted FatigueLog tier: count/sum/min/max of each feature per user per time bucket.
+
+    Raw samples older than the retention age are folded into these rows by
+    `manage.py compact_fatigue` and then deleted.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    bucket_start   = models.DateTimeField()
+    bucket_seconds = models.IntegerField()
+    count          = models.IntegerField()
+
+    blink_rate_sum = models.FloatField()
+    blink_rate_min = models.FloatField()
+    blink_rate_max = models.FloatField()
+    eye_closure_duration_sum = models.FloatField()
+    eye_closure_duration_min = models.FloatField()
+    eye_closure_duration_max = models.FloatField()
+    head_tilt_angle_sum = models.FloatField()
+    head_tilt_angle_min = models.FloatField()
+    head_tilt_angle_max = models.FloatField()
+    fatigue_probability_sum = models.FloatField()
+    fatigue_probability_min = models.FloatField()
+    fatigue_probability_max = models.FloatField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'bucket_start', 'bucket_seconds'],
+                                               name='uniq_fatigue_aggregate')]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.count} samples @ {self.bucket_start}"
+
+
+class PopulationSketch(models.Model):
+    """Serialized t-digest of one metric across all users for one UTC day (see sketches.py)."""
+    METRICS = [
+        ('fatigue_probability', 'Fatigue probability'),
+        ('blink_rate',          'Blink rate'),
+        ('work_hours',          'Work hours per user-day'),
+    ]
+    day    = models.DateField()
+    metric = models.CharField(max_length=32, choices=METRICS)
+    count  = models.BigIntegerField(default=0)   # values summarized
+    data   = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['metric', 'day'], name='uniq_population_sketch')]
+
+    def __str__(self):
+        return f"{self.metric} @ {self.day} ({self.count})"
@@ -0,0 +1,144 @@
+"""Per-user admission control and client send pacing for the polled endpoints.
+
+Each (user, endpoint) pair listed in MONITOR_RATE_LIMITS has a token bucket of
+`burst` tokens refilled at one token per `interval` seconds. Buckets are
+kept as GCRA state: a single integer per key, the "theoretical arrival
+time" (TAT) in epoch milliseconds. A request adds one interval to the TAT
+with cache.incr(), which is atomic on memcached, Redis and the local-memory
+backend, and is admitted if the TAT is then at most burst x interval ahead
+of now; a rejected request gives its interval back. Two racing requests
+therefore cannot both spend the last token.
+
+Buckets live in the MONITOR_RATE_LIMIT_CACHE alias. The default is the
+local-memory cache, so each worker process keeps its own buckets and the
+limit is per process: with N workers a user can be admitted up to N times
+the configured rate. Point the alias at a Redis or memcached cache to make
+it global (not at a database or file cache, whose incr() is not atomic).
+
+Rejection is the last resort. Every limited response carries the interval
+after which the client should send again (X-Next-Send-Ms): the normal
+SEND_INTERVAL_MS, stretched towards MAX_SEND_INTERVAL_MS as the user's
+bucket drains past half or as the server backs up (write-behind queue fill,
+requests in flight). A client that honours it slows down before it is ever
+refused; one that does not gets 429 with Retry-After.
+"""
+import math
+import threading
+import time
+from collections import namedtuple
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.utils.connection import ConnectionProxy
+
+from . import metrics, writebehind
+
+DEFAULT_RATES = {
+    'save_fatigue':    (5, 6),    # endpoint: (seconds per token, burst)
+    'current_fatigue': (2, 10),
+    'analytics_data':  (2, 10),
+}
+SEND_INTERVAL_MS     = getattr(settings, 'MONITOR_SEND_INTERVAL_MS', 10000)
+MAX_SEND_INTERVAL_MS = getattr(settings, 'MONITOR_MAX_SEND_INTERVAL_MS', 60000)
+BUSY_INFLIGHT        = getattr(settings, 'MONITOR_RATE_BUSY_INFLIGHT', 64)
+
+# Far longer than any TAT a key can hold; every request pushes the expiry
+# back, so a bucket is never reset early while its user is still limited
+KEY_TIMEOUT = 3600
+
+cache = ConnectionProxy(caches, getattr(settings, 'MONITOR_RATE_LIMIT_CACHE', 'default'))
+
+Admission = namedtuple('Admission', 'allowed retry_after_ms used')   # used: fraction of the burst spent
+
+rate_limited_requests = metrics.Counter('neurowatch_rate_limited_total',
+                                        'Requests refused by the per-user rate limiter.', ['view'])
+
+_inflight_lock = threading.Lock()
+_inflight = 0
+
+
+def _key(endpoint, user_id):
+    return f'monitor:rate:{endpoint}:{user_id}'
+
+
+def rate_for(endpoint):
+    """(seconds per token, burst) for `endpoint`, or None when it is unlimited.
+
+    Read per request so tests and benchmarks can lift limits with override_settings.
+    """
+    return getattr(settings, 'MONITOR_RATE_LIMITS', DEFAULT_RATES).get(endpoint)
+
+
+def admit(user_id, endpoint, now_ms=None):
+    """Spend a token from the user's bucket for `endpoint`. Returns an Admission."""
+    interval, burst = rate_for(endpoint)
+    interval = int(interval * 1000)
+    window = interval * burst
+    now = now_ms if now_ms is not None else int(time.time() * 1000)
+    key = _key(endpoint, user_id)
+    try:
+        tat = cache.incr(key, interval)
+    except ValueError:
+        # No bucket yet: it starts full
+        if cache.add(key, now + interval, KEY_TIMEOUT):
+            return Admission(True, 0, interval / window)
+        tat = cache.incr(key, interval)
+    cache.touch(key, KEY_TIMEOUT)   # incr() keeps the expiry set when the key was added
+    if tat - interval < now:
+        # Idle long enough to refill completely; racing requests may lose an
+        # increment here, which only errs towards admitting
+        tat = now + interval
+        cache.set(key, tat, KEY_TIMEOUT)
+    if tat - now > window:
+        cache.decr(key, interval)
+        return Admission(False, tat - now - window, 1.0)
+    return Admission(True, 0, (tat - now) / window)
+
+
+def server_pressure():
+    """0 (idle) to 1 (saturated), from the write-behind queue and requests in flight."""
+    pressure = min(_inflight / BUSY_INFLIGHT, 1.0)
+    if writebehind.ENABLED:
+        pressure = max(pressure, writebehind.write_behind.stats()['queue_depth'] / writebehind.QUEUE_SIZE)
+    return pressure
+
+
+def next_send_ms(admission):
+    """Milliseconds the client should wait before its next request."""
+    pressure = max(2 * admission.used - 1, server_pressure(), 0.0)
+    interval = SEND_INTERVAL_MS + (MAX_SEND_INTERVAL_MS - SEND_INTERVAL_MS) * min(pressure, 1.0)
+    return max(int(interval), admission.retry_after_ms)
+
+
+def rate_limited(endpoint):
+    """Limit an async view per signed-in user; apply inside @login_required."""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            global _inflight
+            if rate_for(endpoint) is None:
+                return await view(request, *args, **kwargs)
+            user = await request.auser()
+            # The cache's own async methods are not atomic, so the sync ones run off the loop
+            admission = await sync_to_async(admit, thread_sensitive=False)(user.pk, endpoint)
+            if not admission.allowed:
+                rate_limited_requests.inc(1, endpoint)
+                wait = next_send_ms(admission)
+                response = JsonResponse({"status": "rate limited", "next_send_ms": wait}, status=429)
+                response['Retry-After'] = str(math.ceil(admission.retry_after_ms / 1000))
+            else:
+                with _inflight_lock:
+                    _inflight += 1
+                try:
+                    response = await view(request, *args, **kwargs)
+                finally:
+                    with _inflight_lock:
+                        _inflight -= 1
+                wait = next_send_ms(admission)
+            response['X-Next-Send-Ms'] = str(wait)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,165 @@
+"""Registry of versioned fatigue models, loaded lazily and hot-swapped.
+
+Nothing is unpickled at import time: the first call to get() loads the
+active model (or the MonitorConfig warmup does, when MONITOR_MODEL_WARMUP
+is on, as the WSGI/ASGI entry points set it), so management commands and
+test runs that never score a sample never import sklearn.
+
+The active model is the newest ``fatigue-<version>.pkl`` in
+MONITOR_MODEL_DIR with its JSON sidecar, as written by
+train_fatigue_model, or MONITOR_MODEL_VERSION when pinned. Without any
+artifact the legacy fatigue_model.pkl is used. Once a model is loaded a
+daemon thread polls the directory every MONITOR_MODEL_POLL_SECONDS; a new
+artifact (or a replaced legacy file) is loaded and checked on that
+thread, then swapped in by replacing a single reference. Requests read
+the reference once per batch, so they never wait on a reload and never
+mix two models in one batch. An artifact that fails to load is logged
+and the current model keeps serving.
+
+A pre-fork server that preloads the app (gunicorn --preload) loads the
+model in the master, and its watcher thread does not survive into the
+forked workers; each worker resets the thread state after the fork and
+starts its own watcher on its next get().
+"""
+import logging
+import math
+import os
+import re
+import threading
+import weakref
+from collections import namedtuple
+from functools import partial
+
+from django.conf import settings
+
+from .inference import FatigueScorer
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR    = getattr(settings, 'MONITOR_MODEL_DIR', os.path.join(settings.BASE_DIR, 'models'))
+LEGACY_PATH  = getattr(settings, 'MONITOR_LEGACY_MODEL_PATH', os.path.join(settings.BASE_DIR, 'fatigue_model.pkl'))
+PINNED       = getattr(settings, 'MONITOR_MODEL_VERSION', None)
+POLL_SECONDS = getattr(settings, 'MONITOR_MODEL_POLL_SECONDS', 10)
+
+ARTIFACT_RE = re.compile(r'^fatigue-(?P<version>[0-9TZ]+)\.pkl$')
+PROBE = [[15.0, 0.3, 5.0, 30.0]]   # one plausible sample, scored before a model goes live
+
+Artifact = namedtuple('Artifact', 'version path key')          # key changes whenever the file does
+ActiveModel = namedtuple('ActiveModel', 'version scorer key')
+
+
+class ModelRegistry:
+    def __init__(self, model_dir=MODEL_DIR, legacy_path=LEGACY_PATH, pinned=PINNED, poll_seconds=POLL_SECONDS):
+        self.model_dir = model_dir
+        self.legacy_path = legacy_path
+        self.pinned = pinned
+        self.poll_seconds = poll_seconds
+        self._active = None
+        self._load_lock = threading.Lock()
+        self._watcher = None
+        self._stopping = threading.Event()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=partial(_after_fork, weakref.ref(self)))
+
+    # ── serving side ──────────────────────────────────────────────────────────
+
+    def get(self):
+        """The ActiveModel (version, scorer); loads it on first use."""
+        active = self._active
+        if active is None or (self._watcher is None and self.poll_seconds):
+            with self._load_lock:
+                if self._active is None:
+                    self._active = self._load(self._choose())
+                self._start_watcher()
+            active = self._active
+        return active
+
+    def warmup(self):
+        """Load the model now rather than on the first request."""
+        return self.get()
+
+    # ── artifacts ─────────────────────────────────────────────────────────────
+
+    def artifacts(self):
+        """Complete versioned artifacts in the model directory, oldest first."""
+        try:
+            names = set(os.listdir(self.model_dir))
+        except FileNotFoundError:
+            return []
+        found = []
+        for name in names:
+            match = ARTIFACT_RE.match(name)
+            # The sidecar is written first, so a .pkl without one is from another tool
+            if match and name[:-4] + '.json' in names:
+                path = os.path.join(self.model_dir, name)
+                found.append(Artifact(match['version'], path, path))
+        return sorted(found)
+
+    def _choose(self):
+        found = self.artifacts()
+        if self.pinned:
+            found = [a for a in found if a.version == self.pinned]
+            if not found:
+                raise FileNotFoundError(f"pinned model version {self.pinned} not found in {self.model_dir}")
+        if found:
+            return found[-1]
+        stat = os.stat(self.legacy_path)
+        return Artifact(f'legacy-{int(stat.st_mtime)}', self.legacy_path,
+                        (self.legacy_path, stat.st_mtime_ns, stat.st_size))
+
+    def _load(self, artifact):
+        import joblib   # pulls in sklearn; only paid by processes that score
+
+        scorer = FatigueScorer(joblib.load(artifact.path))
+        prob = scorer.predict_batch(PROBE)[0]
+        if not (math.isfinite(prob) and 0 <= prob <= 1):
+            raise ValueError(f"model {artifact.version} scored the probe sample as {prob!r}")
+        return ActiveModel(artifact.version, scorer, artifact.key)
+
+    # ── hot reload ────────────────────────────────────────────────────────────
+
+    def refresh(self):
+        """Swap in the artifact that should be active if it changed. Returns True on a swap."""
+        try:
+            artifact = self._choose()
+            if self._active is not None and artifact.key == self._active.key:
+                return False
+            loaded = self._load(artifact)
+        except Exception:
+            logger.exception("model reload failed; keeping %s",
+                             self._active.version if self._active else "no model")
+            return False
+        previous, self._active = self._active, loaded
+        logger.info("fatigue model %s -> %s", previous.version if previous else None, loaded.version)
+        return True
+
+    def _start_watcher(self):
+        if self._watcher is not None or not self.poll_seconds:
+            return
+        self._watcher = threading.Thread(target=self._watch, name='model-watcher', daemon=True)
+        self._watcher.start()
+
+    def _watch(self):
+        while not self._stopping.wait(self.poll_seconds):
+            self.refresh()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _reset_threads(self):
+        # Only the forking thread exists in the child: the watcher is gone
+        # and a lock it or another thread held would never be released
+        self._load_lock = threading.Lock()
+        stopping, self._stopping = self._stopping.is_set(), threading.Event()
+        if stopping:
+            self._stopping.set()
+        self._watcher = None
+
+
+def _after_fork(ref):
+    registry = ref()
+    if registry is not None:
+        registry._reset_threads()
+
+
+registry = ModelRegistry()
@@ -0,0 +1,54 @@
+"""Per-session report rows computed in a single merge pass.
+
+Sessions and fatigue samples are read as cursors, both newest-first, and
+walked together: each sample is visited once and attributed to the
+session whose window contains it. Samples come from both the raw and the
+compacted tier (see retention.fatigue_stream); a compacted bucket counts
+towards the session its start falls in. Burnout levels are fetched up
+front in one query keyed by the local day assessed. Memory use does not
+grow with the number of samples, so the CSV export can stream rows as
+they are produced.
+
+A user only ever has one open session (a new one is opened only when none
+is active), so session windows do not overlap and a single forward walk
+over the samples is enough.
+"""
+from django.utils import timezone
+
+from .models import BurnoutRisk
+from .retention import fatigue_stream
+
+CHUNK_SIZE = 2000
+
+
+def _burnout_by_day(user, tz, since=None):
+    """{local date: risk_level} from the one BurnoutRisk row per assessed day."""
+    qs = BurnoutRisk.objects.filter(user=user, day__isnull=False)
+    if since is not None:
+        qs = qs.filter(day__gte=timezone.localdate(since, tz))
+    return dict(qs.values_list('day', 'risk_level'))
+
+
+def session_summaries(user, sessions, tz, since=None, now=None):
+    """Yield (session, avg_fatigue or None, risk_level or None) for `sessions`.
+
+    `sessions` must be ordered by -session_start. `since`, if given, is a
+    lower bound on the oldest session start and limits the sample scan.
+    """
+    now = now or timezone.now()
+    logs = fatigue_stream(user, since=since, chunk_size=CHUNK_SIZE)
+    levels = _burnout_by_day(user, tz, since)
+
+    log = next(logs, None)
+    for s in sessions:
+        end = s.session_end or now
+        # Samples newer than this session fell between sessions
+        while log is not None and log[0] > end:
+            log = next(logs, None)
+        total, count = 0.0, 0
+        while log is not None and log[0] >= s.session_start:
+            total += log[1]
+            count += log[2]
+            log = next(logs, None)
+        yield (s, total / count if count else None,
+               levels.get(timezone.localdate(s.session_start, tz)))
@@ -0,0 +1,154 @@
+"""Tiered retention for FatigueLog.
+
+Raw samples older than MONITOR_RETENTION_RAW_DAYS are folded into
+FatigueAggregate rows (count, sum, min and max of every feature per
+MONITOR_RETENTION_BUCKET_SECONDS bucket) and then deleted in bounded chunks.
+Work is done one user-day window at a time, each in its own transaction, so
+memory use and lock hold times stay small however large the backlog is.
+
+Packed minute blocks (blocks.py) are raw samples too and are compacted
+the same way.
+
+Rollups already hold the compacted totals, so dashboard and analytics are
+unaffected. Readers that need per-sample timing (reports) use
+fatigue_stream(), which merges every tier.
+"""
+import heapq
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from . import blocks
+from .blocks import FEATURES
+from .models import FatigueAggregate, FatigueLog, SampleBlock
+
+BUCKET_CHOICES = (60, 300, 900)   # divide every UTC offset, so buckets never straddle local hours
+
+RAW_DAYS       = getattr(settings, 'MONITOR_RETENTION_RAW_DAYS', 30)
+BUCKET_SECONDS = getattr(settings, 'MONITOR_RETENTION_BUCKET_SECONDS', 300)
+DELETE_CHUNK   = getattr(settings, 'MONITOR_RETENTION_DELETE_CHUNK', 2000)
+
+
+def bucket_floor(ts, bucket_seconds):
+    epoch = int(ts.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % bucket_seconds, tz=dt_timezone.utc)
+
+
+def _fold(agg, values):
+    agg.count += 1
+    for name, v in zip(FEATURES, values):
+        setattr(agg, f'{name}_sum', getattr(agg, f'{name}_sum') + v)
+        setattr(agg, f'{name}_min', min(getattr(agg, f'{name}_min'), v))
+        setattr(agg, f'{name}_max', max(getattr(agg, f'{name}_max'), v))
+
+
+def _empty_aggregate(user_id, bucket_start, bucket_seconds):
+    agg = FatigueAggregate(user_id=user_id, bucket_start=bucket_start,
+                           bucket_seconds=bucket_seconds, count=0)
+    for name in FEATURES:
+        setattr(agg, f'{name}_sum', 0.0)
+        setattr(agg, f'{name}_min', float('inf'))
+        setattr(agg, f'{name}_max', float('-inf'))
+    return agg
+
+
+def _compact_window(user_id, start, end, bucket_seconds, chunk_size):
+    """Fold raw rows and blocks in [start, end) into aggregates and delete them. Returns samples compacted."""
+    with transaction.atomic():
+        rows = list(FatigueLog.objects.filter(user_id=user_id, timestamp__gte=start, timestamp__lt=end)
+                    .values_list('id', 'timestamp', *FEATURES))
+        ts, values = blocks.read(user_id, start, end)
+        samples = [(r[1], r[2:]) for r in rows]
+        samples += [(datetime.fromtimestamp(t, tz=dt_timezone.utc), v)
+                    for t, v in zip(ts.tolist(), values.tolist())]
+        if not samples:
+            return 0
+
+        keys = {bucket_floor(t, bucket_seconds) for t, _ in samples}
+        buckets = {a.bucket_start: a for a in FatigueAggregate.objects.filter(
+            user_id=user_id, bucket_seconds=bucket_seconds, bucket_start__in=keys)}
+        existing = set(buckets)
+        for t, v in samples:
+            key = bucket_floor(t, bucket_seconds)
+            agg = buckets.get(key)
+            if agg is None:
+                agg = buckets[key] = _empty_aggregate(user_id, key, bucket_seconds)
+            _fold(agg, v)
+
+        FatigueAggregate.objects.bulk_create([a for k, a in buckets.items() if k not in existing])
+        FatigueAggregate.objects.bulk_update(
+            [a for k, a in buckets.items() if k in existing],
+            ['count'] + [f'{n}_{s}' for n in FEATURES for s in ('sum', 'min', 'max')])
+
+        ids = [r[0] for r in rows]
+        for i in range(0, len(ids), chunk_size):
+            FatigueLog.objects.filter(id__in=ids[i:i + chunk_size]).delete()
+        # Windows are minute-aligned, so every block read here lies wholly inside
+        SampleBlock.objects.filter(user_id=user_id, minute__gte=start, minute__lt=end).delete()
+    return len(samples)
+
+
+def compact(older_than=None, bucket_seconds=None, chunk_size=None, users=None, now=None):
+    """Compact raw samples older than `older_than` (a timedelta). Returns rows compacted."""
+    older_than = older_than if older_than is not None else timedelta(days=RAW_DAYS)
+    bucket_seconds = bucket_seconds or BUCKET_SECONDS
+    chunk_size = chunk_size or DELETE_CHUNK
+    if bucket_seconds not in BUCKET_CHOICES:
+        raise ValueError(f"bucket_seconds must be one of {BUCKET_CHOICES}")
+
+    # Align the cutoff so no bucket is split between the raw and compacted tiers
+    cutoff = bucket_floor((now or timezone.now()) - older_than, bucket_seconds)
+    user_ids = (User.objects.values_list('id', flat=True) if users is None
+                else [getattr(u, 'pk', u) for u in users])
+
+    total = 0
+    for user_id in user_ids:
+        raw = FatigueLog.objects.filter(user_id=user_id, timestamp__lt=cutoff)
+        packed = SampleBlock.objects.filter(user_id=user_id, minute__lt=cutoff)
+        while True:
+            oldest = [ts for ts in (
+                raw.order_by('timestamp').values_list('timestamp', flat=True).first(),
+                packed.order_by('minute').values_list('minute', flat=True).first(),
+            ) if ts is not None]
+            if not oldest:
+                break
+            oldest = min(oldest)
+            start = bucket_floor(oldest, bucket_seconds)
+            end = min(start + timedelta(days=1), cutoff)
+            total += _compact_window(user_id, start, end, bucket_seconds, chunk_size)
+    return total
+
+
+def run_scheduled():
+    """Entry point for cron / task schedulers, using the MONITOR_RETENTION_* settings."""
+    return compact()
+
+
+# ─── READING ACROSS TIERS ─────────────────────────────────────────────────────
+
+def fatigue_stream(user, since=None, chunk_size=2000, until=None):
+    """Yield (timestamp, fatigue_sum, count) newest-first from every tier.
+
+    Raw samples, packed or not, come through as (timestamp, probability, 1); compacted
+    buckets as (bucket_start, sum, count). `until` is an exclusive upper bound.
+    """
+    raw = FatigueLog.objects.filter(user=user)
+    agg = FatigueAggregate.objects.filter(user=user)
+    if since is not None:
+        raw = raw.filter(timestamp__gte=since)
+        agg = agg.filter(bucket_start__gte=bucket_floor(since, max(BUCKET_CHOICES)))
+    if until is not None:
+        raw = raw.filter(timestamp__lt=until)
+        agg = agg.filter(bucket_start__lt=until)
+    raw_rows = ((ts, p, 1) for ts, p in raw.order_by('-timestamp')
+                .values_list('timestamp', 'fatigue_probability').iterator(chunk_size=chunk_size))
+    packed_rows = ((datetime.fromtimestamp(t, tz=dt_timezone.utc), p, 1)
+                   for ts, values in blocks.iter_chunks(user, since, until, newest_first=True)
+                   for t, p in zip(ts.tolist(), values[:, blocks.FATIGUE].tolist()))
+    agg_rows = (agg.order_by('-bucket_start')
+                .values_list('bucket_start', 'fatigue_probability_sum', 'count')
+                .iterator(chunk_size=chunk_size))
+    return heapq.merge(raw_rows, packed_rows, agg_rows, key=lambda row: row[0], reverse=True)
@@ -0,0 +1,170 @@
+"""Incrementally maintained fatigue / work-time rollups.
+
+DailyRollup and HourlyRollup hold running sums and counts so the analytics
+and burnout code can read a handful of rows instead of aggregating the raw
+FatigueLog / SessionLog tables. Ingestion and session close bump them in
+place; `manage.py rebuild_rollups` recomputes them from the raw logs.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+from .caching import bump_all_data_versions, bump_data_version
+from .models import (DailyRollup, FatigueAggregate, FatigueLog, HourlyRollup, SampleBlock, SessionLog,
+                     UserSettings)
+from .timeranges import day_bounds, get_zone
+
+
+def day_of(ts):
+    return timezone.localtime(ts).date()
+
+
+def hour_of(ts):
+    return timezone.localtime(ts).replace(minute=0, second=0, microsecond=0)
+
+
+def _bump(model, lookup, increments):
+    """Add `increments` to the row identified by `lookup`, creating it if needed."""
+    update = {field: F(field) + value for field, value in increments.items()}
+    if model.objects.filter(**lookup).update(**update):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **increments)
+    except IntegrityError:
+        # Another writer created the row between our UPDATE and INSERT
+        model.objects.filter(**lookup).update(**update)
+
+
+def add_fatigue_samples(user, samples):
+    """Fold (timestamp, fatigue_probability) pairs into the rollups."""
+    daily = defaultdict(lambda: [0.0, 0])
+    hourly = defaultdict(lambda: [0.0, 0])
+    for ts, prob in samples:
+        for bucket in (daily[day_of(ts)], hourly[hour_of(ts)]):
+            bucket[0] += prob
+            bucket[1] += 1
+
+    for day, (total, count) in daily.items():
+        _bump(DailyRollup, {"user": user, "day": day},
+              {"fatigue_sum": total, "fatigue_count": count})
+    for hour, (total, count) in hourly.items():
+        _bump(HourlyRollup, {"user": user, "hour": hour},
+              {"fatigue_sum": total, "fatigue_count": count})
+    # After commit, so a validator never names data readers cannot see yet
+    transaction.on_commit(lambda: bump_data_version(user))
+
+
+def add_work_minutes(user, session_start, minutes):
+    """Credit a closed session's duration to the day it started on."""
+    if minutes:
+        _bump(DailyRollup, {"user": user, "day": day_of(session_start)},
+              {"work_minutes": minutes})
+        transaction.on_commit(lambda: bump_data_version(user))
+
+
+# ─── READ HELPERS ─────────────────────────────────────────────────────────────
+
+def daily_rollups(user, days):
+    """{date: DailyRollup} for the given dates (missing days are omitted)."""
+    return {r.day: r for r in DailyRollup.objects.filter(user=user, day__in=list(days))}
+
+
+async def adaily_rollups(user, days):
+    return {r.day: r async for r in DailyRollup.objects.filter(user=user, day__in=list(days))}
+
+
+async def ahourly_averages(user, day):
+    """24-slot list of average fatigue for `day`, None where there is no data."""
+    start, end = day_bounds(day)
+    hourly = [None] * 24
+    async for r in HourlyRollup.objects.filter(user=user, hour__gte=start, hour__lt=end):
+        hourly[timezone.localtime(r.hour).hour] = r.avg_fatigue
+    return hourly
+
+
+def lifetime_totals(user):
+    """(fatigue_sum, fatigue_count, work_minutes) across all days."""
+    t = DailyRollup.objects.filter(user=user).aggregate(
+        s=Sum('fatigue_sum'), c=Sum('fatigue_count'), m=Sum('work_minutes'))
+    return t['s'] or 0, t['c'] or 0, t['m'] or 0
+
+
+# ─── REBUILD ──────────────────────────────────────────────────────────────────
+
+def rebuild(users=None):
+    """Recompute rollups from raw and compacted logs. `users` limits the rebuild to those users.
+
+    Days and hours are bucketed in each user's own timezone, matching what
+    ingestion does under UserTimezoneMiddleware.
+    """
+    user_ids = None if users is None else [getattr(u, 'pk', u) for u in users]
+    zones = UserSettings.objects.all()
+    if user_ids is not None:
+        zones = zones.filter(user_id__in=user_ids)
+    # Users with a non-default zone are grouped per zone; everyone else
+    # (including users without a settings row) falls into the default group.
+    default_tz = timezone.get_default_timezone()
+    by_zone = defaultdict(list)
+    for user_id, tz_name in zones.values_list('user_id', 'timezone'):
+        tz = get_zone(tz_name)
+        if tz is not None and tz != default_tz:
+            by_zone[tz].append(user_id)
+    explicit = [uid for ids in by_zone.values() for uid in ids]
+    groups = list(by_zone.items()) + [(default_tz, None)]
+
+    daily, hourly = {}, {}
+
+    def scoped(qs, ids):
+        if ids is not None:
+            return qs.filter(user_id__in=ids)
+        qs = qs.exclude(user_id__in=explicit)
+        return qs.filter(user_id__in=user_ids) if user_ids is not None else qs
+
+    for tz, ids in groups:
+        # Raw samples, packed minute blocks and compacted buckets (see retention.py) all count
+        tiers = [
+            (scoped(FatigueLog.objects.all(), ids), 'timestamp', Sum('fatigue_probability'), Count('id')),
+            (scoped(SampleBlock.objects.all(), ids), 'minute', Sum('fatigue_sum'), Sum('count')),
+            (scoped(FatigueAggregate.objects.all(), ids), 'bucket_start', Sum('fatigue_probability_sum'), Sum('count')),
+        ]
+        for qs, ts_field, total, count in tiers:
+            for row in (qs.annotate(day=TruncDate(ts_field, tzinfo=tz))
+                        .values('user_id', 'day').annotate(s=total, c=count)):
+                r = daily.setdefault((row['user_id'], row['day']),
+                                     DailyRollup(user_id=row['user_id'], day=row['day']))
+                r.fatigue_sum += row['s']
+                r.fatigue_count += row['c']
+            for row in (qs.annotate(hour=TruncHour(ts_field, tzinfo=tz))
+                        .values('user_id', 'hour').annotate(s=total, c=count)):
+                r = hourly.setdefault((row['user_id'], row['hour']),
+                                      HourlyRollup(user_id=row['user_id'], hour=row['hour']))
+                r.fatigue_sum += row['s']
+                r.fatigue_count += row['c']
+
+        for row in (scoped(SessionLog.objects.all(), ids)
+                    .annotate(day=TruncDate('session_start', tzinfo=tz))
+                    .values('user_id', 'day')
+                    .annotate(m=Sum('total_duration_minutes'))):
+            r = daily.setdefault((row['user_id'], row['day']),
+                                 DailyRollup(user_id=row['user_id'], day=row['day']))
+            r.work_minutes = row['m'] or 0
+
+    daily_qs = DailyRollup.objects.all()
+    hourly_qs = HourlyRollup.objects.all()
+    if user_ids is not None:
+        daily_qs = daily_qs.filter(user_id__in=user_ids)
+        hourly_qs = hourly_qs.filter(user_id__in=user_ids)
+    with transaction.atomic():
+        daily_qs.delete()
+        hourly_qs.delete()
+        DailyRollup.objects.bulk_create(daily.values(), batch_size=500)
+        HourlyRollup.objects.bulk_create(hourly.values(), batch_size=500)
+        if user_ids is None:
+            transaction.on_commit(bump_all_data_versions)
+        else:
+            transaction.on_commit(lambda: [bump_data_version(uid) for uid in user_ids])
+    return len(daily), len(hourly)
@@ -0,0 +1,126 @@
+"""Fatigue time series over an arbitrary range, bucketed and downsampled.
+
+The bucket is the finest of minute / hour / day / week that keeps the range
+under MAX_BUCKETS, and each size has a fixed source so the work is a couple
+of range queries whatever the span:
+
+    minute  raw and compacted samples (retention.fatigue_stream)
+    hour    HourlyRollup
+    day     DailyRollup
+    week    DailyRollup, folded into Monday-start weeks
+
+The bucketed series is then reduced to at most `max_points` with
+Largest-Triangle-Three-Buckets, which keeps peaks and troughs that plain
+striding or averaging would flatten.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from .models import DailyRollup, HourlyRollup
+from .retention import fatigue_stream
+
+MAX_BUCKETS = 2000
+MAX_POINTS = 300
+MAX_RANGE = timedelta(days=3660)
+
+BUCKETS = (
+    ('minute', timedelta(minutes=1)),
+    ('hour',   timedelta(hours=1)),
+    ('day',    timedelta(days=1)),
+    ('week',   timedelta(weeks=1)),
+)
+LABEL_FORMATS = {'minute': '%d %b %H:%M', 'hour': '%d %b %H:00', 'day': '%b %d', 'week': 'Wk %b %d'}
+
+
+def bucket_size(start, end):
+    for name, width in BUCKETS:
+        if (end - start) / width <= MAX_BUCKETS:
+            return name
+    return BUCKETS[-1][0]
+
+
+def lttb(x, y, n_out):
+    """Indices of the `n_out` points Largest-Triangle-Three-Buckets keeps from (x, y)."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    every = (n - 2) / (n_out - 2)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        # The point after this bucket is chosen against the mean of the next bucket
+        nlo, nhi = hi, min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+
+def _minute_buckets(user, start, end):
+    sums = defaultdict(lambda: [0.0, 0])
+    for ts, total, count in fatigue_stream(user, since=start, until=end):
+        if ts < start:
+            continue   # compacted buckets are fetched from a coarser floor
+        bucket = sums[ts.replace(second=0, microsecond=0)]
+        bucket[0] += total
+        bucket[1] += count
+    return sorted((key, total / count, None) for key, (total, count) in sums.items())
+
+
+def _hour_buckets(user, start, end):
+    rows = HourlyRollup.objects.filter(user=user, hour__gte=start, hour__lt=end).order_by('hour')
+    return [(r.hour, r.avg_fatigue, None) for r in rows if r.fatigue_count]
+
+
+def _day_buckets(user, start, end, week=False):
+    first, last = timezone.localdate(start), timezone.localdate(end - timedelta(microseconds=1))
+    rows = DailyRollup.objects.filter(user=user, day__gte=first, day__lte=last).order_by('day')
+    sums = {}
+    for r in rows:
+        key = r.day - timedelta(days=r.day.weekday()) if week else r.day
+        acc = sums.setdefault(key, [0.0, 0, 0.0])
+        acc[0] += r.fatigue_sum
+        acc[1] += r.fatigue_count
+        acc[2] += r.work_minutes
+    tz = timezone.get_current_timezone()
+    return [(timezone.make_aware(datetime.combine(day, datetime.min.time()), tz),
+             total / count if count else None, minutes / 60)
+            for day, (total, count, minutes) in sorted(sums.items())]
+
+
+def fatigue_series(user, start, end, max_points=MAX_POINTS):
+    """Bucketed, downsampled average fatigue for [start, end).
+
+    Returns {"bucket", "labels", "timestamps", "fatigue", "work_hours"};
+    work_hours is None for minute and hour buckets, which have no work time.
+    """
+    bucket = bucket_size(start, end)
+    if bucket == 'minute':
+        points = _minute_buckets(user, start, end)
+    elif bucket == 'hour':
+        points = _hour_buckets(user, start, end)
+    else:
+        points = _day_buckets(user, start, end, week=bucket == 'week')
+
+    # LTTB needs a value at every point; days without samples count as 0 like the period charts
+    x = [p[0].timestamp() for p in points]
+    y = [p[1] or 0 for p in points]
+    points = [points[i] for i in lttb(x, y, max_points)]
+
+    fmt = LABEL_FORMATS[bucket]
+    return {
+        "bucket": bucket,
+        "labels": [timezone.localtime(ts).strftime(fmt) for ts, _, _ in points],
+        "timestamps": [ts.isoformat() for ts, _, _ in points],
+        "fatigue": [round(avg or 0, 3) for _, avg, _ in points],
+        "work_hours": None if bucket in ('minute', 'hour') else [round(h, 2) for _, _, h in points],
+    }
@@ -0,0 +1,101 @@
+"""Session lifecycle: heartbeats from telemetry and reaping of idle sessions.
+
+Sessions used to be closed only on logout, so a closed tab left one open
+forever. Every save_fatigue batch now acts as a heartbeat that moves the
+session's last_activity forward (written at most once per
+HEARTBEAT_SECONDS per session, tracked in the cache), and `manage.py
+reap_sessions` closes sessions idle for longer than IDLE_MINUTES at their
+last heartbeat, crediting the work time to the rollups.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import rollups
+from .caching import TIMEOUT, invalidate_active_session
+from .models import SessionLog, UserSettings
+from .timeranges import get_zone
+
+HEARTBEAT_SECONDS = getattr(settings, 'MONITOR_SESSION_HEARTBEAT_SECONDS', 60)
+IDLE_MINUTES      = getattr(settings, 'MONITOR_SESSION_IDLE_MINUTES', 30)
+REAP_CHUNK        = getattr(settings, 'MONITOR_SESSION_REAP_CHUNK', 500)
+
+
+def _heartbeat_key(session_id):
+    return f'monitor:heartbeat:{session_id}'
+
+
+def heartbeat(user, active, ts):
+    """Record activity at `ts` on the active session (id, start); throttled per session."""
+    key = _heartbeat_key(active[0])
+    last = cache.get(key)
+    if last is not None and ts - last < timedelta(seconds=HEARTBEAT_SECONDS):
+        return
+    (SessionLog.objects.filter(id=active[0], session_end__isnull=True)
+     .filter(Q(last_activity__isnull=True) | Q(last_activity__lt=ts))
+     .update(last_activity=ts))
+    cache.set(key, ts, TIMEOUT)
+
+
+def last_seen(active):
+    """Latest heartbeat of the active session (id, start), or None if it has been closed.
+
+    Read from the database: the reaper may have closed the session from
+    another process, whose invalidation never reached this one's cache.
+    """
+    row = (SessionLog.objects.filter(id=active[0], session_end__isnull=True)
+           .values_list('session_start', 'last_activity').first())
+    return row and (row[1] or row[0])
+
+
+def duration_minutes(start, end):
+    return round((end - start).total_seconds() / 60, 2)
+
+
+def reap(idle=None, chunk_size=None, now=None):
+    """Close open sessions with no heartbeat for `idle` (a timedelta). Returns sessions closed.
+
+    Each session ends at its last heartbeat (its start if it never had
+    one). Sessions are closed `chunk_size` at a time, each chunk in its
+    own transaction with one bulk UPDATE.
+    """
+    idle = idle if idle is not None else timedelta(minutes=IDLE_MINUTES)
+    chunk_size = chunk_size or REAP_CHUNK
+    cutoff = (now or timezone.now()) - idle
+    stale = (SessionLog.objects.filter(session_end__isnull=True)
+             .filter(Q(last_activity__lt=cutoff) |
+                     Q(last_activity__isnull=True, session_start__lt=cutoff)))
+
+    closed = 0
+    while True:
+        with transaction.atomic():
+            batch = list(stale.select_related('user').order_by('id')[:chunk_size])
+            if not batch:
+                break
+            for s in batch:
+                s.session_end = s.last_activity or s.session_start
+                s.total_duration_minutes = duration_minutes(s.session_start, s.session_end)
+            SessionLog.objects.bulk_update(batch, ['session_end', 'total_duration_minutes'])
+            _credit_work_minutes(batch)
+        for s in batch:
+            invalidate_active_session(s.user)
+        closed += len(batch)
+    return closed
+
+
+def _credit_work_minutes(sessions):
+    """Add closed sessions' minutes to the rollups, bucketed in each user's timezone."""
+    zones = dict(UserSettings.objects.filter(user_id__in={s.user_id for s in sessions})
+                 .values_list('user_id', 'timezone'))
+    by_zone = defaultdict(list)
+    for s in sessions:
+        by_zone[zones.get(s.user_id)].append(s)
+    for name, group in by_zone.items():
+        with timezone.override(get_zone(name) if name else None):
+            for s in group:
+                rollups.add_work_minutes(s.user, s.session_start, s.total_duration_minutes)
@@ -0,0 +1,267 @@
+"""Population-wide quantile sketches of fatigue, blink rate and work hours.
+
+Each (UTC day, metric) has one PopulationSketch row holding a t-digest: a
+sorted list of (mean, weight) centroids whose size is bounded by the
+compression (about compression / 2 centroids) however many values went in,
+with small centroids near the tails so extreme quantiles stay accurate.
+Digests merge by pooling centroids and compressing again, so weekly and
+monthly distributions are the merge of the daily rows and a user's
+percentile is read in constant time and memory whatever the user count.
+
+fatigue_probability and blink_rate are fed from ingestion. Scored samples
+are folded into per-process pending digests and merged into the day's row
+every FLUSH_SAMPLES samples or FLUSH_SECONDS, so the shared rows are not
+written on every request; a process that exits loses at most that much,
+which `build_sketches --samples` restores exactly for closed days. work_hours (one value per user-day with work time)
+is built from DailyRollup once a day has closed, by `manage.py
+build_sketches`, which can also rebuild the sample metrics from the logs.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from . import blocks
+from .caching import TIMEOUT
+from .models import DailyRollup, FatigueAggregate, FatigueLog, PopulationSketch, SampleBlock
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION   = getattr(settings, 'MONITOR_SKETCH_COMPRESSION', 100)
+FLUSH_SAMPLES = getattr(settings, 'MONITOR_SKETCH_FLUSH_SAMPLES', 5000)
+FLUSH_SECONDS = getattr(settings, 'MONITOR_SKETCH_FLUSH_SECONDS', 60)
+
+SAMPLE_METRICS = ('fatigue_probability', 'blink_rate')
+METRICS = SAMPLE_METRICS + ('work_hours',)
+REBUILD_CHUNK = 20000
+REBUILD_USERS = 500
+
+
+class TDigest:
+    """Mergeable quantile sketch (merging t-digest with the k1 scale function)."""
+
+    def __init__(self, compression=COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def update(self, values, weights=None):
+        """Add values (optionally weighted, e.g. pre-aggregated means). Returns self."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        weights = np.ones_like(values) if weights is None else np.asarray(weights, dtype=np.float64).ravel()
+        keep = np.isfinite(values) & (weights > 0)
+        values, weights = values[keep], weights[keep]
+        if values.size:
+            self.min = min(self.min, float(values.min()))
+            self.max = max(self.max, float(values.max()))
+            self._compress(np.concatenate([self.means, values]), np.concatenate([self.weights, weights]))
+        return self
+
+    def merge(self, other):
+        if other.weights.size:
+            self._compress(np.concatenate([self.means, other.means]),
+                           np.concatenate([self.weights, other.weights]))
+            self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+        return self
+
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        cum = np.cumsum(weights)
+        q = (cum - weights / 2) / cum[-1]
+        # Points whose k-scale positions fall in the same unit interval share a centroid
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        bucket = np.floor(k - k[0]).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def _knots(self):
+        cum = np.cumsum(self.weights)
+        centers = (cum - self.weights / 2) / cum[-1]
+        return np.r_[self.min, self.means, self.max], np.r_[0.0, centers, 1.0]
+
+    def quantile(self, q):
+        """Value at quantile q (0-1); NaN when empty."""
+        if not self.weights.size:
+            return float('nan')
+        xs, qs = self._knots()
+        return float(np.interp(q, qs, xs))
+
+    def cdf(self, x):
+        """Fraction of values at or below x; NaN when empty."""
+        if not self.weights.size:
+            return float('nan')
+        xs, qs = self._knots()
+        return float(np.interp(x, xs, qs))
+
+    # ── storage ───────────────────────────────────────────────────────────────
+
+    def to_bytes(self):
+        return np.concatenate([[self.compression, self.min, self.max], self.means, self.weights]) \
+            .astype('<f8').tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        raw = np.frombuffer(bytes(data), dtype='<f8')
+        digest = cls(compression=int(raw[0]))
+        digest.min, digest.max = float(raw[1]), float(raw[2])
+        n = (len(raw) - 3) // 2
+        digest.means, digest.weights = raw[3:3 + n].copy(), raw[3 + n:].copy()
+        return digest
+
+
+# ─── INGESTION ────────────────────────────────────────────────────────────────
+
+_lock = threading.Lock()
+_pending = defaultdict(TDigest)   # (day, metric) -> digest not yet in the database
+_pending_samples = 0
+_last_flush = time.monotonic()
+
+
+def observe(samples, probs):
+    """Fold scored (blink, closure, tilt, ts) samples into the pending digests."""
+    global _pending_samples
+    by_day = defaultdict(lambda: ([], []))
+    for (blink, _, _, ts), prob in zip(samples, probs):
+        fatigue, blinks = by_day[ts.astimezone(dt_timezone.utc).date()]
+        fatigue.append(prob)
+        blinks.append(blink)
+    with _lock:
+        for day, (fatigue, blinks) in by_day.items():
+            _pending[(day, 'fatigue_probability')].update(fatigue)
+            _pending[(day, 'blink_rate')].update(blinks)
+        _pending_samples += len(probs)
+        due = _pending_samples >= FLUSH_SAMPLES or time.monotonic() - _last_flush >= FLUSH_SECONDS
+    if due:
+        flush()
+
+
+def flush():
+    """Merge the pending digests into their PopulationSketch rows."""
+    global _pending, _pending_samples, _last_flush
+    with _lock:
+        pending, _pending = _pending, defaultdict(TDigest)
+        _pending_samples, _last_flush = 0, time.monotonic()
+    if not pending:
+        return
+    try:
+        with transaction.atomic():
+            for (day, metric), digest in pending.items():
+                _merge_into(day, metric, digest)
+    except Exception:
+        logger.exception("sketch flush failed; keeping %d digests for the next one", len(pending))
+        with _lock:
+            for key, digest in pending.items():
+                _pending[key].merge(digest)
+
+
+def _merge_into(day, metric, digest):
+    row = PopulationSketch.objects.select_for_update().filter(day=day, metric=metric).first()
+    if row is None:
+        try:
+            with transaction.atomic():
+                PopulationSketch.objects.create(day=day, metric=metric, count=round(digest.count),
+                                                data=digest.to_bytes())
+            return
+        except IntegrityError:
+            # Another process created the row first
+            row = PopulationSketch.objects.select_for_update().get(day=day, metric=metric)
+    merged = TDigest.from_bytes(row.data).merge(digest)
+    row.data, row.count = merged.to_bytes(), round(merged.count)
+    row.save(update_fields=['data', 'count', 'updated_at'])
+
+
+# ─── REBUILD ──────────────────────────────────────────────────────────────────
+
+def _utc_bounds(day):
+    start = datetime.combine(day, dt_time.min, tzinfo=dt_timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def _store(day, metric, digest):
+    if digest.weights.size:
+        PopulationSketch.objects.update_or_create(
+            day=day, metric=metric, defaults={'data': digest.to_bytes(), 'count': round(digest.count)})
+    else:
+        PopulationSketch.objects.filter(day=day, metric=metric).delete()
+
+
+def rebuild(day, samples=True):
+    """Recompute `day`'s sketches from the stored data, replacing its rows.
+
+    Sample metrics are rebuilt from raw samples, packed or not, plus
+    compacted buckets (a bucket adds its mean weighted by its count).
+    Rebuilding them for a day that is still receiving samples would double
+    count unflushed ones.
+    """
+    if samples:
+        start, end = _utc_bounds(day)
+        digests = {metric: TDigest() for metric in SAMPLE_METRICS}
+        user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+        # Users a chunk at a time, so each query is a probe of the (user, time) indexes
+        for i in range(0, len(user_ids), REBUILD_USERS):
+            raw = (FatigueLog.objects.filter(user_id__in=user_ids[i:i + REBUILD_USERS],
+                                             timestamp__gte=start, timestamp__lt=end)
+                   .values_list(*SAMPLE_METRICS).iterator(chunk_size=REBUILD_CHUNK))
+            while True:
+                chunk = np.array(list(islice(raw, REBUILD_CHUNK)), dtype=np.float64)
+                if not len(chunk):
+                    break
+                for j, metric in enumerate(SAMPLE_METRICS):
+                    digests[metric].update(chunk[:, j])
+            packed = (SampleBlock.objects.filter(user_id__in=user_ids[i:i + REBUILD_USERS],
+                                                 minute__gte=start, minute__lt=end)
+                      .values_list('minute', 'data').iterator(chunk_size=blocks.CHUNK_BLOCKS))
+            while pairs := list(islice(packed, blocks.CHUNK_BLOCKS)):
+                _, values = blocks.decode(pairs)
+                for metric in SAMPLE_METRICS:
+                    digests[metric].update(values[:, blocks.FEATURES.index(metric)])
+        buckets = np.array(FatigueAggregate.objects.filter(bucket_start__gte=start, bucket_start__lt=end)
+                           .values_list('count', *(f'{m}_sum' for m in SAMPLE_METRICS)), dtype=np.float64)
+        if len(buckets):
+            for i, metric in enumerate(SAMPLE_METRICS):
+                digests[metric].update(buckets[:, i + 1] / buckets[:, 0], buckets[:, 0])
+        for metric, digest in digests.items():
+            _store(day, metric, digest)
+
+    minutes = DailyRollup.objects.filter(day=day, work_minutes__gt=0).values_list('work_minutes', flat=True)
+    _store(day, 'work_hours', TDigest().update(np.fromiter(minutes, dtype=np.float64) / 60))
+
+
+# ─── READING ──────────────────────────────────────────────────────────────────
+
+def population(metric, first_day, last_day):
+    """Merged digest of `metric` over first_day..last_day; cached, as every user shares it."""
+    key = f'monitor:sketch:{metric}:{first_day.isoformat()}:{last_day.isoformat()}'
+    data = cache.get(key)
+    if data is None:
+        digest = TDigest()
+        for blob in PopulationSketch.objects.filter(metric=metric, day__gte=first_day, day__lte=last_day) \
+                .values_list('data', flat=True):
+            digest.merge(TDigest.from_bytes(blob))
+        data = digest.to_bytes()
+        cache.set(key, data, TIMEOUT)
+    return TDigest.from_bytes(data)
+
+
+def percentile_rank(metric, value, first_day, last_day):
+    """Percentage (0-100) of the population's values at or below `value`; None without data."""
+    if value is None:
+        return None
+    digest = population(metric, first_day, last_day)
+    return None if not digest.weights.size else 100 * digest.cdf(value)
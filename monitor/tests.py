@@ -1,3 +1,1197 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zoneinfo
+from collections import defaultdict
+from contextlib import aclosing
+from io import StringIO
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock, skipUnless
+
+import joblib
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.db.models import Avg, Sum
+from django.test import (AsyncClient, AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from sklearn.linear_model import LogisticRegression
+from sklearn.tree import DecisionTreeClassifier
+
+from . import (archive, blocks, burnout, metrics, ratelimit, reports, retention, rollups, series, sessions,
+               sketches, training, views, writebehind)
+from .caching import claim_alert_slot, set_active_session
+from .events import EventHub, format_sse, hub
+from .inference import FatigueScorer
+from .models import (AlertLog, BurnoutRisk, DailyRollup, FatigueAggregate, FatigueLog, HourlyRollup,
+                     PopulationSketch, SampleBlock, SessionLog, UserSettings)
+from .registry import LEGACY_PATH, ModelRegistry
+from .views import _alert_counts, calculate_burnout
+from .writebehind import WriteBehindQueue
+
+
+def _random_samples(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.uniform(0, 40, n),     # blink_rate
+        rng.uniform(0, 5, n),      # eye_closure_duration
+        rng.uniform(0, 60, n),     # head_tilt_angle
+        rng.uniform(0, 900, n),    # session_minutes
+    ])
+
+
+class FatigueScorerParityTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.model = joblib.load(LEGACY_PATH)
+
+    def setUp(self):
+        self.scorer = FatigueScorer(self.model, initial_capacity=4)
+
+    def test_uses_linear_fast_path(self):
+        self.assertTrue(self.scorer.is_linear)
+
+    def test_single_sample_matches_predict_proba(self):
+        for row in _random_samples(200):
+            expected = self.model.predict_proba([row])[0][1]
+            self.assertAlmostEqual(self.scorer.predict_one(*row), expected, places=12)
+
+    def test_batch_matches_predict_proba(self):
+        X = _random_samples(1000, seed=1)
+        expected = self.model.predict_proba(X)[:, 1]
+        np.testing.assert_allclose(self.scorer.predict_batch(X.tolist()), expected, rtol=0, atol=1e-12)
+        # Smaller batch reuses the grown buffer
+        np.testing.assert_allclose(self.scorer.predict_batch(X[:3].tolist()), expected[:3], rtol=0, atol=1e-12)
+
+    def test_extreme_inputs_saturate_without_nan(self):
+        out = self.scorer.predict_batch([[0, 1e6, 0, 0], [1e6, 0, 0, 0]])
+        np.testing.assert_allclose(out, self.model.predict_proba([[0, 1e6, 0, 0], [1e6, 0, 0, 0]])[:, 1])
+
+    def test_non_linear_model_falls_back_to_sklearn(self):
+        X = _random_samples(100, seed=2)
+        y = (X[:, 1] > 1.5).astype(int)
+        tree = DecisionTreeClassifier(max_depth=3).fit(X, y)
+        scorer = FatigueScorer(tree)
+        self.assertFalse(scorer.is_linear)
+        np.testing.assert_allclose(scorer.predict_batch(X.tolist()), tree.predict_proba(X)[:, 1])
+        self.assertEqual(scorer.predict_one(*X[0]), tree.predict_proba(X[:1])[0][1])
+
+
+class SampleValidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('sampler', password='pw'))
+
+    def _post(self, **fields):
+        sample = {'blink_rate': 12, 'eye_closure_duration': 0.4, 'head_tilt_angle': 9, **fields}
+        return self.client.post(reverse('save_fatigue'), json.dumps(sample), content_type='application/json')
+
+    def test_rejects_non_finite_readings_and_stale_timestamps(self):
+        now_ms = timezone.now().timestamp() * 1000
+        for fields in ({'blink_rate': float('nan')}, {'head_tilt_angle': float('inf')},
+                       {'ts': 0}, {'ts': now_ms - views.MAX_SAMPLE_AGE.total_seconds() * 1000 - 60_000}):
+            with self.subTest(fields=fields):
+                self.assertEqual(self._post(**fields).status_code, 400)
+        self.assertFalse(FatigueLog.objects.exists())
+
+        self.assertEqual(self._post(ts=now_ms - 3_600_000).status_code, 200)
+        self.assertEqual(FatigueLog.objects.count(), 1)
+
+    def test_samples_and_rollups_are_written_together(self):
+        for packed in (False, True):
+            with self.subTest(packed=packed), mock.patch.object(blocks, 'ENABLED', packed), \
+                    mock.patch.object(rollups, '_bump', side_effect=OperationalError('disk I/O error')):
+                with self.assertRaises(OperationalError):
+                    self._post()
+                self.assertFalse(FatigueLog.objects.exists() or SampleBlock.objects.exists())
+
+
+class CachedLookupTests(TestCase):
+    LOOKUP_TABLES = ('monitor_usersettings', 'monitor_sessionlog', 'monitor_burnoutrisk')
+    # Burnout reads whether the cached open session is still open (sessions.last_seen)
+    LIVENESS_CHECK = '"monitor_sessionlog"."session_end" IS NULL'
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('steady', password='pw'))
+
+    def _requests(self):
+        sample = {'blink_rate': 12, 'eye_closure_duration': 0.4, 'head_tilt_angle': 9}
+        yield 5, lambda: self.client.get(reverse('dashboard'))    # session, user, rollup, liveness, unread
+        # session, user x2, then insert and 2 rollups inside a savepoint
+        yield 8, lambda: self.client.post(reverse('save_fatigue'), json.dumps(sample),
+                                          content_type='application/json')
+        yield 5, lambda: self.client.get(reverse('current_fatigue'))   # session, user x2, newest sample x2
+
+    def _lookups(self, ctx):
+        return [q['sql'] for q in ctx.captured_queries
+                if any(t in q['sql'] for t in self.LOOKUP_TABLES) and self.LIVENESS_CHECK not in q['sql']]
+
+    def test_steady_state_lookups_come_from_the_cache(self):
+        # On-commit work (data version bumps) runs too, so it is counted
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            for _, request in self._requests():
+                request()
+        self.assertTrue(self._lookups(ctx))   # warmup reads settings, session and burnout
+
+        for _ in range(2):
+            for queries, request in self._requests():
+                with CaptureQueriesContext(connection) as ctx, self.assertNumQueries(queries), \
+                        self.captureOnCommitCallbacks(execute=True):
+                    request()
+                self.assertFalse(self._lookups(ctx))
+
+
+class AlertCooldownTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alerted', password='pw')
+
+    def _fire(self, now):
+        if claim_alert_slot(self.user, 'posture', now):
+            AlertLog.objects.create(user=self.user, alert_type='posture', message='x', timestamp=now)
+            return True
+        return False
+
+    @override_settings(MONITOR_ALERT_COOLDOWN_MINUTES={'posture': 10})
+    def test_same_type_is_suppressed_until_the_cooldown_ends(self):
+        now = timezone.now()
+        self.assertTrue(self._fire(now))
+        self.assertFalse(self._fire(now + timedelta(minutes=5)))
+        self.assertTrue(claim_alert_slot(self.user, 'fatigue_med', now + timedelta(minutes=5)))
+
+        # The cooldown key expires with the window; without it the window is
+        # rebuilt from the last AlertLog row
+        cache.clear()
+        self.assertFalse(self._fire(now + timedelta(minutes=9)))
+        cache.clear()
+        self.assertTrue(self._fire(now + timedelta(minutes=11)))
+        self.assertEqual(AlertLog.objects.filter(user=self.user, alert_type='posture').count(), 2)
+
+
+class BurnoutPersistenceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('steadyrisk', password='pw')
+        self.day = timezone.localdate()
+
+    def _score(self):
+        return BurnoutRisk.objects.get(user=self.user, day=self.day).burnout_score
+
+    def test_small_score_changes_are_not_written(self):
+        views._record_burnout(self.user, self.day, 0.3, 0.40, 'Medium')
+        tolerance = views.BURNOUT_SCORE_TOLERANCE
+        with CaptureQueriesContext(connection) as ctx:
+            views._record_burnout(self.user, self.day, 0.3, 0.40 + tolerance / 2, 'Medium')
+        self.assertFalse([q for q in ctx.captured_queries if 'monitor_burnoutrisk' in q['sql']])
+        self.assertEqual(self._score(), 0.40)
+
+        views._record_burnout(self.user, self.day, 0.3, 0.40 + tolerance * 2, 'Medium')
+        self.assertAlmostEqual(self._score(), 0.40 + tolerance * 2)
+        views._record_burnout(self.user, self.day, 0.3, 0.40 + tolerance * 2, 'High')   # level change
+        self.assertEqual(BurnoutRisk.objects.get(user=self.user, day=self.day).risk_level, 'High')
+        self.assertEqual(BurnoutRisk.objects.filter(user=self.user).count(), 1)
+
+
+class LiveEventTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('watcher', password='pw')
+        FatigueLog.objects.create(user=self.user, blink_rate=12, fatigue_probability=0.42)
+        AlertLog.objects.create(user=self.user, alert_type='posture', message='x', value=20)
+
+    async def test_publish_fans_out_from_other_threads(self):
+        hub = EventHub()
+        subs = [hub.subscribe(1), hub.subscribe(1)]
+        other = hub.subscribe(2)
+        publisher = threading.Thread(target=hub.publish, args=(1, 'fatigue'), kwargs={'fatigue': 0.5})
+        publisher.start()
+        publisher.join()
+        for sub in subs:
+            self.assertEqual(await asyncio.wait_for(sub.queue.get(), 1), ('fatigue', {'fatigue': 0.5}))
+        self.assertTrue(other.queue.empty())
+
+        for sub in subs:
+            hub.unsubscribe(sub)
+        self.assertFalse(hub.has_subscribers(1))
+        self.assertTrue(hub.has_subscribers(2))
+
+    async def test_stream_sends_a_snapshot_then_events_and_keepalives(self):
+        request = AsyncRequestFactory().get(reverse('event_stream'))
+
+        async def auser():
+            return self.user
+        request.auser = auser
+
+        with mock.patch.object(views, 'SSE_KEEPALIVE_SECONDS', 0.01):
+            response = await views.event_stream(request)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            async with aclosing(aiter(response)) as content:
+                self.assertEqual(await anext(content), format_sse('fatigue', {'fatigue': 0.42}).encode())
+                self.assertEqual(await anext(content), format_sse('unread', {'count': 1}).encode())
+                self.assertEqual(await anext(content), b': keepalive\n\n')
+                hub.publish(self.user.pk, 'alert', id=7, type='posture')
+                self.assertEqual(await anext(content), format_sse('alert', {'id': 7, 'type': 'posture'}).encode())
+        # The stream's generator unsubscribes when the event loop finalizes it
+        del response
+        for _ in range(100):
+            if not hub.has_subscribers(self.user.pk):
+                break
+            await asyncio.sleep(0)
+        self.assertFalse(hub.has_subscribers(self.user.pk))
+
+    def test_wsgi_clients_are_told_to_poll(self):
+        self.assertEqual(self.client.get(reverse('event_stream')).status_code, 401)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('event_stream')).status_code, 204)
+
+
+class WriteBehindTests(TransactionTestCase):
+    # The writer thread has its own connection, which must see committed data
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('deferred', password='pw')
+        self.start = datetime(2026, 1, 10, 20, 0, tzinfo=dt_timezone.utc)
+
+    def _queue(self, **kwargs):
+        q = WriteBehindQueue(**{'flush_ms': 50, 'batch_rows': 1000, 'retry_backoff_ms': 1, **kwargs})
+        self.addCleanup(q.shutdown)
+        return q
+
+    def _rows(self, n, offset=0):
+        return [FatigueLog(user=self.user, blink_rate=10, fatigue_probability=0.5,
+                           timestamp=self.start + timedelta(seconds=10 * (offset + i))) for i in range(n)]
+
+    def _wait_for(self, q, **expected):
+        deadline = time.monotonic() + 5
+        while any(q.stats()[k] < v for k, v in expected.items()) and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return q.stats()
+
+    def test_batches_close_on_row_count_or_deadline(self):
+        q = self._queue(flush_ms=60_000, batch_rows=3)
+        for offset in range(4):
+            q._queue.put((self.user, self._rows(1, offset)))
+        started = time.monotonic()
+        self.assertEqual(len(q._take_batch()), 3)   # full long before the 60s deadline
+        self.assertLess(time.monotonic() - started, 1)
+
+        q = self._queue(flush_ms=20)
+        q._queue.put((self.user, self._rows(2)))
+        self.assertEqual([len(rows) for _, rows in q._take_batch()], [2])   # deadline closes it
+
+    def test_writer_thread_group_commits_rows_and_rollups(self):
+        q = self._queue(flush_ms=20)
+        q.submit(self.user, self._rows(2))
+        q.submit(self.user, self._rows(3, offset=2))
+        stats = self._wait_for(q, flushed_rows=5)
+        self.assertEqual((stats['enqueued_rows'], stats['flushed_rows'], stats['queue_depth']), (5, 5, 0))
+        self.assertGreaterEqual(stats['max_flush_ms'], stats['last_flush_ms'])
+        self.assertEqual(FatigueLog.objects.filter(user=self.user).count(), 5)
+        self.assertEqual(DailyRollup.objects.get(user=self.user).fatigue_count, 5)
+
+    def test_full_queue_answers_503(self):
+        q = WriteBehindQueue(maxsize=1)
+        self.client.force_login(self.user)
+        sample = json.dumps({'blink_rate': 12, 'eye_closure_duration': 0.4, 'head_tilt_angle': 9})
+        # No writer thread, so nothing drains the queue
+        with mock.patch.object(q, '_ensure_started'), mock.patch.object(writebehind, 'ENABLED', True), \
+                mock.patch.object(writebehind, 'write_behind', q):
+            ok = self.client.post(reverse('save_fatigue'), sample, content_type='application/json')
+            busy = self.client.post(reverse('save_fatigue'), sample, content_type='application/json')
+        self.assertEqual(ok.status_code, 200)
+        self.assertEqual(busy.status_code, 503)
+        self.assertEqual(busy['Retry-After'], '5')
+        stats = q.stats()
+        self.assertEqual((stats['enqueued_rows'], stats['rejected_rows'], stats['queue_depth']), (1, 1, 1))
+
+    def test_shutdown_flushes_what_is_still_queued(self):
+        q = self._queue()
+
+        def idle():
+            time.sleep(0.005)
+            return []
+        with mock.patch.object(writebehind.atexit, 'register') as register, \
+                mock.patch.object(q, '_take_batch', side_effect=idle):
+            q.submit(self.user, self._rows(4))
+            register.assert_called_once_with(q.shutdown)
+            self.assertEqual(q.stats()['queue_depth'], 1)   # one batch of four rows
+            q.shutdown()
+        self.assertEqual(FatigueLog.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(q.stats()['flushed_rows'], 4)
+
+    def test_failed_commits_are_retried_then_dropped(self):
+        q = self._queue(retry_attempts=3)
+        real = rollups.add_fatigue_samples
+        failures = [OperationalError('database is locked')]
+
+        def flaky(*args):
+            if failures:
+                raise failures.pop()
+            return real(*args)
+        with mock.patch.object(writebehind.rollups, 'add_fatigue_samples', side_effect=flaky), \
+                self.assertLogs('monitor.writebehind', 'ERROR'):
+            q.submit(self.user, self._rows(2))
+            stats = self._wait_for(q, flushed_rows=2)
+        self.assertEqual((stats['failed_flushes'], stats['dropped_rows']), (1, 0))
+        self.assertEqual(FatigueLog.objects.filter(user=self.user).count(), 2)
+
+        with mock.patch.object(writebehind.rollups, 'add_fatigue_samples', side_effect=OperationalError), \
+                self.assertLogs('monitor.writebehind', 'ERROR'):
+            q.submit(self.user, self._rows(3, offset=2))
+            stats = self._wait_for(q, dropped_rows=3)
+        self.assertEqual((stats['failed_flushes'], stats['dropped_rows'], stats['flushed_rows']), (4, 3, 2))
+        self.assertEqual(FatigueLog.objects.filter(user=self.user).count(), 2)
+
+    def test_rollups_use_the_users_timezone(self):
+        UserSettings.objects.create(user=self.user, timezone='Asia/Kolkata')
+        q = self._queue()
+        with timezone.override(dt_timezone.utc):
+            q.submit(self.user, self._rows(1))   # 20:00 UTC is 01:30 the next day in Kolkata
+            self._wait_for(q, flushed_rows=1)
+        self.assertEqual(DailyRollup.objects.get(user=self.user).day, datetime(2026, 1, 11).date())
+        self.assertEqual(HourlyRollup.objects.get(user=self.user).hour, self.start - timedelta(minutes=30))
+
+
+class HotQueryPlanTests(TestCase):
+    """The per-user queries issued by the views must be index lookups, not table scans."""
+
+    VIEWS = ['dashboard', 'current_fatigue', 'analytics', 'analytics_data',
+             'reports', 'download_report_csv', 'alerts', 'alerts_feed', 'unread_alert_count']
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('planner', password='pw')
+        other = User.objects.create_user('other', password='pw')
+        now = timezone.now()
+        for u in (self.user, other):
+            SessionLog.objects.create(user=u)
+            FatigueLog.objects.bulk_create([
+                FatigueLog(user=u, blink_rate=10, fatigue_probability=0.5,
+                           timestamp=now - timedelta(minutes=i))
+                for i in range(50)
+            ])
+            AlertLog.objects.create(user=u, alert_type='posture', message='x', value=20)
+            BurnoutRisk.objects.create(user=u, weekly_avg_fatigue=0.5, burnout_score=0.5, risk_level='Medium')
+        self.client.login(username='planner', password='pw')
+
+    def _plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_hot_queries_use_indexes(self):
+        for name in self.VIEWS:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse(name))
+                if getattr(response, 'streaming', False):
+                    b''.join(response.streaming_content)
+            self.assertEqual(response.status_code, 200, name)
+            for query in ctx.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or 'monitor_' not in sql:
+                    continue
+                for step in self._plan(sql):
+                    with self.subTest(view=name, sql=sql, step=step):
+                        self.assertFalse(step.startswith('SCAN monitor_'), step)
+                        self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', step)
+
+
+class LoadBenchmarkCommandTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        call_command('generate_load_data', users=2, days=2, seed=1, stdout=StringIO())
+        self.out = os.path.join(tempfile.mkdtemp(), 'bench.json')
+
+    def test_generated_data_is_consistent(self):
+        user = User.objects.get(username='loadtest00000')
+        self.assertTrue(FatigueLog.objects.filter(user=user).exists())
+        self.assertEqual(BurnoutRisk.objects.filter(user=user).count(), 2)
+        self.assertFalse(SessionLog.objects.filter(user=user, session_end__isnull=True).exists())
+
+    def test_regenerating_only_replaces_generated_users(self):
+        bystander = User.objects.create_user('loadtester', password='pw')
+        SessionLog.objects.create(user=bystander)
+        call_command('generate_load_data', users=1, days=1, seed=2, stdout=StringIO())
+        self.assertEqual(list(User.objects.filter(username__startswith='loadtest').values_list('username', flat=True)
+                              .order_by('username')), ['loadtest00000', 'loadtester'])
+        self.assertEqual(SessionLog.objects.filter(user=bystander).count(), 1)
+
+    def test_benchmark_records_every_view_and_flags_regressions(self):
+        call_command('benchmark_views', repeat=1, output=self.out, stdout=StringIO())
+        with open(self.out) as fh:
+            views = json.load(fh)['views']
+        self.assertIn('analytics_data', views)
+        self.assertNotIn('event_stream', views)
+        self.assertTrue(all(v['status'] == 200 for v in views.values()), views)
+
+        # A baseline claiming zero queries everywhere must be reported as a regression
+        for v in views.values():
+            v['queries'] = 0
+        with open(self.out, 'w') as fh:
+            json.dump({'views': views}, fh)
+        with self.assertRaises(CommandError):
+            call_command('benchmark_views', repeat=1, output=self.out + '.2', baseline=self.out,
+                         stdout=StringIO())
+
+
+class MetricsEndpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('metrics', password='pw')
+        self.client.force_login(self.user)
+
+    def test_requires_staff_or_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with override_settings(MONITOR_METRICS_TOKEN='s3cret'):
+            self.client.logout()
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer nope').status_code, 403)
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+
+    def test_records_latency_queries_and_inference(self):
+        self.client.post(reverse('save_fatigue'), json.dumps(
+            {'blink_rate': 12, 'eye_closure_duration': 0.4, 'head_tilt_angle': 9}),
+            content_type='application/json')
+        self.user.is_staff = True
+        self.user.save()
+        body = self.client.get(reverse('metrics')).content.decode()
+
+        self.assertIn('neurowatch_request_duration_seconds_count{view="save_fatigue"}', body)
+        self.assertIn('neurowatch_request_db_queries_bucket{view="save_fatigue",le="+Inf"}', body)
+        self.assertIn('neurowatch_response_size_bytes_sum{view="save_fatigue"}', body)
+        count = next(line for line in body.splitlines()
+                     if line.startswith('neurowatch_inference_duration_seconds_count'))
+        self.assertGreaterEqual(int(count.split()[-1]), 1)
+
+    def test_exited_threads_are_folded_into_the_retired_shard(self):
+        def totals():
+            lines = dict(line.rsplit(' ', 1) for line in metrics.render().splitlines() if not line.startswith('#'))
+            return (float(lines.get('neurowatch_inference_samples_total', 0)),
+                    float(lines.get('neurowatch_inference_duration_seconds_count', 0)))
+
+        def record():
+            metrics.inference_samples.inc(2)
+            metrics.inference_latency.observe(0.003)
+
+        before, shards = totals(), len(metrics._shards)
+        for _ in range(20):
+            thread = threading.Thread(target=record)
+            thread.start()
+            thread.join()
+        self.assertLessEqual(len(metrics._shards), shards)
+        self.assertEqual(totals(), (before[0] + 40, before[1] + 20))
+
+
+class TrainingPipelineTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('trainer', password='pw')
+        self.start = timezone.now() - timedelta(hours=5)
+        SessionLog.objects.create(user=self.user, session_start=self.start,
+                                  session_end=self.start + timedelta(hours=4))
+        FatigueLog.objects.bulk_create([
+            FatigueLog(user=self.user, blink_rate=5, eye_closure_duration=2, head_tilt_angle=20,
+                       fatigue_probability=0.9, timestamp=self.start + timedelta(minutes=m))
+            for m in (30, 90, 300)])   # the last sample falls after the session
+
+    def test_real_rows_are_joined_to_session_minutes(self):
+        chunks = list(training.fatigue_log_chunks(chunk_size=2))
+        self.assertEqual([len(y) for _, y in chunks], [2, 1])
+        X = np.vstack([X for X, _ in chunks])
+        np.testing.assert_allclose(X[:, 3], [30, 90, 0], atol=1e-6)
+        self.assertTrue(all(y.all() for _, y in chunks))
+
+    def test_command_writes_versioned_artifact_for_fast_scorer(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            target = os.path.join(tmp, 'fatigue_model.pkl')
+            call_command('train_fatigue_model', synthetic=20000, chunk_size=5000, epochs=2,
+                         output_dir=tmp, install=target, stdout=StringIO())
+            artifacts = [f for f in os.listdir(tmp) if f.startswith('fatigue-')]
+            self.assertEqual(sorted(f.rsplit('.', 1)[1] for f in artifacts), ['json', 'pkl'])
+            with open(os.path.join(tmp, next(f for f in artifacts if f.endswith('.json')))) as fh:
+                meta = json.load(fh)
+            self.assertEqual(meta['rows'], 20003)
+            self.assertGreater(meta['accuracy'], 0.8)
+
+            scorer = FatigueScorer(joblib.load(target))
+            self.assertTrue(scorer.is_linear)
+            self.assertGreater(scorer.predict_one(4, 2.5, 25, 300), 0.5)
+            self.assertLess(scorer.predict_one(20, 0.1, 2, 15), 0.5)
+
+
+class ColumnarArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(archive, 'ARCHIVE_DIR', self.tmp.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+        self.user = User.objects.create_user('archivist', password='pw')
+        now = timezone.now()
+        old = now - timedelta(days=70)
+        FatigueLog.objects.bulk_create([
+            FatigueLog(user=self.user, blink_rate=10, eye_closure_duration=0.5, head_tilt_angle=5,
+                       fatigue_probability=p, timestamp=old + timedelta(minutes=i))
+            for i, p in enumerate((0.2, 0.4, 0.9))] + [
+            FatigueLog(user=self.user, blink_rate=10, eye_closure_duration=0.5, head_tilt_angle=5,
+                       fatigue_probability=0.6, timestamp=now)])
+        FatigueAggregate.objects.create(
+            user=self.user, bucket_start=old - timedelta(days=1), bucket_seconds=300, count=4,
+            **{f'{f}_{s}': v for f in archive.FEATURES for s, v in (('sum', 2.0), ('min', 0.5), ('max', 0.5))})
+        rollups.rebuild([self.user])
+
+    def test_export_writes_mmappable_segments_once(self):
+        segments, rows = archive.export()
+        self.assertGreaterEqual(segments, 1)
+        self.assertEqual(rows, 4)   # three raw samples and one compacted bucket
+        self.assertEqual(archive.export(), (0, 0))
+
+        manifest = archive.read_manifest(self.user.pk)
+        entries = list(manifest['segments'].values())
+        self.assertEqual(sum(e['samples'] for e in entries), 7)
+        seg_dir = os.path.join(self.tmp.name, str(self.user.pk), entries[0]['dir'])
+        self.assertIsInstance(np.load(os.path.join(seg_dir, 'ts.npy'), mmap_mode='r'), np.memmap)
+
+    def test_profile_combines_archive_and_rollups(self):
+        archive.export()
+        today = timezone.localdate()
+        daily, hour_of_day = archive.fatigue_profile(self.user, today - timedelta(days=364), today)
+
+        expected = {r.day: r.avg_fatigue for r in DailyRollup.objects.filter(user=self.user)}
+        got = {today - timedelta(days=364 - i): avg for i, avg in enumerate(daily) if avg is not None}
+        self.assertEqual(got.keys(), expected.keys())
+        for day, avg in expected.items():
+            self.assertAlmostEqual(got[day], avg)
+        self.assertIsNotNone(hour_of_day[timezone.localtime().hour])
+
+        self.client.force_login(self.user)
+        data = self.client.get(reverse('analytics_data'), {'period': 365}).json()
+        self.assertEqual(len(data['labels']), 365)
+        self.assertEqual(len(data['hour_of_day']), 24)
+
+
+class AlertFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('pager', password='pw')
+        ts = timezone.now() - timedelta(hours=1)
+        # Pairs share a timestamp so the id tie-breaker is exercised
+        AlertLog.objects.bulk_create([
+            AlertLog(user=self.user, alert_type='posture' if i % 3 else 'break', message=f'a{i}',
+                     value=i, acknowledged=i % 2 == 0, timestamp=ts + timedelta(minutes=i // 2))
+            for i in range(25)])
+        self.client.force_login(self.user)
+
+    def test_counts_in_one_query(self):
+        with self.assertNumQueries(1):
+            counts = _alert_counts(self.user)
+        self.assertEqual(counts, {'total': 25, 'unread': 12, 'fatigue': 0,
+                                  'posture': 16, 'break': 9, 'burnout': 0})
+
+    def test_keyset_pages_cover_every_alert_once(self):
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 7, **({'cursor': cursor} if cursor else {})}
+            page = self.client.get(reverse('alerts_feed'), params).json()
+            seen += [(a['timestamp'], a['id']) for a in page['alerts']]
+            cursor = page['next']
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+
+        page = self.client.get(reverse('alerts_feed'), {'type': 'break', 'limit': 100}).json()
+        self.assertEqual({a['message'] for a in page['alerts']}, {f'a{i}' for i in range(0, 25, 3)})
+        self.assertEqual(self.client.get(reverse('alerts_feed'), {'cursor': 'nope'}).status_code, 400)
+
+    def test_unread_count(self):
+        self.assertEqual(self.client.get(reverse('unread_alert_count')).json(), {'count': 12})
+
+
+class AnalyticsRangeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ranger', password='pw')
+        self.now = timezone.now().replace(second=0, microsecond=0)
+        FatigueLog.objects.bulk_create([
+            FatigueLog(user=self.user, blink_rate=10, fatigue_probability=0.1 + (i % 7) / 10,
+                       timestamp=self.now - timedelta(minutes=i))
+            for i in range(0, 60 * 24 * 3, 5)])
+        rollups.rebuild([self.user])
+        self.client.force_login(self.user)
+
+    def _get(self, **params):
+        return self.client.get(reverse('analytics_data'), params)
+
+    def test_lttb_keeps_endpoints_and_spikes(self):
+        x = np.arange(1000, dtype=float)
+        y = np.zeros(1000)
+        y[437] = 5
+        keep = series.lttb(x, y, 50)
+        self.assertEqual(len(keep), 50)
+        self.assertEqual((keep[0], keep[-1]), (0, 999))
+        self.assertIn(437, keep)
+        self.assertTrue((np.diff(keep) > 0).all())
+
+    def test_bucket_size_follows_range(self):
+        for span, expected in ((timedelta(hours=6), 'minute'), (timedelta(days=7), 'hour'),
+                               (timedelta(days=300), 'day'), (timedelta(days=3000), 'week')):
+            data = self._get(start=(self.now - span).isoformat(), end=self.now.isoformat()).json()
+            self.assertEqual(data['bucket'], expected, span)
+            self.assertLessEqual(len(data['labels']), series.MAX_POINTS)
+            self.assertEqual(len(data['labels']), len(data['fatigue']))
+
+    def test_minute_buckets_match_raw_samples(self):
+        start = self.now - timedelta(minutes=30)
+        data = self._get(start=start.isoformat(), end=self.now.isoformat()).json()
+        expected = {ts: p for ts, p in FatigueLog.objects.filter(
+            user=self.user, timestamp__gte=start, timestamp__lt=self.now).values_list('timestamp', 'fatigue_probability')}
+        self.assertEqual(len(data['fatigue']), len(expected))
+        for ts, value in zip(data['timestamps'], data['fatigue']):
+            self.assertAlmostEqual(value, round(expected[datetime.fromisoformat(ts)], 3))
+
+    def test_query_count_does_not_grow_with_range(self):
+        self._get()   # first request also caches the user's timezone in the session
+        counts = []
+        for days in (10, 400, 3000):
+            with CaptureQueriesContext(connection) as ctx:
+                self._get(start=(self.now - timedelta(days=days)).date().isoformat())
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(len(set(counts)), 1, counts)
+
+    def test_rejects_bad_parameters(self):
+        for params in ({'period': 'abc'}, {'period': 100000}, {'period': 0},
+                       {'start': 'yesterday'}, {'start': '2026-01-01', 'end': '2025-01-01'},
+                       {'start': '2000-01-01', 'end': '2026-01-01'}, {'start': '2026-01-01', 'end': '9999-12-31'},
+                       {'start': '0001-01-01'}):
+            self.assertEqual(self._get(**params).status_code, 400, params)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('poller', password='pw')
+        self.client.force_login(self.user)
+
+    def _post_sample(self):
+        # The version is bumped on commit, which TestCase only simulates
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('save_fatigue'), json.dumps(
+                {'blink_rate': 12, 'eye_closure_duration': 0.4, 'head_tilt_angle': 9}),
+                content_type='application/json')
+
+    def test_unchanged_poll_is_304_without_monitor_queries(self):
+        self._post_sample()
+        for name, params in (('current_fatigue', {}), ('analytics_data', {'period': 7})):
+            first = self.client.get(reverse(name), params)
+            self.assertEqual(first.status_code, 200)
+            self.assertIn('private', first['Cache-Control'])
+            with CaptureQueriesContext(connection) as ctx:
+                again = self.client.get(reverse(name), params, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(again.status_code, 304, name)
+            self.assertFalse([q for q in ctx.captured_queries if 'monitor_' in q['sql']], name)
+
+    def test_new_sample_or_other_query_changes_validator(self):
+        self._post_sample()
+        first = self.client.get(reverse('current_fatigue'))
+        chart = self.client.get(reverse('analytics_data'), {'period': 7})
+        other = self.client.get(reverse('analytics_data'), {'period': 30})
+        self.assertNotEqual(chart['ETag'], other['ETag'])
+
+        self._post_sample()
+        for name, params, etag in (('current_fatigue', {}, first['ETag']),
+                                   ('analytics_data', {'period': 7}, chart['ETag'])):
+            response = self.client.get(reverse(name), params, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, name)
+
+
+class SessionLifecycleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('sleeper', password='pw')
+        self.client.force_login(self.user)
+
+    def _post_sample(self, ts=None):
+        sample = {'blink_rate': 12, 'eye_closure_duration': 0.4, 'head_tilt_angle': 9}
+        if ts is not None:
+            sample['ts'] = ts.timestamp() * 1000
+        self.client.post(reverse('save_fatigue'), json.dumps(sample), content_type='application/json')
+
+    def test_samples_heartbeat_the_active_session_with_throttling(self):
+        self.client.get(reverse('dashboard'))
+        session = SessionLog.objects.get(user=self.user)
+        first = timezone.now() - timedelta(minutes=5)
+        self._post_sample(first)
+        session.refresh_from_db()
+        self.assertAlmostEqual(session.last_activity.timestamp(), first.timestamp(), delta=0.01)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self._post_sample(first + timedelta(seconds=10))
+        self.assertFalse([q for q in ctx.captured_queries if 'UPDATE "monitor_sessionlog"' in q['sql']])
+        self._post_sample(first + timedelta(seconds=sessions.HEARTBEAT_SECONDS + 1))
+        session.refresh_from_db()
+        self.assertAlmostEqual(session.last_activity.timestamp(),
+                               first.timestamp() + sessions.HEARTBEAT_SECONDS + 1, delta=0.01)
+
+    def test_reaper_closes_idle_sessions_at_last_heartbeat(self):
+        now = timezone.now()
+        stale = [SessionLog.objects.create(user=self.user, session_start=now - timedelta(hours=h),
+                                           last_activity=now - timedelta(hours=h) + timedelta(minutes=40))
+                 for h in (5, 4, 3)]
+        never = SessionLog.objects.create(user=self.user, session_start=now - timedelta(hours=2))
+        live = SessionLog.objects.create(user=self.user, session_start=now - timedelta(hours=1),
+                                         last_activity=now - timedelta(minutes=2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reap_sessions', idle_minutes=30, chunk_size=2, stdout=StringIO())
+
+        for s in stale:
+            s.refresh_from_db()
+            self.assertEqual(s.session_end, s.last_activity)
+            self.assertEqual(s.total_duration_minutes, 40)
+        never.refresh_from_db()
+        self.assertEqual((never.session_end, never.total_duration_minutes), (never.session_start, 0))
+        live.refresh_from_db()
+        self.assertIsNone(live.session_end)
+        self.assertEqual(sum(DailyRollup.objects.filter(user=self.user).values_list('work_minutes', flat=True)), 120)
+
+    def test_burnout_skips_a_session_reaped_by_another_process(self):
+        start = timezone.now() - timedelta(minutes=20)
+        session = SessionLog.objects.create(user=self.user, session_start=start)
+        set_active_session(self.user, session)
+        sessions.heartbeat(self.user, (session.id, start), start + timedelta(minutes=10))
+        open_score = calculate_burnout(self.user)[1]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sessions.reap(now=timezone.now() + timedelta(hours=1))
+        set_active_session(self.user, session)   # this process never saw the invalidation
+        self.assertAlmostEqual(calculate_burnout(self.user)[1], open_score)
+
+
+
+class AsyncViewTests(TestCase):
+    """save_fatigue, current_fatigue and analytics_data through the ASGI handler."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('async', password='pw')
+        SessionLog.objects.create(user=self.user)
+
+    def _db_queries(self, view):
+        match = re.search(rf'neurowatch_request_db_queries_sum{{view="{view}"}} (\S+)', metrics.render())
+        return float(match.group(1)) if match else 0
+
+    async def test_ingest_and_read_back(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        scored_on = []
+
+        def spy(rows):
+            scored_on.append(threading.current_thread().name)
+            return real_score(rows)
+        real_score = views._score
+
+        now_ms = timezone.now().timestamp() * 1000
+        batch = [{'blink_rate': 8, 'eye_closure_duration': 2.5, 'head_tilt_angle': 5, 'ts': now_ms - i * 1000}
+                 for i in range(3)]
+        with mock.patch.object(views, '_score', spy):
+            response = await client.post(reverse('save_fatigue'), json.dumps(batch),
+                                         content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 3)
+        self.assertTrue(scored_on[0].startswith('fatigue-inference'), scored_on)
+        self.assertEqual(await FatigueLog.objects.filter(user=self.user).acount(), 3)
+
+        queries_before = self._db_queries('current_fatigue')
+        response = await client.get(reverse('current_fatigue'))
+        latest = await FatigueLog.objects.filter(user=self.user).order_by('-timestamp').afirst()
+        self.assertEqual(response.json()['fatigue'], round(latest.fatigue_probability, 2))
+        # The async metrics middleware still sees the ORM's queries
+        self.assertGreater(self._db_queries('current_fatigue'), queries_before)
+        again = await client.get(reverse('current_fatigue'), headers={'If-None-Match': response['ETag']})
+        self.assertEqual(again.status_code, 304)
+
+        response = await client.get(reverse('analytics_data'), {'period': 7})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertGreater(data['fatigue'][-1], 0)
+        self.assertEqual(sum(v is not None for v in data['hourly']), 1)
+
+
+class ConcurrencyBenchmarkCommandTests(TransactionTestCase):
+    # Requests are served from other threads, which must see committed data
+
+    def test_compares_both_handlers(self):
+        User.objects.create_user('bench', password='pw')
+        out = os.path.join(tempfile.mkdtemp(), 'concurrency.json')
+        call_command('benchmark_concurrency', username='bench', view='current_fatigue',
+                     requests=4, concurrency=1, threads=1, output=out, stdout=StringIO())
+        with open(out) as fh:
+            modes = json.load(fh)['modes']
+        self.assertEqual(set(modes), {'wsgi', 'asgi'})
+        for r in modes.values():
+            self.assertEqual(r['statuses'], {'200': 4})
+
+
+class BurnoutBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.kolkata = User.objects.create_user('kolkata', password='pw')
+        UserSettings.objects.create(user=self.kolkata, timezone='Asia/Kolkata', work_hours_per_day=6)
+        self.plain = User.objects.create_user('plain', password='pw')
+        self.idle = User.objects.create_user('idle', password='pw')
+        self.tz = zoneinfo.ZoneInfo('Asia/Kolkata')
+        self.today = timezone.localdate(timezone.now(), self.tz)
+        for user in (self.kolkata, self.plain):
+            for back, (total, minutes) in enumerate([(40.0, 300), (90.0, 420), (20.0, 60)]):
+                DailyRollup.objects.create(user=user, day=self.today - timedelta(days=back),
+                                           fatigue_sum=total, fatigue_count=100, work_minutes=minutes)
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'burnout.json')
+
+    def _run(self, **kwargs):
+        call_command('compute_burnout', workers=1, checkpoint=self.checkpoint, stdout=StringIO(), **kwargs)
+
+    def test_session_report_keys_burnout_by_the_assessed_day(self):
+        # A backfilled row is stamped when it was computed, not on the day it assesses
+        yesterday = self.today - timedelta(days=1)
+        BurnoutRisk.objects.create(user=self.kolkata, day=yesterday, weekly_avg_fatigue=0.9,
+                                   burnout_score=0.9, risk_level='High')
+        start = datetime(yesterday.year, yesterday.month, yesterday.day, 10, tzinfo=self.tz)
+        session = SessionLog.objects.create(user=self.kolkata, session_start=start,
+                                            session_end=start + timedelta(hours=1))
+        rows = list(reports.session_summaries(self.kolkata, [session], self.tz, since=start))
+        self.assertEqual(rows[0][2], 'High')
+
+    def test_scores_every_active_user_day_like_the_dashboard(self):
+        self._run(start=(self.today - timedelta(days=2)).isoformat(), end=self.today.isoformat())
+        self.assertEqual(BurnoutRisk.objects.filter(user=self.kolkata).count(), 3)
+        self.assertEqual(BurnoutRisk.objects.filter(user=self.plain).count(), 3)
+        self.assertFalse(BurnoutRisk.objects.filter(user=self.idle).exists())
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+        yesterday = BurnoutRisk.objects.get(user=self.kolkata, day=self.today - timedelta(days=1))
+        self.assertEqual(timezone.localdate(yesterday.calculated_at, self.tz), yesterday.day)
+        self.assertEqual((yesterday.risk_level, round(yesterday.burnout_score, 4)),
+                         ('High', round(0.9 * 0.6 + (420 / 60 / 6) * 0.4, 4)))
+
+        # The dashboard computes the same score for today and updates that row in place
+        with timezone.override(self.tz):
+            risk, score = calculate_burnout(self.kolkata)
+        row = BurnoutRisk.objects.get(user=self.kolkata, day=self.today)
+        self.assertEqual((row.risk_level, row.burnout_score), (risk, score))
+        self.assertEqual(BurnoutRisk.objects.filter(user=self.kolkata).count(), 3)
+
+        # Re-running upserts instead of duplicating
+        self._run(start=(self.today - timedelta(days=2)).isoformat(), end=self.today.isoformat())
+        self.assertEqual(BurnoutRisk.objects.count(), 6)
+
+    def test_resumes_after_an_interrupted_run(self):
+        real = burnout.compute_shard
+        calls = []
+
+        def flaky(user_ids, *args):
+            calls.append(list(user_ids))
+            if len(calls) == 2:
+                raise RuntimeError("worker died")
+            return real(user_ids, *args)
+
+        day = (self.today - timedelta(days=1)).isoformat()
+        with mock.patch.object(burnout, 'compute_shard', flaky), self.assertRaises(RuntimeError):
+            self._run(date=day, shard_size=1)
+        with open(self.checkpoint) as fh:
+            self.assertEqual(json.load(fh)['done'], [[self.kolkata.pk, self.kolkata.pk]])
+
+        calls.clear()
+        with mock.patch.object(burnout, 'compute_shard', flaky):
+            call_command('compute_burnout', date=day, shard_size=5, workers=1,
+                         checkpoint=self.checkpoint, stdout=StringIO())
+        self.assertEqual(calls, [[self.plain.pk, self.idle.pk]])
+        self.assertEqual(BurnoutRisk.objects.filter(day=day).count(), 2)
+
+
+class PopulationSketchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        pending = mock.patch.object(sketches, '_pending', defaultdict(sketches.TDigest))
+        pending.start()
+        self.addCleanup(pending.stop)
+
+    def test_merged_daily_digests_match_exact_quantiles(self):
+        values = np.random.default_rng(3).beta(2, 5, 100_000)
+        merged = sketches.TDigest()
+        for day in np.array_split(values, 7):
+            merged.merge(sketches.TDigest.from_bytes(sketches.TDigest().update(day).to_bytes()))
+        self.assertLessEqual(len(merged.means), sketches.COMPRESSION)
+        for q in (0.01, 0.25, 0.5, 0.9, 0.99):
+            self.assertAlmostEqual(merged.quantile(q), np.quantile(values, q), delta=0.005)
+            self.assertAlmostEqual(merged.cdf(np.quantile(values, q)), q, delta=0.005)
+
+    def test_ingested_samples_rank_users_on_analytics(self):
+        now = timezone.now()
+        users = [User.objects.create_user(f'pop{i}', password='pw') for i in range(3)]
+        for i, user in enumerate(users):
+            self.client.force_login(user)
+            batch = [{'blink_rate': 5 + i * 10, 'eye_closure_duration': 0.5 + i, 'head_tilt_angle': 5,
+                      'ts': (now - timedelta(seconds=s)).timestamp() * 1000} for s in range(20)]
+            self.client.post(reverse('save_fatigue'), json.dumps(batch), content_type='application/json')
+        sketches.flush()
+
+        today = now.astimezone(dt_timezone.utc).date()
+        row = PopulationSketch.objects.get(day=today, metric='fatigue_probability')
+        self.assertEqual(row.count, 60)
+
+        # The nightly rebuild from the logs agrees with what ingestion recorded
+        sketches.rebuild(today)
+        self.assertEqual(PopulationSketch.objects.get(day=today, metric='fatigue_probability').count, 60)
+        self.assertFalse(PopulationSketch.objects.filter(metric='work_hours').exists())
+
+        response = self.client.get(reverse('analytics'))
+        benchmarks = response.context['benchmarks']
+        self.assertEqual(benchmarks['periods'][0]['days'], 7)
+        # The signed-in (last) user's average ranked against every stored reading
+        probs = np.array(FatigueLog.objects.values_list('fatigue_probability', flat=True))
+        mine = FatigueLog.objects.filter(user=users[-1]).aggregate(a=Avg('fatigue_probability'))['a']
+        self.assertAlmostEqual(int(benchmarks['periods'][0]['fatigue'][:-2]), 100 * (probs <= mine).mean(), delta=5)
+        self.assertEqual(benchmarks['blink'][1], 15.0)
+        self.assertContains(response, 'Compared With Everyone')
+
+
+class SampleBlockTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for target, name, value in ((blocks, 'ENABLED', True),
+                                    (sketches, '_pending', defaultdict(sketches.TDigest))):
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user('packer', password='pw')
+        SessionLog.objects.create(user=self.user)
+
+    def _post(self, seconds, minute):
+        batch = [{'blink_rate': 10 + s % 7, 'eye_closure_duration': 1.2, 'head_tilt_angle': 5,
+                  'ts': (minute + timedelta(seconds=s)).timestamp() * 1000} for s in seconds]
+        response = self.client.post(reverse('save_fatigue'), json.dumps(batch), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_ingest_appends_to_minute_blocks(self):
+        self.client.force_login(self.user)
+        minute = timezone.now().replace(second=0, microsecond=0) - timedelta(minutes=2)
+        self._post([0, 10, 20, 30], minute)
+        self._post([40, 50, 65, 15], minute)   # a late sample and one in the next minute
+
+        self.assertFalse(FatigueLog.objects.exists())
+        self.assertEqual(list(SampleBlock.objects.order_by('minute').values_list('count', flat=True)), [7, 1])
+        ts, values = blocks.read(self.user)
+        expected = [(minute + timedelta(seconds=s)).timestamp() for s in (0, 10, 15, 20, 30, 40, 50, 65)]
+        np.testing.assert_allclose(ts, expected, rtol=0, atol=1e-3)
+        np.testing.assert_allclose(values[:, 0], [10 + s % 7 for s in (0, 10, 15, 20, 30, 40, 50, 65)])
+
+        data = self.client.get(reverse('current_fatigue')).json()
+        self.assertEqual(data['fatigue'], round(float(values[-1, blocks.FATIGUE]), 2))
+
+        # Rollups rebuilt from the blocks match the ones maintained on ingest
+        def totals():   # the samples may straddle midnight
+            return DailyRollup.objects.filter(user=self.user).aggregate(s=Sum('fatigue_sum'), c=Sum('fatigue_count'))
+        live = totals()
+        rollups.rebuild([self.user])
+        rebuilt = totals()
+        self.assertEqual(rebuilt['c'], live['c'])
+        self.assertAlmostEqual(rebuilt['s'], live['s'])
+        self.assertAlmostEqual(rebuilt['s'], float(values[:, blocks.FATIGUE].sum()), places=5)
+
+    def test_a_minute_spanning_a_model_swap_keeps_both_versions(self):
+        minute = timezone.now().replace(second=0, microsecond=0) - timedelta(minutes=2)
+        logs = [FatigueLog(user=self.user, blink_rate=10, fatigue_probability=p, model_version=version,
+                           timestamp=minute + timedelta(seconds=s))
+                for s, p, version in ((0, 0.1, 'old'), (20, 0.2, 'old'), (10, 0.3, 'new'), (30, 0.4, 'new'))]
+        blocks.append(self.user, logs[:2])
+        blocks.append(self.user, logs[2:])
+
+        self.assertEqual(dict(SampleBlock.objects.values_list('model_version', 'count')), {'old': 2, 'new': 2})
+        ts, values = blocks.read(self.user)
+        np.testing.assert_allclose(ts - minute.timestamp(), [0, 10, 20, 30], atol=1e-3)
+        np.testing.assert_allclose(values[:, blocks.FATIGUE], [0.1, 0.3, 0.2, 0.4], rtol=1e-6)
+        newest_first = np.concatenate([t for t, _ in blocks.iter_chunks(self.user, newest_first=True)])
+        np.testing.assert_allclose(newest_first, ts[::-1])
+
+        # The newest sample may sit in either of the minute's blocks
+        blocks.append(self.user, [FatigueLog(user=self.user, blink_rate=10, fatigue_probability=0.5,
+                                             model_version='old', timestamp=minute + timedelta(seconds=40))])
+        self.assertAlmostEqual(blocks.latest(self.user)[1], 0.5, places=6)
+
+    def test_readers_and_compaction_cover_both_raw_formats(self):
+        start = retention.bucket_floor(timezone.now() - timedelta(days=40), 300)
+        FatigueLog.objects.bulk_create([
+            FatigueLog(user=self.user, blink_rate=10, fatigue_probability=0.1 * i,
+                       timestamp=start + timedelta(minutes=i)) for i in range(3)])
+        epochs = start.timestamp() + 180 + np.arange(18) * 10.0
+        features = np.column_stack([np.full(18, 12.0), np.zeros(18), np.zeros(18), np.linspace(0.2, 0.9, 18)])
+        SampleBlock.objects.bulk_create(blocks.build(self.user, epochs, features))
+        total = 0.3 + features[:, 3].sum()
+
+        stream = list(retention.fatigue_stream(self.user))
+        self.assertEqual(len(stream), 21)
+        self.assertEqual([t for t, _, _ in stream], sorted((t for t, _, _ in stream), reverse=True))
+        self.assertAlmostEqual(sum(p for _, p, _ in stream), total, places=5)
+        rows = archive._month_rows(self.user.pk, start, start + timedelta(hours=1))
+        self.assertEqual(rows['count'].sum(), 21)
+        self.assertTrue((np.diff(rows['ts']) >= 0).all())
+
+        self.assertEqual(retention.compact(users=[self.user]), 21)
+        self.assertFalse(FatigueLog.objects.exists() or SampleBlock.objects.exists())
+        stream = list(retention.fatigue_stream(self.user))
+        self.assertEqual(sum(c for _, _, c in stream), 21)
+        self.assertAlmostEqual(sum(p for _, p, _ in stream), total, places=5)
+
+
+@override_settings(MONITOR_RATE_LIMITS={'save_fatigue': (5, 3)})
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('hammer', password='pw')
+        SessionLog.objects.create(user=self.user)
+
+    def _send(self, client):
+        sample = {'blink_rate': 12, 'eye_closure_duration': 0.4, 'head_tilt_angle': 9}
+        return client.post(reverse('save_fatigue'), json.dumps(sample), content_type='application/json')
+
+    def test_bucket_refills_at_the_configured_rate(self):
+        now = 1_000_000
+        decisions = [ratelimit.admit(self.user.pk, 'save_fatigue', now) for _ in range(4)]
+        self.assertEqual([d.allowed for d in decisions], [True, True, True, False])
+        self.assertEqual(decisions[-1].retry_after_ms, 5000)
+        self.assertTrue(ratelimit.admit(self.user.pk, 'save_fatigue', now + 5000).allowed)
+        self.assertFalse(ratelimit.admit(self.user.pk, 'save_fatigue', now + 5000).allowed)
+        # Long idle: back to a full bucket
+        self.assertAlmostEqual(ratelimit.admit(self.user.pk, 'save_fatigue', now + 60_000).used, 1 / 3)
+
+    def test_a_limited_bucket_outlives_its_original_expiry(self):
+        now, start = 1_000_000, time.time()
+        with mock.patch('time.time', return_value=start):
+            for _ in range(3):
+                ratelimit.admit(self.user.pk, 'save_fatigue', now)
+        # Still hammering when the key would have expired had it not been refreshed
+        for offset in (ratelimit.KEY_TIMEOUT - 1, ratelimit.KEY_TIMEOUT + 1):
+            with mock.patch('time.time', return_value=start + offset):
+                self.assertFalse(ratelimit.admit(self.user.pk, 'save_fatigue', now).allowed, offset)
+
+    def test_clients_are_slowed_before_being_refused(self):
+        self.client.force_login(self.user)
+        responses = [self._send(self.client) for _ in range(4)]
+        self.assertEqual([r.status_code for r in responses], [200, 200, 200, 429])
+        waits = [int(r['X-Next-Send-Ms']) for r in responses]
+        self.assertEqual(waits[0], ratelimit.SEND_INTERVAL_MS)
+        self.assertLess(waits[0], waits[1])
+        self.assertLess(waits[1], waits[2])
+        self.assertLessEqual(waits[2], ratelimit.MAX_SEND_INTERVAL_MS)
+        self.assertEqual(responses[-1].json()['next_send_ms'], waits[-1])
+        self.assertGreaterEqual(int(responses[-1]['Retry-After']), 1)
+        self.assertEqual(FatigueLog.objects.filter(user=self.user).count(), 3)
+
+        # Buckets are per user and per endpoint
+        self.assertEqual(self.client.get(reverse('current_fatigue')).status_code, 200)
+        other = User.objects.create_user('quiet', password='pw')
+        self.client.force_login(other)
+        self.assertEqual(self._send(self.client).status_code, 200)
+
+    def test_server_backlog_stretches_the_interval(self):
+        idle = ratelimit.Admission(True, 0, 0.1)
+        self.assertEqual(ratelimit.next_send_ms(idle), ratelimit.SEND_INTERVAL_MS)
+        with mock.patch.object(ratelimit, '_inflight', ratelimit.BUSY_INFLIGHT // 2):
+            self.assertEqual(ratelimit.next_send_ms(idle),
+                             (ratelimit.SEND_INTERVAL_MS + ratelimit.MAX_SEND_INTERVAL_MS) // 2)
+
+
+class ModelRegistryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _registry(self, **kwargs):
+        registry = ModelRegistry(model_dir=self.tmp.name, legacy_path=LEGACY_PATH,
+                                 pinned=kwargs.pop('pinned', None), poll_seconds=kwargs.pop('poll_seconds', None))
+        self.addCleanup(registry.stop)
+        return registry
+
+    def _artifact(self, bias, seconds):
+        model = LogisticRegression()
+        model.coef_, model.intercept_ = np.zeros((1, 4)), np.array([bias])
+        model.classes_, model.n_features_in_ = np.array([0, 1]), 4
+        now = datetime(2026, 1, 1, tzinfo=dt_timezone.utc) + timedelta(seconds=seconds)
+        path = training.save_artifact(model, {}, self.tmp.name, now=now)
+        return os.path.basename(path)[len('fatigue-'):-len('.pkl')]
+
+    def test_commands_start_without_loading_the_model(self):
+        code = ("import sys, django; django.setup(); import monitor.urls, monitor.views; "
+                "print('sklearn' in sys.modules)")
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                             env=dict(os.environ, DJANGO_SETTINGS_MODULE='cognitive_load.settings'))
+        self.assertEqual(out.stdout.strip(), 'False')
+
+    def test_newer_artifacts_are_swapped_in_and_bad_ones_skipped(self):
+        registry = self._registry()
+        self.assertTrue(registry.get().version.startswith('legacy-'))
+        self.assertFalse(registry.refresh())
+
+        v1 = self._artifact(bias=0.0, seconds=1)
+        self.assertTrue(registry.refresh())
+        self.assertEqual(registry.get().version, v1)
+        self.assertAlmostEqual(registry.get().scorer.predict_one(1, 2, 3, 4), 0.5)
+
+        with open(os.path.join(self.tmp.name, 'fatigue-29990101T000000000000Z.pkl'), 'wb') as fh:
+            fh.write(b'not a pickle')
+        with open(os.path.join(self.tmp.name, 'fatigue-29990101T000000000000Z.json'), 'w') as fh:
+            fh.write('{}')
+        with self.assertLogs('monitor.registry', 'ERROR'):
+            self.assertFalse(registry.refresh())
+        self.assertEqual(registry.get().version, v1)
+
+        self.assertEqual(self._registry(pinned=v1).get().version, v1)
+
+    @skipUnless(hasattr(os, 'fork'), "needs os.fork")
+    def test_forked_workers_start_their_own_watcher(self):
+        registry = self._registry(poll_seconds=60)
+        registry.get()   # loaded before the fork, as with a preloading server
+        pid = os.fork()
+        if pid == 0:
+            try:
+                orphaned = registry._watcher is not None
+                registry.get()
+                os._exit(0 if not orphaned and registry._watcher.is_alive() else 1)
+            finally:
+                os._exit(2)
+        self.assertEqual(os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]), 0)
+        self.assertTrue(registry._watcher.is_alive())
+
+    def test_watcher_hot_swaps_and_samples_record_the_version(self):
+        registry = self._registry(poll_seconds=0.02)
+        first = registry.get().version
+        self.client.force_login(User.objects.create_user('scored', password='pw'))
+        sample = {'blink_rate': 12, 'eye_closure_duration': 0.4, 'head_tilt_angle': 9}
+        with mock.patch.object(views, 'registry', registry):
+            self.client.post(reverse('save_fatigue'), json.dumps(sample), content_type='application/json')
+            version = self._artifact(bias=10.0, seconds=2)
+            deadline = time.monotonic() + 5
+            while registry.get().version != version and time.monotonic() < deadline:
+                time.sleep(0.01)
+            data = self.client.post(reverse('save_fatigue'), json.dumps(sample),
+                                    content_type='application/json').json()
+        self.assertGreater(data['fatigue'], 0.99)
+        self.assertEqual(list(FatigueLog.objects.order_by('id').values_list('model_version', flat=True)),
+                         [first, version])
 
-# Create your tests here.
@@ -0,0 +1,31 @@
+"""Half-open [start, end) datetime ranges in the active (user's) timezone.
+
+Filtering with `timestamp__date=` / `timestamp__hour=` wraps the column in a
+function call, which keeps SQLite from using the (user, timestamp) indexes.
+Comparing the raw column against aware datetime bounds does not.
+"""
+import zoneinfo
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+
+def get_zone(name):
+    """ZoneInfo for an IANA name, or None if it is unknown."""
+    try:
+        return zoneinfo.ZoneInfo(name)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError, TypeError):
+        return None
+
+
+def day_bounds(day, tz=None):
+    """(start, end) of a calendar day; `end` is midnight of the next day."""
+    tz = tz or timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(day, time.min), tz)
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def days_bounds(first_day, last_day, tz=None):
+    """(start, end) covering first_day through last_day inclusive."""
+    return day_bounds(first_day, tz)[0], day_bounds(last_day, tz)[1]
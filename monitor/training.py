@@ -0,0 +1,186 @@
+"""Training pipeline for the fatigue model.
+
+Training data comes in fixed-size NumPy chunks from two sources:
+
+* synthetic samples drawn with vectorized NumPy calls, labelled by the
+  same heuristic rules the original model was built from;
+* real stored samples (FatigueLog rows and packed minute blocks), read
+  per user in chunks with QuerySet.iterator() and joined to their session
+  to get minutes-into-session. FatigueLog has no ground-truth label
+  column, so real rows are weakly labelled by the same rules. That teaches
+  the model the feature distribution users actually produce, not only the
+  uniform synthetic one.
+
+The estimator is an SGDClassifier with log loss, fed through partial_fit,
+with a StandardScaler fitted in a first streaming pass, so memory stays at
+one chunk however many rows there are. The result is folded back into a
+plain LogisticRegression on raw features, which FatigueScorer evaluates on
+its fast path.
+
+Artifacts are versioned (``fatigue-<UTC timestamp>.pkl`` plus a JSON
+sidecar) and written to a temp file that is fsynced and renamed into place,
+so a reader never sees a partially written pickle; serving processes pick
+new ones up without a restart (see registry.py).
+"""
+import json
+import os
+from datetime import datetime, timezone as dt_timezone
+from itertools import zip_longest
+
+import joblib
+import numpy as np
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.preprocessing import StandardScaler
+
+from .files import atomic_write
+from .inference import N_FEATURES
+from .registry import MODEL_DIR
+
+CHUNK_SIZE = 10000
+
+
+# ─── LABELS AND DATA ──────────────────────────────────────────────────────────
+
+def rule_labels(X):
+    """1 where at least two of the fatigue heuristics fire, else 0."""
+    blink, closure, tilt, session = X.T
+    score = ((blink < 8).astype(np.int8) + (closure > 1.5) + (tilt > 15) + (session > 240))
+    return (score >= 2).astype(np.int8)
+
+
+def synthetic_chunks(n, rng, chunk_size=CHUNK_SIZE):
+    """Yield (X, y) chunks totalling `n` uniformly drawn synthetic samples."""
+    low = np.array([2, 0, 0, 10], dtype=np.float64)
+    high = np.array([25, 3, 30, 480], dtype=np.float64)
+    for start in range(0, n, chunk_size):
+        X = rng.uniform(low, high, size=(min(chunk_size, n - start), N_FEATURES))
+        yield X, rule_labels(X)
+
+
+def _session_minutes(ts, starts, ends):
+    """Minutes since the start of the session containing each timestamp (0 outside sessions)."""
+    idx = np.searchsorted(starts, ts, side='right') - 1
+    inside = (idx >= 0) & (ts <= ends[np.maximum(idx, 0)])
+    return np.where(inside, (ts - starts[np.maximum(idx, 0)]) / 60, 0.0)
+
+
+def fatigue_log_chunks(chunk_size=CHUNK_SIZE, since=None, now=None):
+    """Yield (X, y) chunks built from stored samples, one user at a time."""
+    from . import blocks
+    from .models import FatigueLog, SampleBlock, SessionLog
+
+    now = (now or datetime.now(dt_timezone.utc)).timestamp()
+    logs = FatigueLog.objects.all()
+    packed = SampleBlock.objects.all()
+    if since is not None:
+        logs = logs.filter(timestamp__gte=since)
+        packed = packed.filter(minute__gte=since)
+    user_ids = set(logs.values_list('user_id', flat=True).distinct())
+    user_ids.update(packed.values_list('user_id', flat=True).distinct())
+    for user_id in sorted(user_ids):
+        spans = list(SessionLog.objects.filter(user_id=user_id).order_by('session_start')
+                     .values_list('session_start', 'session_end'))
+        starts = np.array([s.timestamp() for s, _ in spans], dtype=np.float64)
+        ends = np.array([(e.timestamp() if e else now) for _, e in spans], dtype=np.float64)
+
+        rows = (logs.filter(user_id=user_id).order_by('timestamp')
+                .values_list('timestamp', 'blink_rate', 'eye_closure_duration', 'head_tilt_angle')
+                .iterator(chunk_size=chunk_size))
+        buf = []
+        for row in rows:
+            buf.append(row)
+            if len(buf) == chunk_size:
+                yield _to_features(buf, starts, ends)
+                buf = []
+        if buf:
+            yield _to_features(buf, starts, ends)
+
+        for ts, values in blocks.iter_chunks(user_id, since, chunk_blocks=max(chunk_size // 6, 1)):
+            X = np.empty((len(ts), N_FEATURES), dtype=np.float64)
+            X[:, :3] = values[:, :3]
+            X[:, 3] = _session_minutes(ts, starts, ends) if len(starts) else 0.0
+            yield X, rule_labels(X)
+
+
+def _to_features(rows, starts, ends):
+    ts = np.fromiter((r[0].timestamp() for r in rows), dtype=np.float64, count=len(rows))
+    X = np.empty((len(rows), N_FEATURES), dtype=np.float64)
+    X[:, :3] = [r[1:] for r in rows]
+    X[:, 3] = _session_minutes(ts, starts, ends) if len(starts) else 0.0
+    return X, rule_labels(X)
+
+
+def interleave(*sources):
+    for chunks in zip_longest(*sources):
+        for chunk in chunks:
+            if chunk is not None:
+                yield chunk
+
+
+# ─── TRAINING ─────────────────────────────────────────────────────────────────
+
+def train(make_chunks, epochs=5, seed=0):
+    """Fit on the chunks returned by `make_chunks()` (called once per pass).
+
+    Returns (LogisticRegression, stats).
+    """
+    rng = np.random.default_rng(seed)
+    scaler = StandardScaler()
+    rows = positives = 0
+    for X, y in make_chunks():
+        scaler.partial_fit(X)
+        rows += len(y)
+        positives += int(y.sum())
+    if rows == 0:
+        raise ValueError("no training data")
+
+    clf = SGDClassifier(loss='log_loss', alpha=1e-5, average=True, random_state=seed)
+    for _ in range(epochs):
+        for X, y in make_chunks():
+            order = rng.permutation(len(y))   # real rows arrive in time order
+            clf.partial_fit(scaler.transform(X[order]), y[order], classes=[0, 1])
+
+    return to_logistic(clf, scaler), {'rows': rows, 'positives': positives, 'epochs': epochs}
+
+
+def to_logistic(clf, scaler):
+    """Fold the scaler into the SGD weights: same probabilities on raw features."""
+    scale = np.where(scaler.scale_ == 0, 1.0, scaler.scale_)
+    coef = clf.coef_ / scale
+    intercept = clf.intercept_ - (coef * scaler.mean_).sum(axis=1)
+
+    model = LogisticRegression()
+    model.coef_ = coef
+    model.intercept_ = intercept
+    model.classes_ = np.array([0, 1])
+    model.n_features_in_ = N_FEATURES
+    return model
+
+
+def evaluate(model, n=20000, seed=1):
+    """Accuracy against the rule labels on a fresh synthetic sample."""
+    X, y = next(synthetic_chunks(n, np.random.default_rng(seed), chunk_size=n))
+    return float((model.predict(X) == y).mean())
+
+
+# ─── ARTIFACTS ────────────────────────────────────────────────────────────────
+
+def save_artifact(model, metadata, model_dir=None, now=None):
+    """Write a versioned model and its metadata sidecar. Returns the model path."""
+    model_dir = model_dir or MODEL_DIR
+    os.makedirs(model_dir, exist_ok=True)
+    version = (now or datetime.now(dt_timezone.utc)).strftime('%Y%m%dT%H%M%S%fZ')
+    path = os.path.join(model_dir, f'fatigue-{version}.pkl')
+    metadata = dict(metadata, version=version)
+
+    # Sidecar first: anything that discovers the .pkl can rely on it existing
+    atomic_write(path[:-4] + '.json', lambda fh: fh.write(json.dumps(metadata, indent=2).encode()))
+    atomic_write(path, lambda fh: joblib.dump(model, fh))
+    return path
+
+
+def install(path, target):
+    """Atomically replace `target` with a copy of the artifact at `path`."""
+    with open(path, 'rb') as src:
+        data = src.read()
+    atomic_write(target, lambda fh: fh.write(data))
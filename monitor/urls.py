@@ -5,6 +5,7 @@ urlpatterns = [
     path('',                    views.dashboard,            name='dashboard'),
     path('save-fatigue/',       views.save_fatigue,         name='save_fatigue'),
     path('current-fatigue/',    views.current_fatigue,      name='current_fatigue'),
+    path('events/',             views.event_stream,         name='event_stream'),
     path('register/',           views.register,             name='register'),
 
     # Analytics
@@ -17,10 +18,15 @@ urlpatterns = [
 
     # Alerts
     path('alerts/',             views.alerts,               name='alerts'),
+    path('alerts/feed/',        views.alerts_feed,          name='alerts_feed'),
+    path('alerts/unread-count/', views.unread_alert_count,  name='unread_alert_count'),
     path('alerts/acknowledge/<int:alert_id>/', views.acknowledge_alert, name='acknowledge_alert'),
     path('alerts/acknowledge-all/',            views.acknowledge_all_alerts, name='acknowledge_all'),
     path('alerts/break/',       views.create_break_alert,   name='create_break_alert'),
 
     # Settings
     path('settings/',           views.settings_view,        name='settings'),
+
+    # Operations
+    path('metrics/',            views.metrics_view,         name='metrics'),
 ]
@@ -1,54 +1,66 @@
-import csv, json, os
-from datetime import date, datetime, timedelta
+import asyncio, csv, hashlib, hmac, json, math, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import wraps
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm, PasswordChangeForm
 from django.contrib.auth import update_session_auth_hash
-from django.db.models import Avg, Sum, Count, Max
-from django.http import JsonResponse, HttpResponse
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.core.handlers.asgi import ASGIRequest
 from django.utils import timezone
-
-import joblib
-
-from .models import FatigueLog, SessionLog, BurnoutRisk, AlertLog, UserSettings
-
-MODEL_PATH = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-    "fatigue_model.pkl"
-)
-ml_model = joblib.load(MODEL_PATH)
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import archive, blocks, burnout, metrics, rollups, series, sessions, sketches, writebehind
+from .caching import (claim_alert_slot, get_active_session, get_burnout_state, get_data_version,
+                      get_user_settings, invalidate_active_session, invalidate_user_settings,
+                      set_active_session, set_burnout_state)
+from .events import format_sse, hub
+from .middleware import remember_user_timezone
+from .models import FatigueLog, SessionLog, BurnoutRisk, AlertLog
+from .ratelimit import MAX_SEND_INTERVAL_MS, rate_limited
+from .registry import registry
+from .reports import CHUNK_SIZE as REPORT_CHUNK_SIZE, session_summaries
+from .timeranges import day_bounds, get_zone
+
+# Scoring is CPU-bound NumPy/sklearn work: under ASGI it runs on this pool
+# rather than on the event loop or the request's ORM thread
+INFERENCE_WORKERS = getattr(settings, 'MONITOR_INFERENCE_WORKERS', 4)
+inference_pool = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix='fatigue-inference')
 
 
 # ─── HELPERS ──────────────────────────────────────────────────────────────────
 
-def get_user_settings(user):
-    settings, _ = UserSettings.objects.get_or_create(user=user)
-    return settings
-
-
 def calculate_burnout(user):
-    today = date.today()
-    total_minutes = SessionLog.objects.filter(
-        user=user, session_start__date=today
-    ).aggregate(total=Sum('total_duration_minutes'))['total'] or 0
-    work_hours = total_minutes / 60
-
-    avg_fatigue = FatigueLog.objects.filter(
-        user=user, timestamp__date=today
-    ).aggregate(avg=Avg('fatigue_probability'))['avg'] or 0
+    """Today's burnout risk from the running daily rollup (a single-row read)."""
+    today = timezone.localdate()
+    rollup = rollups.daily_rollups(user, [today]).get(today)
+    work_minutes = rollup.work_minutes if rollup else 0
+
+    # The open session is only credited to the rollup when it closes; count
+    # its time so far, up to the last heartbeat. A session reaped elsewhere
+    # is already in the rollup.
+    active = get_active_session(user)
+    last_seen = active and sessions.last_seen(active)
+    if last_seen:
+        work_minutes += burnout.open_session_minutes(active[1], last_seen, day_bounds(today)[0])
+    elif active:
+        invalidate_active_session(user)
+    avg_fatigue = (rollup.avg_fatigue if rollup else None) or 0
 
     s = get_user_settings(user)
-    burnout_score = (avg_fatigue * 0.6) + ((work_hours / s.work_hours_per_day) * 0.4)
-
-    risk = "Low" if burnout_score < 0.4 else "Medium" if burnout_score < 0.7 else "High"
+    burnout_score, risk = burnout.score(avg_fatigue, work_minutes, s.work_hours_per_day)
 
-    BurnoutRisk.objects.update_or_create(
-        user=user, calculated_at__date=today,
-        defaults={"weekly_avg_fatigue": avg_fatigue, "burnout_score": burnout_score, "risk_level": risk}
-    )
+    _record_burnout(user, today, avg_fatigue, burnout_score, risk)
 
     if risk == "High":
         _maybe_create_alert(user, 'burnout_high', f"Burnout risk is HIGH — score {burnout_score:.2f}", burnout_score)
@@ -56,14 +68,41 @@ def calculate_burnout(user):
     return risk, burnout_score
 
 
+BURNOUT_SCORE_TOLERANCE = 0.02
+
+
+def _record_burnout(user, day, avg_fatigue, score, risk):
+    """Persist the day's BurnoutRisk only if the level changed or the score moved beyond tolerance."""
+    last = get_burnout_state(user, day)
+    if last is None:
+        last = (BurnoutRisk.objects.filter(user=user, day=day)
+                .values_list('id', 'risk_level', 'burnout_score').first())
+    if last and last[1] == risk and abs(last[2] - score) <= BURNOUT_SCORE_TOLERANCE:
+        set_burnout_state(user, day, last)
+        return
+
+    values = {"weekly_avg_fatigue": avg_fatigue, "burnout_score": score, "risk_level": risk}
+    if last:
+        BurnoutRisk.objects.filter(id=last[0]).update(**values)
+        pk = last[0]
+    else:
+        pk = BurnoutRisk.objects.create(user=user, day=day, **values).pk
+    set_burnout_state(user, day, (pk, risk, score))
+
+
 def _maybe_create_alert(user, alert_type, message, value):
-    """Create alert only if no same-type alert in last 30 min."""
-    recent = AlertLog.objects.filter(
-        user=user, alert_type=alert_type,
-        timestamp__gte=timezone.now() - timedelta(minutes=30)
-    ).exists()
-    if not recent:
-        AlertLog.objects.create(user=user, alert_type=alert_type, message=message, value=value)
+    """Create alert only if this alert type is not cooling down (30 min by default)."""
+    now = timezone.now()
+    if claim_alert_slot(user, alert_type, now):
+        alert = AlertLog.objects.create(user=user, alert_type=alert_type, message=message, value=value)
+        if hub.has_subscribers(user.pk):
+            hub.publish(user.pk, 'alert', id=alert.id, type=alert_type, message=message)
+            _publish_unread(user)
+
+
+def _publish_unread(user):
+    if hub.has_subscribers(user.pk):
+        hub.publish(user.pk, 'unread', count=AlertLog.objects.filter(user=user, acknowledged=False).count())
 
 
 # ─── AUTH ─────────────────────────────────────────────────────────────────────
@@ -82,10 +121,12 @@ def custom_logout(request):
     if request.user.is_authenticated:
         active = SessionLog.objects.filter(user=request.user, session_end__isnull=True).first()
         if active:
-            active.session_end = timezone.now()
-            active.total_duration_minutes = round(
-                (active.session_end - active.session_start).total_seconds() / 60, 2)
+            active.session_end = active.last_activity = timezone.now()
+            active.total_duration_minutes = sessions.duration_minutes(active.session_start, active.session_end)
             active.save()
+            rollups.add_work_minutes(request.user, active.session_start, active.total_duration_minutes)
+        set_active_session(request.user, None)
+        invalidate_user_settings(request.user)
     logout(request)
     return redirect('login')
 
@@ -106,9 +147,8 @@ def register(request):
 
 @login_required
 def dashboard(request):
-    active = SessionLog.objects.filter(user=request.user, session_end__isnull=True).first()
-    if not active:
-        SessionLog.objects.create(user=request.user)
+    if not get_active_session(request.user):
+        set_active_session(request.user, SessionLog.objects.create(user=request.user))
 
     risk, score = calculate_burnout(request.user)
     s = get_user_settings(request.user)
@@ -122,8 +162,121 @@ def dashboard(request):
     })
 
 
+MAX_BATCH_SAMPLES = 500
+# The dashboard buffers at most MAX_BATCH_SAMPLES samples, one per send
+# interval, so an older `ts` cannot be a genuine backlog
+MAX_SAMPLE_AGE = timedelta(milliseconds=MAX_BATCH_SAMPLES * MAX_SEND_INTERVAL_MS)
+
+
+def _parse_sample(data, now):
+    """Coerce one posted sample; client `ts` is epoch ms, clamped to now and at most MAX_SAMPLE_AGE old."""
+    blink   = float(data.get("blink_rate", 0))
+    closure = float(data.get("eye_closure_duration", 0))
+    tilt    = float(data.get("head_tilt_angle", 0))
+    if not all(map(math.isfinite, (blink, closure, tilt))):
+        raise ValueError("readings must be finite")
+    ts = now
+    if data.get("ts") is not None:
+        ts = min(datetime.fromtimestamp(float(data["ts"]) / 1000, tz=dt_timezone.utc), now)
+        if ts < now - MAX_SAMPLE_AGE:
+            raise ValueError("sample is older than MAX_SAMPLE_AGE")
+    return blink, closure, tilt, ts
+
+
+def _feature_rows(samples, active):
+    rows = []
+    for blink, closure, tilt, ts in samples:
+        session_minutes = 0
+        if active:
+            session_minutes = max((ts - active[1]).total_seconds() / 60, 0)
+        rows.append([blink, closure, tilt, session_minutes])
+    return rows
+
+
+def _score(rows):
+    """(fatigue probabilities, model version) for 4-feature rows; runs on the inference pool."""
+    started = time.perf_counter()
+    version = ''
+    try:
+        model = registry.get()   # one model for the whole batch, even across a hot swap
+        version = model.version
+        if len(rows) == 1:
+            probs = [model.scorer.predict_one(*rows[0])]
+        else:
+            probs = model.scorer.predict_batch(rows)
+    except Exception:
+        probs = [0.0] * len(rows)
+    metrics.inference_latency.observe(time.perf_counter() - started)
+    metrics.inference_samples.inc(len(rows))
+    return probs, version
+
+
+def _after_samples(user, samples, probs, active):
+    """Heartbeat, live update and threshold alerts for a stored batch."""
+    if active:
+        sessions.heartbeat(user, active, max(ts for _, _, _, ts in samples))
+
+    hub.publish(user.pk, 'fatigue', fatigue=round(probs[-1], 3))
+    sketches.observe(samples, probs)
+
+    s = get_user_settings(user)
+    peak_fatigue = max(probs)
+    peak_tilt = max(tilt for _, _, tilt, _ in samples)
+
+    # Auto-create alerts based on user thresholds
+    if s.enable_fatigue_alerts:
+        if peak_fatigue >= s.fatigue_alert_threshold:
+            level = 'fatigue_high' if peak_fatigue >= 0.75 else 'fatigue_med'
+            _maybe_create_alert(user, level,
+                f"Fatigue probability at {peak_fatigue:.0%} — consider taking a break.", peak_fatigue)
+
+    if s.enable_posture_alerts and peak_tilt > s.posture_tilt_threshold:
+        _maybe_create_alert(user, 'posture',
+            f"Poor posture detected — head tilt at {peak_tilt:.1f}°.", peak_tilt)
+
+
+async def _record_samples(user, samples):
+    """Score, store and alert on a list of (blink, closure, tilt, ts) samples.
+
+    The whole batch is scored in one vectorized call on the inference pool,
+    written with one bulk_create (or appended to the user's minute blocks
+    when MONITOR_SAMPLE_BLOCKS is on) in the same transaction as the rollup
+    bumps, and alert thresholds are checked once against the batch peak.
+    """
+    active = await sync_to_async(get_active_session)(user)
+    rows = _feature_rows(samples, active)
+    probs, version = await asyncio.get_running_loop().run_in_executor(inference_pool, _score, rows)
+
+    logs = [
+        FatigueLog(user=user, blink_rate=blink,
+                   eye_closure_duration=closure, head_tilt_angle=tilt,
+                   fatigue_probability=prob, timestamp=ts, model_version=version)
+        for (blink, closure, tilt, ts), prob in zip(samples, probs)
+    ]
+    if writebehind.ENABLED:
+        # Group-committed by the background writer; raises QueueFull when saturated
+        await sync_to_async(writebehind.write_behind.submit, thread_sensitive=False)(user, logs)
+    else:
+        await sync_to_async(_store_samples)(user, logs)
+
+    await sync_to_async(_after_samples)(user, samples, probs, active)
+    return probs
+
+
+def _store_samples(user, logs):
+    # One transaction, so the rollups never disagree with the raw samples
+    with transaction.atomic():
+        if blocks.ENABLED:
+            blocks.append(user, logs)
+        else:
+            FatigueLog.objects.bulk_create(logs)
+        rollups.add_fatigue_samples(user, [(log.timestamp, log.fatigue_probability) for log in logs])
+
+
 @login_required
-def save_fatigue(request):
+@rate_limited('save_fatigue')
+async def save_fatigue(request):
+    """Accepts one sample object, or a JSON array of buffered samples (batch mode)."""
     if request.method != "POST":
         return JsonResponse({"status": "method not allowed"}, status=405)
     try:
@@ -131,46 +284,120 @@ def save_fatigue(request):
     except json.JSONDecodeError:
         return JsonResponse({"status": "bad json"}, status=400)
 
-    blink   = float(data.get("blink_rate", 0))
-    closure = float(data.get("eye_closure_duration", 0))
-    tilt    = float(data.get("head_tilt_angle", 0))
+    batch = isinstance(data, list)
+    items = data if batch else [data]
+    if not items:
+        return JsonResponse({"status": "empty batch"}, status=400)
+    if len(items) > MAX_BATCH_SAMPLES:
+        return JsonResponse({"status": "batch too large", "max": MAX_BATCH_SAMPLES}, status=413)
 
-    active = SessionLog.objects.filter(user=request.user, session_end__isnull=True).first()
-    session_minutes = 0
-    if active:
-        session_minutes = (timezone.now() - active.session_start).total_seconds() / 60
+    now = timezone.now()
+    try:
+        samples = sorted((_parse_sample(d, now) for d in items), key=lambda smp: smp[3])
+    except (AttributeError, TypeError, ValueError, OverflowError, OSError):
+        return JsonResponse({"status": "bad sample"}, status=400)
 
     try:
-        fatigue_prob = float(ml_model.predict_proba([[blink, closure, tilt, session_minutes]])[0][1])
-    except Exception:
-        fatigue_prob = 0.0
+        probs = await _record_samples(await request.auser(), samples)
+    except writebehind.QueueFull:
+        response = JsonResponse({"status": "busy"}, status=503)
+        response['Retry-After'] = '5'
+        return response
 
-    FatigueLog.objects.create(
-        user=request.user, blink_rate=blink,
-        eye_closure_duration=closure, head_tilt_angle=tilt,
-        fatigue_probability=fatigue_prob
-    )
+    if batch:
+        return JsonResponse({"status": "saved", "count": len(probs), "fatigue": round(probs[-1], 3)})
+    return JsonResponse({"status": "saved", "fatigue": round(probs[0], 3)})
 
-    s = get_user_settings(request.user)
 
-    # Auto-create alerts based on user thresholds
-    if s.enable_fatigue_alerts:
-        if fatigue_prob >= s.fatigue_alert_threshold:
-            level = 'fatigue_high' if fatigue_prob >= 0.75 else 'fatigue_med'
-            _maybe_create_alert(request.user, level,
-                f"Fatigue probability at {fatigue_prob:.0%} — consider taking a break.", fatigue_prob)
+# ─── CONDITIONAL GET ──────────────────────────────────────────────────────────
+# Validators come from the cached per-user data version (see caching.py),
+# so an unchanged poll is answered 304 without touching the database.
+# @condition calls them synchronously, so the version (a network round trip
+# with a Redis or memcached validator cache) is fetched off the loop first.
+
+def _with_data_version(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request.data_version = await sync_to_async(get_data_version)(await request.auser())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def _data_last_modified(request, *args, **kwargs):
+    return request.data_version[1]
+
 
-    if s.enable_posture_alerts and tilt > s.posture_tilt_threshold:
-        _maybe_create_alert(request.user, 'posture',
-            f"Poor posture detected — head tilt at {tilt:.1f}°.", tilt)
+def _current_fatigue_etag(request, *args, **kwargs):
+    return f'"cf-{request.data_version[0]}"'
 
-    return JsonResponse({"status": "saved", "fatigue": round(fatigue_prob, 3)})
+
+def _analytics_last_modified(request, *args, **kwargs):
+    # Day-relative periods roll over at local midnight even without new data
+    midnight = day_bounds(timezone.localdate())[0]
+    return max(request.data_version[1], midnight)
+
+
+def _analytics_etag(request, *args, **kwargs):
+    # The response also depends on the query, the local date and the zone
+    key = '|'.join((request.GET.urlencode(), timezone.localdate().isoformat(),
+                    str(timezone.get_current_timezone())))
+    digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+    return f'"ad-{request.data_version[0]}-{digest}"'
 
 
 @login_required
-def current_fatigue(request):
-    latest = FatigueLog.objects.filter(user=request.user).order_by('-timestamp').first()
-    return JsonResponse({"fatigue": round(latest.fatigue_probability, 2) if latest else 0})
+@rate_limited('current_fatigue')
+@cache_control(private=True, no_cache=True)   # polled: always revalidate
+@_with_data_version
+@condition(etag_func=_current_fatigue_etag, last_modified_func=_data_last_modified)
+async def current_fatigue(request):
+    latest = await blocks.alatest(await request.auser())
+    return JsonResponse({"fatigue": round(latest[1], 2) if latest is not None else 0})
+
+
+# ─── LIVE EVENTS (SSE) ────────────────────────────────────────────────────────
+
+SSE_KEEPALIVE_SECONDS = 15
+
+
+def _live_snapshot(user):
+    latest = blocks.latest(user)
+    unread = AlertLog.objects.filter(user=user, acknowledged=False).count()
+    return round(latest[1] if latest is not None else 0, 3), unread
+
+
+async def event_stream(request):
+    """Server-Sent Events: latest fatigue score, new alerts and the unread count.
+
+    Needs an ASGI server (cognitive_load/asgi.py). Under WSGI it answers 204 so
+    EventSource gives up and the pages fall back to polling.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    async def stream():
+        sub = hub.subscribe(user.pk)
+        try:
+            fatigue, unread = await sync_to_async(_live_snapshot)(user)
+            yield format_sse('fatigue', {"fatigue": fatigue})
+            yield format_sse('unread', {"count": unread})
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(sub.queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event, data)
+        finally:
+            hub.unsubscribe(sub)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 # ─── ANALYTICS PAGE ───────────────────────────────────────────────────────────
@@ -178,20 +405,20 @@ def current_fatigue(request):
 @login_required
 def analytics(request):
     user = request.user
-    today = date.today()
+    today = timezone.localdate()
 
     # Summary stats
     total_sessions = SessionLog.objects.filter(user=user).count()
-    total_hours = (SessionLog.objects.filter(user=user)
-                   .aggregate(t=Sum('total_duration_minutes'))['t'] or 0) / 60
-    avg_fatigue_all = FatigueLog.objects.filter(user=user).aggregate(a=Avg('fatigue_probability'))['a'] or 0
+    fatigue_sum, fatigue_count, total_minutes = rollups.lifetime_totals(user)
+    total_hours = total_minutes / 60
+    avg_fatigue_all = fatigue_sum / fatigue_count if fatigue_count else 0
     high_risk_days = BurnoutRisk.objects.filter(user=user, risk_level='High').count()
 
-    # Today stats
-    today_minutes = (SessionLog.objects.filter(user=user, session_start__date=today)
-                     .aggregate(t=Sum('total_duration_minutes'))['t'] or 0)
-    today_fatigue = (FatigueLog.objects.filter(user=user, timestamp__date=today)
-                     .aggregate(a=Avg('fatigue_probability'))['a'] or 0)
+    # Today stats, from the recent days the population benchmarks also use
+    recent = rollups.daily_rollups(user, [today - timedelta(days=i) for i in range(BENCHMARK_PERIODS[-1])])
+    today_rollup = recent.get(today)
+    today_minutes = today_rollup.work_minutes if today_rollup else 0
+    today_fatigue = (today_rollup.avg_fatigue if today_rollup else None) or 0
 
     return render(request, "analytics.html", {
         "total_sessions": total_sessions,
@@ -200,40 +427,124 @@ def analytics(request):
         "high_risk_days": high_risk_days,
         "today_minutes": round(today_minutes, 0),
         "today_fatigue": round(today_fatigue * 100, 1),
+        "benchmarks": _population_benchmarks(recent, today),
     })
 
 
+BENCHMARK_PERIODS = (7, 30)
+
+
+def _ordinal(n):
+    suffix = 'th' if 10 <= n % 100 <= 20 else {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th')
+    return f"{n}{suffix}"
+
+
+def _population_benchmarks(recent, today):
+    """Where the user's recent fatigue and work hours fall among everyone's (see sketches.py).
+
+    `recent` holds the user's rollups for the longest period. Population
+    sketches are per UTC day and merged per period.
+    """
+    last = datetime.now(dt_timezone.utc).date()
+    periods = []
+    for days in BENCHMARK_PERIODS:
+        rows = [r for d, r in recent.items() if (today - d).days < days]
+        count = sum(r.fatigue_count for r in rows)
+        worked = [r.work_minutes / 60 for r in rows if r.work_minutes > 0]
+        first = last - timedelta(days=days - 1)
+        ranks = {
+            "fatigue": sketches.percentile_rank(
+                'fatigue_probability', sum(r.fatigue_sum for r in rows) / count if count else None, first, last),
+            "work": sketches.percentile_rank(
+                'work_hours', sum(worked) / len(worked) if worked else None, first, last),
+        }
+        periods.append({"days": days, **{k: _ordinal(round(v)) if v is not None else None
+                                         for k, v in ranks.items()}})
+
+    blink = sketches.population('blink_rate', last - timedelta(days=BENCHMARK_PERIODS[0] - 1), last)
+    blink_range = None
+    if blink.weights.size:
+        blink_range = [round(blink.quantile(q), 1) for q in (0.1, 0.5, 0.9)]
+    return {"periods": periods, "blink": blink_range}
+
+
+MAX_PERIOD_DAYS = 366
+ARCHIVE_MIN_DAYS = 90   # periods this long are served from the columnar archive
+
+
+def _parse_bound(value, end=False):
+    """Aware datetime for an ISO date or datetime; a bare end date includes that whole day."""
+    day = parse_date(value)
+    if day is not None:
+        dt = datetime.combine(day + timedelta(days=1) if end else day, datetime.min.time())
+    else:
+        dt = parse_datetime(value)
+        if dt is None:
+            raise ValueError(f"invalid date: {value!r}")
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
+
+
 @login_required
-def analytics_data(request):
-    """JSON endpoint — returns data for chart period."""
-    user = request.user
-    period = request.GET.get('period', '7')  # '7', '30'
-    days = int(period)
-    today = datetime.today()
+@rate_limited('analytics_data')
+@cache_control(private=True, max_age=30)      # charts tolerate brief staleness
+@_with_data_version
+@condition(etag_func=_analytics_etag, last_modified_func=_analytics_last_modified)
+async def analytics_data(request):
+    """JSON endpoint — returns data for chart period.
+
+    Either ?period=<days> (1-366, daily points ending today) or
+    ?start=&end= (ISO dates or datetimes) for a bucketed, downsampled
+    series over any range up to series.MAX_RANGE.
+    """
+    user = await request.auser()
+    if 'start' in request.GET:
+        try:
+            start = _parse_bound(request.GET['start'])
+            end = _parse_bound(request.GET['end'], end=True) if request.GET.get('end') else timezone.now()
+            points = int(request.GET.get('points', series.MAX_POINTS))
+        except (ValueError, OverflowError) as exc:   # OverflowError: dates at the ends of the calendar
+            return JsonResponse({"error": str(exc)}, status=400)
+        if not start < end or end - start > series.MAX_RANGE:
+            return JsonResponse({"error": "start must be before end and the range at most "
+                                          f"{series.MAX_RANGE.days} days"}, status=400)
+        return JsonResponse(await sync_to_async(series.fatigue_series)(
+            user, start, end, max(3, min(points, 1000))))
+
+    period = request.GET.get('period', '7')  # '7', '30', '90', '365'
+    try:
+        days = int(period)
+    except ValueError:
+        days = 0
+    if not 1 <= days <= MAX_PERIOD_DAYS:
+        return JsonResponse({"error": f"period must be 1-{MAX_PERIOD_DAYS} days"}, status=400)
+    today = timezone.localdate()
     day_list = [today - timedelta(days=i) for i in range(days - 1, -1, -1)]
+    by_day = await rollups.adaily_rollups(user, day_list)
+
+    hour_of_day = None
+    if days >= ARCHIVE_MIN_DAYS:
+        daily_fatigue, hour_of_day = await sync_to_async(archive.fatigue_profile)(user, day_list[0], today)
+    else:
+        daily_fatigue = [by_day[d].avg_fatigue if d in by_day else None for d in day_list]
 
     fatigue_data, work_data, labels = [], [], []
-    for day in day_list:
-        d = day.date()
-        avg_f = FatigueLog.objects.filter(user=user, timestamp__date=d).aggregate(avg=Avg('fatigue_probability'))['avg'] or 0
-        total_m = SessionLog.objects.filter(user=user, session_start__date=d).aggregate(t=Sum('total_duration_minutes'))['t'] or 0
-        fatigue_data.append(round(avg_f, 3))
+    for d, avg_f in zip(day_list, daily_fatigue):
+        r = by_day.get(d)
+        total_m = r.work_minutes if r else 0
+        fatigue_data.append(round(avg_f or 0, 3))
         work_data.append(round(total_m / 60, 2))
         labels.append(d.strftime("%b %d"))
 
     # Hourly heatmap for today
-    hourly = []
-    for h in range(24):
-        avg = FatigueLog.objects.filter(
-            user=user,
-            timestamp__date=today.date(),
-            timestamp__hour=h
-        ).aggregate(avg=Avg('fatigue_probability'))['avg']
-        hourly.append(round(avg, 3) if avg is not None else None)
-
-    return JsonResponse({
-        "labels": labels, "fatigue": fatigue_data, "work_hours": work_data, "hourly": hourly
-    })
+    hourly = [round(avg, 3) if avg is not None else None
+              for avg in await rollups.ahourly_averages(user, today)]
+
+    data = {"labels": labels, "fatigue": fatigue_data, "work_hours": work_data, "hourly": hourly}
+    if hour_of_day is not None:
+        data["hour_of_day"] = [round(avg, 3) if avg is not None else None for avg in hour_of_day]
+    return JsonResponse(data)
 
 
 # ─── REPORTS PAGE ─────────────────────────────────────────────────────────────
@@ -241,92 +552,147 @@ def analytics_data(request):
 @login_required
 def reports(request):
     user = request.user
-    sessions = SessionLog.objects.filter(user=user).order_by('-session_start')[:50]
+    tz = timezone.get_current_timezone()
+    sessions = list(SessionLog.objects.filter(user=user).order_by('-session_start')[:50])
+    since = sessions[-1].session_start if sessions else None
 
     session_data = []
-    for s in sessions:
-        date_str = s.session_start.strftime("%d %b %Y")
-        start_str = s.session_start.strftime("%I:%M %p")
-        end_str = s.session_end.strftime("%I:%M %p") if s.session_end else "Active"
-        avg_f = FatigueLog.objects.filter(
-            user=user,
-            timestamp__gte=s.session_start,
-            timestamp__lte=s.session_end or timezone.now()
-        ).aggregate(avg=Avg('fatigue_probability'))['avg']
-        risk = BurnoutRisk.objects.filter(user=user, calculated_at__date=s.session_start.date()).first()
+    for s, avg_f, risk in session_summaries(user, sessions, tz, since=since):
+        start = timezone.localtime(s.session_start, tz)
         session_data.append({
             "id": s.id,
-            "date": date_str,
-            "start": start_str,
-            "end": end_str,
+            "date": start.strftime("%d %b %Y"),
+            "start": start.strftime("%I:%M %p"),
+            "end": timezone.localtime(s.session_end, tz).strftime("%I:%M %p") if s.session_end else "Active",
             "duration": round(s.total_duration_minutes, 1),
             "avg_fatigue": round((avg_f or 0) * 100, 1),
-            "risk": risk.risk_level if risk else "—",
+            "risk": risk or "—",
         })
 
     return render(request, "reports.html", {"sessions": session_data})
 
 
-@login_required
-def download_report_csv(request):
-    user = request.user
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="neurowatch_report.csv"'
+class _Echo:
+    """File-like object whose write() just returns the value, for csv.writer."""
+    def write(self, value):
+        return value
+
 
-    writer = csv.writer(response)
-    writer.writerow(['Date', 'Session Start', 'Session End', 'Duration (min)', 'Avg Fatigue %', 'Burnout Risk'])
-
-    sessions = SessionLog.objects.filter(user=user).order_by('-session_start')
-    for s in sessions:
-        avg_f = FatigueLog.objects.filter(
-            user=user, timestamp__gte=s.session_start,
-            timestamp__lte=s.session_end or timezone.now()
-        ).aggregate(avg=Avg('fatigue_probability'))['avg']
-        risk = BurnoutRisk.objects.filter(user=user, calculated_at__date=s.session_start.date()).first()
-        writer.writerow([
-            s.session_start.strftime("%Y-%m-%d"),
-            s.session_start.strftime("%H:%M"),
-            s.session_end.strftime("%H:%M") if s.session_end else "Active",
+def _report_csv_rows(user, tz):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(['Date', 'Session Start', 'Session End', 'Duration (min)', 'Avg Fatigue %', 'Burnout Risk'])
+
+    sessions = (SessionLog.objects.filter(user=user).order_by('-session_start')
+                .iterator(chunk_size=REPORT_CHUNK_SIZE))
+    for s, avg_f, risk in session_summaries(user, sessions, tz):
+        start = timezone.localtime(s.session_start, tz)
+        yield writer.writerow([
+            start.strftime("%Y-%m-%d"),
+            start.strftime("%H:%M"),
+            timezone.localtime(s.session_end, tz).strftime("%H:%M") if s.session_end else "Active",
             round(s.total_duration_minutes, 1),
             round((avg_f or 0) * 100, 1),
-            risk.risk_level if risk else "N/A",
+            risk or "N/A",
         ])
 
+
+@login_required
+def download_report_csv(request):
+    response = StreamingHttpResponse(
+        _report_csv_rows(request.user, timezone.get_current_timezone()), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="neurowatch_report.csv"'
     return response
 
 
 # ─── ALERTS PAGE ──────────────────────────────────────────────────────────────
 
-@login_required
-def alerts(request):
-    user = request.user
-    all_alerts = AlertLog.objects.filter(user=user)
-
-    # Counts by type
-    counts = {
-        'total': all_alerts.count(),
-        'unread': all_alerts.filter(acknowledged=False).count(),
-        'fatigue': all_alerts.filter(alert_type__in=['fatigue_high', 'fatigue_med']).count(),
-        'posture': all_alerts.filter(alert_type='posture').count(),
-        'break':   all_alerts.filter(alert_type='break').count(),
-        'burnout': all_alerts.filter(alert_type='burnout_high').count(),
+ALERT_PAGE_SIZE = 50
+MAX_ALERT_PAGE_SIZE = 200
+
+
+def _alert_counts(user):
+    return AlertLog.objects.filter(user=user).aggregate(
+        total=Count('id'),
+        unread=Count('id', filter=Q(acknowledged=False)),
+        fatigue=Count('id', filter=Q(alert_type__in=['fatigue_high', 'fatigue_med'])),
+        posture=Count('id', filter=Q(alert_type='posture')),
+        **{'break': Count('id', filter=Q(alert_type='break'))},
+        burnout=Count('id', filter=Q(alert_type='burnout_high')),
+    )
+
+
+def _alert_cursor(alert):
+    ts = alert.timestamp
+    return f"{int(ts.timestamp()) * 1_000_000 + ts.microsecond}.{alert.id}"
+
+
+def _alert_page(user, cursor=None, alert_type=None, limit=ALERT_PAGE_SIZE):
+    """Newest-first page of alerts strictly after `cursor`, plus the cursor for the next page.
+
+    Keyset pagination on (timestamp, id): each page is a seek on the
+    (user, timestamp) index, however deep the user has scrolled.
+    """
+    qs = AlertLog.objects.filter(user=user)
+    if alert_type:
+        qs = qs.filter(alert_type=alert_type)
+    if cursor is not None:
+        micros, alert_id = cursor
+        ts = datetime.fromtimestamp(micros // 1_000_000, tz=dt_timezone.utc).replace(microsecond=micros % 1_000_000)
+        qs = qs.filter(Q(timestamp__lt=ts) | Q(timestamp=ts, id__lt=alert_id))
+    rows = list(qs.order_by('-timestamp', '-id')[:limit + 1])
+    page = rows[:limit]
+    return {
+        "alerts": [{
+            "id": a.id,
+            "type": a.alert_type,
+            "message": a.message,
+            "value": a.value,
+            "acknowledged": a.acknowledged,
+            "timestamp": a.timestamp.isoformat(),
+        } for a in page],
+        "next": _alert_cursor(page[-1]) if len(rows) > limit else None,
     }
 
+
+@login_required
+def alerts(request):
     return render(request, "alerts.html", {
-        "alerts": all_alerts[:100],
-        "counts": counts,
+        "counts": _alert_counts(request.user),
+        "first_page": _alert_page(request.user),
     })
 
 
+@login_required
+def alerts_feed(request):
+    """JSON page of alerts for infinite scroll: ?cursor=<next from previous page>&type=&limit=."""
+    cursor = request.GET.get('cursor')
+    try:
+        if cursor:
+            micros, alert_id = cursor.split('.')
+            cursor = (int(micros), int(alert_id))
+        limit = int(request.GET.get('limit', ALERT_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({"error": "invalid cursor or limit"}, status=400)
+    limit = max(1, min(limit, MAX_ALERT_PAGE_SIZE))
+    return JsonResponse(_alert_page(request.user, cursor or None, request.GET.get('type'), limit))
+
+
+@login_required
+def unread_alert_count(request):
+    return JsonResponse({"count": AlertLog.objects.filter(user=request.user, acknowledged=False).count()})
+
+
 @login_required
 def acknowledge_alert(request, alert_id):
     AlertLog.objects.filter(user=request.user, id=alert_id).update(acknowledged=True)
+    _publish_unread(request.user)
     return JsonResponse({"status": "ok"})
 
 
 @login_required
 def acknowledge_all_alerts(request):
     AlertLog.objects.filter(user=request.user, acknowledged=False).update(acknowledged=True)
+    _publish_unread(request.user)
     return JsonResponse({"status": "ok"})
 
 
@@ -372,7 +738,13 @@ def settings_view(request):
 
         elif action == "profile":
             s.display_name = request.POST.get("display_name", "")
+            tz_name = request.POST.get("timezone", s.timezone).strip()
+            if get_zone(tz_name) is None:
+                messages.error(request, f"Unknown timezone '{tz_name}'.")
+                return redirect('settings')
+            s.timezone = tz_name
             s.save()
+            remember_user_timezone(request, tz_name)
             messages.success(request, "Profile updated.")
 
         elif action == "password":
@@ -384,6 +756,23 @@ def settings_view(request):
             else:
                 messages.error(request, "Password change failed. Check the form.")
 
+        invalidate_user_settings(user)
         return redirect('settings')
 
     return render(request, "settings.html", {"s": s, "pw_form": pw_form})
+
+
+# ─── METRICS ──────────────────────────────────────────────────────────────────
+
+def metrics_view(request):
+    """Prometheus text exposition of this process's request metrics.
+
+    Readable by staff sessions, or by a scraper sending
+    `Authorization: Bearer <MONITOR_METRICS_TOKEN>` when that setting is set.
+    """
+    token = getattr(settings, 'MONITOR_METRICS_TOKEN', None)
+    auth = request.headers.get('Authorization', '')
+    if not (request.user.is_staff or
+            (token and hmac.compare_digest(auth.encode(), f'Bearer {token}'.encode()))):
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,206 @@
+"""Optional write-behind queue for FatigueLog inserts.
+
+With SQLite every autocommit INSERT is its own transaction and fsync, and
+concurrent writers contend for the single write lock. When
+MONITOR_WRITE_BEHIND is on, save_fatigue scores a sample, enqueues the rows
+and returns; a background thread group-commits queued rows (and their
+rollup increments) in one transaction every FLUSH_MS or BATCH_ROWS rows.
+
+The queue is bounded: when it is full, submit() waits up to PUT_TIMEOUT_MS
+and then raises QueueFull so the view can ask the client to back off.
+Pending rows are flushed at interpreter shutdown. With MONITOR_SAMPLE_BLOCKS
+on, a flush appends the rows to their minute blocks instead of inserting them.
+
+Clients have already been told their rows were saved, so a failed commit
+is retried RETRY_ATTEMPTS times with exponential backoff from
+RETRY_BACKOFF_MS (new rows queue up meanwhile) before the batch is
+dropped and counted in `dropped_rows`. Rollups are bucketed in each
+user's own timezone, which the writer thread activates per user since
+the request's timezone does not reach it.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import blocks, rollups
+from .caching import get_user_settings
+from .models import FatigueLog
+from .timeranges import get_zone
+
+logger = logging.getLogger(__name__)
+
+ENABLED          = getattr(settings, 'MONITOR_WRITE_BEHIND', False)
+FLUSH_MS         = getattr(settings, 'MONITOR_WRITE_BEHIND_FLUSH_MS', 200)
+BATCH_ROWS       = getattr(settings, 'MONITOR_WRITE_BEHIND_BATCH_ROWS', 500)
+QUEUE_SIZE       = getattr(settings, 'MONITOR_WRITE_BEHIND_QUEUE_SIZE', 10000)
+PUT_TIMEOUT_MS   = getattr(settings, 'MONITOR_WRITE_BEHIND_PUT_TIMEOUT_MS', 50)
+RETRY_ATTEMPTS   = getattr(settings, 'MONITOR_WRITE_BEHIND_RETRY_ATTEMPTS', 5)
+RETRY_BACKOFF_MS = getattr(settings, 'MONITOR_WRITE_BEHIND_RETRY_BACKOFF_MS', 100)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class WriteBehindQueue:
+    """Bounded queue of (user, [FatigueLog, ...]) items drained by one writer thread."""
+
+    def __init__(self, maxsize=QUEUE_SIZE, flush_ms=FLUSH_MS, batch_rows=BATCH_ROWS,
+                 retry_attempts=RETRY_ATTEMPTS, retry_backoff_ms=RETRY_BACKOFF_MS):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._flush_s = flush_ms / 1000
+        self._batch_rows = batch_rows
+        self._retry_attempts = retry_attempts
+        self._retry_backoff_s = retry_backoff_ms / 1000
+        self._start_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._counter_lock = threading.Lock()
+        self.counters = {
+            'enqueued_rows': 0, 'rejected_rows': 0, 'flushed_rows': 0,
+            'flushes': 0, 'failed_flushes': 0, 'dropped_rows': 0,
+            'last_flush_ms': 0.0, 'max_flush_ms': 0.0, 'total_flush_ms': 0.0,
+        }
+
+    # ── producer side ─────────────────────────────────────────────────────────
+
+    def submit(self, user, rows, timeout=PUT_TIMEOUT_MS / 1000):
+        self._ensure_started()
+        try:
+            self._queue.put((user, rows), timeout=timeout)
+        except queue.Full:
+            self._count('rejected_rows', len(rows))
+            raise QueueFull
+        self._count('enqueued_rows', len(rows))
+
+    def _count(self, name, n):
+        with self._counter_lock:
+            self.counters[name] += n
+
+    def stats(self):
+        with self._counter_lock:
+            stats = dict(self.counters)
+        stats['queue_depth'] = self._queue.qsize()
+        return stats
+
+    # ── writer side ───────────────────────────────────────────────────────────
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='fatigue-write-behind', daemon=True)
+                self._thread.start()
+                atexit.register(self.shutdown)
+
+    def _take_batch(self):
+        """Block for the first item, then gather more until the deadline or row limit."""
+        items, n = [], 0
+        try:
+            first = self._queue.get(timeout=self._flush_s)
+        except queue.Empty:
+            return items
+        items.append(first)
+        n += len(first[1])
+        deadline = time.monotonic() + self._flush_s
+        while n < self._batch_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            items.append(item)
+            n += len(item[1])
+        return items
+
+    def _write(self, items):
+        rows = [row for _, batch in items for row in batch]
+        for attempt in range(self._retry_attempts):
+            if attempt:
+                time.sleep(self._retry_backoff_s * 2 ** (attempt - 1))
+                connection.close_if_unusable_or_obsolete()
+            started = time.perf_counter()
+            try:
+                self._commit(items, rows)
+                break
+            except Exception:
+                self._count('failed_flushes', 1)
+                logger.exception("write-behind flush of %d rows failed (attempt %d of %d)",
+                                 len(rows), attempt + 1, self._retry_attempts)
+        else:
+            self._count('dropped_rows', len(rows))
+            logger.error("write-behind dropped %d rows after %d failed attempts", len(rows), self._retry_attempts)
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        with self._counter_lock:
+            c = self.counters
+            c['flushes'] += 1
+            c['flushed_rows'] += len(rows)
+            c['last_flush_ms'] = elapsed_ms
+            c['total_flush_ms'] += elapsed_ms
+            c['max_flush_ms'] = max(c['max_flush_ms'], elapsed_ms)
+
+    def _commit(self, items, rows):
+        by_user = defaultdict(list)
+        for user, batch in items:
+            by_user[user.pk].append((user, batch))
+
+        with transaction.atomic():
+            if not blocks.ENABLED:
+                for row in rows:
+                    row.pk = None   # a rolled-back attempt may have assigned ids
+                FatigueLog.objects.bulk_create(rows, batch_size=self._batch_rows)
+            for entries in by_user.values():
+                user = entries[0][0]
+                user_rows = [r for _, batch in entries for r in batch]
+                if blocks.ENABLED:
+                    blocks.append(user, user_rows)
+                # The request's timezone is not active on this thread
+                with timezone.override(get_zone(get_user_settings(user).timezone)):
+                    rollups.add_fatigue_samples(user, [(r.timestamp, r.fatigue_probability) for r in user_rows])
+
+    def _run(self):
+        try:
+            while not self._stopping.is_set():
+                items = self._take_batch()
+                if items:
+                    with self._flush_lock:
+                        self._write(items)
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Synchronously write everything currently queued."""
+        with self._flush_lock:
+            items = []
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+                if sum(len(b) for _, b in items) >= self._batch_rows:
+                    self._write(items)
+                    items = []
+            if items:
+                self._write(items)
+
+    def shutdown(self, timeout=5):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+
+write_behind = WriteBehindQueue()
@@ -1,37 +1,19 @@
-import numpy as np
-from sklearn.linear_model import LogisticRegression
-import joblib
+"""Retrain the fatigue model and install it as fatigue_model.pkl.
 
-# Features:
-# blink_rate, eye_closure_duration, head_tilt_angle, session_minutes
+Thin wrapper around `python manage.py train_fatigue_model`; see that
+command for options (real-data streaming, epochs, output directory).
+"""
+import os
+import sys
 
-X = []
-y = []
+import django
+from django.core.management import call_command
 
-# Generate synthetic training data
-for _ in range(1000):
-    blink = np.random.uniform(2, 25)
-    closure = np.random.uniform(0, 3)
-    tilt = np.random.uniform(0, 30)
-    session = np.random.uniform(10, 480)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-    fatigue_score = 0
-
-    if blink < 8:
-        fatigue_score += 1
-    if closure > 1.5:
-        fatigue_score += 1
-    if tilt > 15:
-        fatigue_score += 1
-    if session > 240:
-        fatigue_score += 1
-
-    X.append([blink, closure, tilt, session])
-    y.append(1 if fatigue_score >= 2 else 0)
-
-model = LogisticRegression()
-model.fit(X, y)
-
-joblib.dump(model, "fatigue_model.pkl")
-
-print("Model trained and saved.")
\ No newline at end of file
+if __name__ == "__main__":
+    sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cognitive_load.settings")
+    django.setup()
+    call_command("train_fatigue_model", "--install", os.path.join(BASE_DIR, "fatigue_model.pkl"),
+                 *sys.argv[1:])